@@ -0,0 +1,284 @@
+import argparse
+import json
+import re
+import sqlite3
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Optional
+
+import config
+from repositories.files import RESOLVE_BATCH_SIZE
+from repositories.planner import MATCH_MODES
+from services.async_files import AsyncFilesService
+from services.warmup import WarmupThread, start_warmup
+from utils.db import QueryTimeoutException
+from utils.fts import FTS_COLUMNS
+from utils.http_server import HttpException, Request, Response, serve
+from utils.pagination import InvalidCursorException
+from utils.reader_pool import reader_pool
+from utils.records import DEFAULT_FIELDS, FILE_FIELDS, RESOLVE_FIELDS, detail_fields, file_record, parse_fields
+
+API_HOST = getattr(config, 'API_HOST', '127.0.0.1')
+API_PORT = getattr(config, 'API_PORT', 8600)
+API_WORKERS = getattr(config, 'API_WORKERS', 2)
+
+SEARCH_TIMEOUT_MS = getattr(config, 'API_TIMEOUT_MS', 10000)
+
+# Largest page of /search and /torrents
+MAX_LIMIT = 500
+
+# Records serialized per chunk of streamed responses
+STREAM_CHUNK = 50
+
+MD5_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _int(query: Dict[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+    value = query.get(name)
+    if value in (None, ''):
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        raise HttpException(400, f"{name} must be an integer")
+
+
+def _limit(query: Dict[str, str], default: int) -> int:
+    return max(1, min(MAX_LIMIT, _int(query, 'limit', default)))
+
+
+def _fields(query: Dict[str, str], default=DEFAULT_FIELDS):
+    try:
+        return parse_fields(query.get('fields'), default)
+    except ValueError as e:
+        raise HttpException(400, str(e))
+
+
+def _json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+
+
+class ApiServer:
+    """
+    JSON API over AsyncFilesService, one instance per worker process.
+    Requests of a worker share its reader pool (read-only connections),
+    list responses are streamed with chunked encoding as they are
+    serialized.
+    """
+
+    def __init__(self, warmup: Optional[WarmupThread] = None) -> None:
+        self.svc = AsyncFilesService(reader_pool())
+        self.warmup = warmup
+
+        self.routes = [
+            ('GET', re.compile(r'^/search$'), self.search),
+            ('GET', re.compile(r'^/files/(?P<md5>[^/]+)$'), self.file),
+            ('POST', re.compile(r'^/md5$'), self.resolve_md5s),
+            ('GET', re.compile(r'^/torrents$'), self.torrents),
+            ('GET', re.compile(r'^/torrents/(?P<torrent_id>\d+)$'), self.torrent),
+            ('GET', re.compile(r'^/suggest$'), self.suggest),
+            ('GET', re.compile(r'^/authors$'), self.authors),
+            ('GET', re.compile(r'^/health$'), self.health),
+        ]
+
+    async def __call__(self, request: Request, response: Response):
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+
+            if request.method != method:
+                raise HttpException(405, f"{request.method} not allowed")
+
+            try:
+                await handler(request, response, **match.groupdict())
+            except InvalidCursorException as e:
+                raise HttpException(400, str(e))
+            except QueryTimeoutException:
+                raise HttpException(504, "query timed out")
+            except (ValueError, sqlite3.OperationalError) as e:
+                raise HttpException(400, str(e))
+            return
+
+        raise HttpException(404, f"no route for {request.path}")
+
+    async def search(self, request: Request, response: Response):
+        """
+        GET /search?q=&language=&year=&extension=&torrent_id=&author_id=
+        &local_only=1&order_by=rank DESC&match_mode=&columns=title,author
+        &limit=&after=&fields=
+        """
+        q = request.query
+        fields = _fields(q)
+
+        columns = None
+        if q.get('columns'):
+            columns = tuple(c for c in q['columns'].split(',') if c)
+            if set(columns) - set(FTS_COLUMNS):
+                raise HttpException(400, f"columns must be among {', '.join(FTS_COLUMNS)}")
+
+        match_mode = q.get('match_mode') or 'auto'
+        if match_mode not in MATCH_MODES:
+            raise HttpException(400, f"match_mode must be one of {', '.join(MATCH_MODES)}")
+
+        order_by = q.get('order_by')
+        if order_by is None and q.get('q'):
+            order_by = 'rank DESC'
+
+        page = await self.svc.search_page(
+            fields=fields,
+            query_text=q.get('q') or None,
+            language=q.get('language') or None,
+            year=_int(q, 'year'),
+            extension=q.get('extension') or None,
+            torrent_id=_int(q, 'torrent_id'),
+            author_id=_int(q, 'author_id'),
+            local_only=q.get('local_only') in ('1', 'true'),
+            order_by=order_by or None,
+            match_columns=columns,
+            match_mode=match_mode,
+            limit=_limit(q, 50),
+            after=q.get('after') or None,
+            timeout_ms=SEARCH_TIMEOUT_MS,
+        )
+
+        await self._stream_list(
+            response, 'files', (file_record(f, fields) for f in page.files),
+            {'next_cursor': page.next_cursor},
+        )
+
+    async def file(self, request: Request, response: Response, md5: str):
+        """GET /files/<md5>?fields=, all fields by default"""
+        md5 = md5.lower()
+        if not MD5_RE.match(md5):
+            raise HttpException(400, "md5 must be 32 hex digits")
+
+        fields = _fields(request.query, FILE_FIELDS)
+        page = await self.svc.search_page(fields=fields, md5=md5, limit=1, timeout_ms=SEARCH_TIMEOUT_MS)
+        if not page.files:
+            raise HttpException(404, f"no file {md5}")
+
+        await response.send_json(file_record(page.files[0], fields))
+
+    async def resolve_md5s(self, request: Request, response: Response):
+        """
+        POST /md5?fields= with md5s separated by whitespace or as a JSON
+        array: {"files": [...], "missing": [md5s not in the catalog]},
+        streamed batch by batch
+        """
+        body = request.body.decode('utf-8', errors='replace')
+        if body.lstrip().startswith('['):
+            md5s = json.loads(body)
+            if not all(isinstance(md5, str) for md5 in md5s):
+                raise HttpException(400, "md5s must be strings")
+        else:
+            md5s = body.split()
+
+        fields = _fields(request.query, RESOLVE_FIELDS)
+        details = bool(detail_fields(fields))
+        missing = []
+
+        await response.start()
+        await response.write(b'{"files":[')
+
+        first = True
+        for i in range(0, len(md5s), RESOLVE_BATCH_SIZE):
+            results = await self.svc.files_repo.resolve_md5s(md5s[i:i + RESOLVE_BATCH_SIZE], details)
+            records = []
+            for md5, file in results:
+                if file is None:
+                    missing.append(md5)
+                else:
+                    records.append(_json(file_record(file, fields)))
+
+            if records:
+                await response.write((b'' if first else b',') + b','.join(records))
+                first = False
+
+        await response.write(b'],"missing":%s}' % _json(missing))
+        await response.end()
+
+    async def torrents(self, request: Request, response: Response):
+        """GET /torrents?limit=&offset="""
+        q = request.query
+        torrents = await self.svc.torrents_repo.list(
+            _limit(q, 100), _int(q, 'offset'), SEARCH_TIMEOUT_MS
+        )
+        await self._stream_list(response, 'torrents', (self._torrent(t) for t in torrents))
+
+    async def torrent(self, request: Request, response: Response, torrent_id: str):
+        """GET /torrents/<id>"""
+        torrent = await self.svc.torrents_repo.find_by_id(int(torrent_id))
+        if torrent is None:
+            raise HttpException(404, f"no torrent {torrent_id}")
+
+        await response.send_json(self._torrent(torrent))
+
+    async def suggest(self, request: Request, response: Response):
+        """GET /suggest?q=&limit="""
+        q = request.query
+        words = await self.svc.suggest(q.get('q', ''), _limit(q, 10))
+        await response.send_json({'suggestions': words})
+
+    async def authors(self, request: Request, response: Response):
+        """GET /authors?prefix=&limit="""
+        q = request.query
+        authors = await self.svc.files_repo.find_authors(q.get('prefix', ''), _limit(q, 20))
+        await response.send_json({'authors': [asdict(a) for a in authors]})
+
+    async def health(self, request: Request, response: Response):
+        warmup = None
+        if self.warmup is not None:
+            warmup = str(self.warmup.report) if self.warmup.report else 'running'
+
+        await response.send_json({'status': 'ok', 'warmup': warmup})
+
+    def _torrent(self, torrent) -> Dict[str, Any]:
+        record = asdict(torrent)
+        del record['files']
+        return record
+
+    async def _stream_list(
+        self,
+        response: Response,
+        name: str,
+        records: Iterable[Dict[str, Any]],
+        trailer: Optional[Dict[str, Any]] = None,
+    ):
+        """{name: [records...], **trailer} written in chunks of STREAM_CHUNK records"""
+        await response.start()
+        await response.write(b'{%s:[' % _json(name))
+
+        chunk = []
+        first = True
+        for record in records:
+            chunk.append(_json(record))
+            if len(chunk) >= STREAM_CHUNK:
+                await response.write((b'' if first else b',') + b','.join(chunk))
+                chunk, first = [], False
+
+        if chunk:
+            await response.write((b'' if first else b',') + b','.join(chunk))
+
+        tail = b']'
+        for key, value in (trailer or {}).items():
+            tail += b',%s:%s' % (_json(key), _json(value))
+        await response.write(tail + b'}')
+        await response.end()
+
+
+def make_server(number: int) -> ApiServer:
+    # one warmup per machine is enough, the OS page cache is shared
+    warmup = start_warmup() if number == 0 else None
+    return ApiServer(warmup)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HTTP/JSON search API")
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--workers', type=int, default=API_WORKERS)
+    args = parser.parse_args()
+
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    serve(args.host, args.port, args.workers, make_server)
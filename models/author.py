@@ -0,0 +1,11 @@
+from typing import Optional
+from dataclasses import dataclass
+
+@dataclass(slots=True)
+class AuthorModel:
+	name: str
+
+	author_id: Optional[int] = None
+	# see utils.authors.author_key
+	name_key: Optional[str] = None
+	file_count: int = 0
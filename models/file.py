@@ -2,7 +2,7 @@ from typing import List, Optional
 from dataclasses import dataclass, field
 import zlib
 
-@dataclass
+@dataclass(slots=True)
 class FileModel:
 
 	title: Optional[str]
@@ -38,6 +38,10 @@ class FileModel:
 	is_complete: Optional[bool] = None
 	local_path: Optional[str] = None
 
+	# False for result list rows until FilesRepository.hydrate() loads
+	# description, cover_url and server_path
+	hydrated: bool = True
+
 
 	def set_description_compressed(self):
 		if not self.description:
@@ -0,0 +1,26 @@
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+
+from models.file import FileModel
+
+@dataclass
+class SearchPage:
+	files: List[FileModel] = field(default_factory=list)
+
+	# Opaque token to pass as `after` for the next page, None on last page
+	next_cursor: Optional[str] = None
+
+
+@dataclass
+class Facets:
+	# Number of matching files, estimated if not exact
+	total: int = 0
+
+	# False if counts are extrapolated from a sample
+	exact: bool = True
+
+	language: Dict[str, int] = field(default_factory=dict)
+	# decade buckets, e.g. '1990s'
+	year: Dict[str, int] = field(default_factory=dict)
+	extension: Dict[str, int] = field(default_factory=dict)
+	is_journal: Dict[str, int] = field(default_factory=dict)
@@ -1,7 +1,7 @@
 from typing import List, Optional
 from dataclasses import dataclass, field
 
-@dataclass
+@dataclass(slots=True)
 class TorrentFileModel:
 	torrent_id: int
 	filename: str
@@ -14,7 +14,7 @@ class TorrentFileModel:
 	byteoffset: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class TorrentModel:
 	path: str
 
@@ -1,15 +1,23 @@
+import asyncio
 import sqlite3
 import streamlit as st
 import textwrap
 from models.file import FileModel
+from models.search import Facets
 from models.torrent import TorrentFileModel
 from repositories.aa_torrents import AnnasArchiveTorrentsRepository
+from repositories.planner import MATCH_MODES
 from repositories.files import FilesRepository
 from repositories.torrents import TorrentsRepository
+from services.async_files import AsyncFilesService
 from services.files import FilesService
 from services.torrent import TorrentService
+from services.warmup import start_warmup
 from utils.byteoffset_extract import ByteoffsetFileExtractor
-from utils.db import connect_db, interrupt_after
+from utils.db import QueryTimeoutException, connect_db
+from utils.fts import FTS_COLUMNS, LEGACY_FTS_COLUMNS
+from utils.pagination import InvalidCursorException
+from utils.reader_pool import reader_pool
 from utils.torrent import TorrentDownloader
 import os
 import glob
@@ -25,11 +33,24 @@ svc = FilesService(db, cursor)
 repo = FilesRepository(db, cursor)
 extractor = ByteoffsetFileExtractor(db, cursor)
 
-interrupt_after(300, db)
+# Per-query budget, expensive FTS matches are cancelled after this
+SEARCH_TIMEOUT_MS = 10000
 
 aa_torrents = AnnasArchiveTorrentsRepository()
 
 
+@st.cache_resource
+def async_files_service():
+    """Searches of all sessions share the process reader pool"""
+    return AsyncFilesService(reader_pool())
+
+
+@st.cache_resource
+def warmup():
+    """Page cache warmup, once per server process"""
+    return start_warmup()
+
+
 def get_file_path(file: FileModel):
     server_paths = [os.path.basename(p) for p in file.server_path.split(';')]
 
@@ -45,18 +66,21 @@ def get_file_path(file: FileModel):
 
     return None
 
-@st.cache_data(ttl=120)
-def search(
+def search_query(
     query,
     search_lang,
     search_year,
     search_torrent_id,
     limit,
-    offset,
+    after,
     sort,
     sort_direction,
     local_only=False,
     md5=None,
+    extension=None,
+    match_columns=None,
+    match_mode='auto',
+    author_id=None,
 ):
     order_by = 'rank'
 
@@ -76,32 +100,64 @@ def search(
         else:
             order_by += ' DESC'
 
-    try:
-        return repo.search(
-            query_text=query,
-            language=search_lang,
-            year=search_year,
-            torrent_id=search_torrent_id,
-            limit=limit,
-            offset=offset,
-            order_by=order_by,
-            local_only=local_only,
-            md5=md5,
-        )
-    except sqlite3.OperationalError as e:
-        if query:
-            query = '"' + query.replace('"', '""') + '"*'
-            return repo.search(
-                query_text=query,
-                language=search_lang,
-                year=search_year,
-                torrent_id=search_torrent_id,
-                limit=limit,
-                offset=offset,
-                order_by=order_by,
-                local_only=local_only,
-                md5=md5,
-            )
+    return dict(
+        query_text=query,
+        language=search_lang,
+        year=search_year,
+        torrent_id=search_torrent_id,
+        limit=limit,
+        after=after,
+        order_by=order_by,
+        local_only=local_only,
+        md5=md5,
+        extension=extension,
+        match_columns=match_columns,
+        match_mode=match_mode,
+        author_id=author_id,
+        timeout_ms=SEARCH_TIMEOUT_MS,
+    )
+
+def facets_query(
+    query,
+    search_lang,
+    search_year,
+    search_torrent_id,
+    local_only=False,
+    extension=None,
+    match_columns=None,
+    match_mode='auto',
+    author_id=None,
+):
+    return dict(
+        query_text=query,
+        language=search_lang,
+        year=search_year,
+        torrent_id=search_torrent_id,
+        local_only=local_only,
+        extension=extension,
+        match_columns=match_columns,
+        match_mode=match_mode,
+        author_id=author_id,
+    )
+
+
+def format_facets(facets: Facets):
+    total = f"{facets.total:,}" if facets.exact else f"~{facets.total:,}"
+    st.text(f"{total} matching files")
+
+    with st.expander("Breakdown"):
+        cols = st.columns(4)
+        for col, (title, counts) in zip(cols, (
+            ("Language", facets.language),
+            ("Year", facets.year),
+            ("Extension", facets.extension),
+            ("Journal", facets.is_journal),
+        )):
+            with col:
+                st.markdown(f"**{title}**")
+                for value, count in list(counts.items())[:10]:
+                    st.text(f"{value}: {count:,}")
+
 
 def seed_file(file: FileModel, container):
     db = connect_db()
@@ -113,7 +169,6 @@ def seed_file(file: FileModel, container):
 
     with container:
         st.success("File added to seeds")
-        st.cache_data.clear()
 
 
 def seed_torrent(torrent_id, container):
@@ -205,7 +260,6 @@ def _download_from_torrent(file: FileModel):
             local_path=file_path,
         ))
         db.commit()
-        st.cache_data.clear()
 
         with open(full_path, 'rb') as f:
             st.download_button("Get file", f, file_name=f"{file.md5}.{file.extension}", on_click='ignore')
@@ -357,6 +411,55 @@ def format_file_result(file: FileModel):
 
 def reset_pagination():
     st.session_state.offset = 0
+    # cursors[i] - `after` token of page i
+    st.session_state.cursors = [None]
+
+def use_suggestion(text: str):
+    st.session_state.query_input = text
+    reset_pagination()
+
+
+def show_suggestions(query: str):
+    if not query or query[-1:].isspace() or md5_like(query):
+        return
+
+    suggestions = [s for s in repo.suggest(query, 6) if s != query.strip().lower()]
+    if not suggestions:
+        return
+
+    with st.container(horizontal=True):
+        for text in suggestions:
+            st.button(text, key=f"suggest_{text}", type="tertiary", on_click=use_suggestion, args=(text,))
+
+
+def select_author():
+    """Sidebar author lookup by name prefix, returns the selected author id"""
+    name = st.text_input(
+        "Author", placeholder="e.g. tolstoy",
+        key='author_input',
+        on_change=reset_pagination,
+    )
+    if not name:
+        return None
+
+    authors = repo.find_authors(name, 20)
+    if not authors:
+        st.caption("No such author")
+        return None
+
+    labels = {a.author_id: f"{a.name} ({a.file_count:,})" for a in authors}
+    return st.selectbox(
+        "Matching authors",
+        options=list(labels),
+        format_func=labels.get,
+        key='author_select',
+        on_change=reset_pagination,
+    )
+
+
+def md5_like(query: str):
+    return len(query) == 32 and all(c in '0123456789abcdef' for c in query.lower())
+
 
 def main():
     st.set_page_config(page_title="File Search Tool", page_icon="🔍", layout="wide")
@@ -378,11 +481,15 @@ def main():
         st.session_state.query_input = ''
         st.session_state.language_select = 'Any'
         st.session_state.year_input = ''
+        st.session_state.extension_select = 'Any'
+        st.session_state.author_input = ''
 
     if st.session_state.scroll_to_top:
         scroll_to_top()
         st.session_state.scroll_to_top = False
 
+    warmup_thread = warmup()
+
     # --- Sidebar filters ---
     with st.sidebar:
         st.header("Filters")
@@ -401,6 +508,15 @@ def main():
             key='year_input',
             on_change=reset_pagination,
         )
+        extension = st.selectbox(
+            "Extension",
+            options=['Any', 'pdf', 'epub', 'djvu', 'fb2', 'mobi', 'azw3', 'txt'],
+            index=0,
+            key='extension_select',
+            on_change=reset_pagination,
+        )
+        author_id = select_author()
+
         limit = st.selectbox(
             "Results per page", [10, 25, 50, 100],
             index=0,
@@ -410,11 +526,13 @@ def main():
             "Sort by",
             options=['relevance', 'none', 'year', 'title'],
             index=1,
+            on_change=reset_pagination,
         )
         sort_direction = st.selectbox(
             "Sort direction",
             options=['ascending', 'descending'],
             index=0,
+            on_change=reset_pagination,
         )
 
         local_only = st.checkbox(
@@ -422,6 +540,25 @@ def main():
             on_change=reset_pagination,
         )
 
+        match_mode = st.selectbox(
+            "Match",
+            options=list(MATCH_MODES),
+            index=0,
+            on_change=reset_pagination,
+            help="substring needs the trigram index (tools.rebuild_fts --trigram)",
+        )
+
+        match_columns = None
+        if repo.fts_columns() != LEGACY_FTS_COLUMNS:
+            match_columns = st.multiselect(
+                "Search in",
+                options=list(FTS_COLUMNS),
+                on_change=reset_pagination,
+            ) or None
+
+        if warmup_thread is not None:
+            st.caption(str(warmup_thread.report) if warmup_thread.report else "Warming up caches...")
+
     # --- Main search input ---
     query = st.text_input(
         "Enter your search query:",
@@ -429,10 +566,11 @@ def main():
         key="query_input",
         on_change=reset_pagination,
     )
+    show_suggestions(query)
 
     # Keep pagination state
     if "offset" not in st.session_state:
-        st.session_state.offset = 0
+        reset_pagination()
 
     if st.session_state.torrent_id:
         col1, col2 = st.columns([3, 1])
@@ -458,18 +596,52 @@ def main():
 
         search_torrent_id = st.session_state.torrent_id
 
-        results = search(
-            query,
-            search_lang,
-            search_year,
-            search_torrent_id,
-            limit,
-            st.session_state.offset,
-            sort,
-            sort_direction,
-            local_only=local_only,
-            md5=md5,
-        ) or []
+        try:
+            page, facets = asyncio.run(async_files_service().search_with_facets(
+                search_query(
+                    query,
+                    search_lang,
+                    search_year,
+                    search_torrent_id,
+                    limit,
+                    st.session_state.cursors[-1],
+                    sort,
+                    sort_direction,
+                    local_only=local_only,
+                    md5=md5,
+                    extension=None if extension == "Any" else extension,
+                    match_columns=match_columns,
+                    match_mode=match_mode,
+                    author_id=author_id,
+                ),
+                facets_query(
+                    query,
+                    search_lang,
+                    search_year,
+                    search_torrent_id,
+                    local_only=local_only,
+                    extension=None if extension == "Any" else extension,
+                    match_columns=match_columns,
+                    match_mode=match_mode,
+                    author_id=author_id,
+                ),
+            ))
+        except QueryTimeoutException:
+            st.warning("Search took too long and was cancelled. Try a more specific query.")
+            page, facets = None, None
+        except sqlite3.OperationalError as e:
+            st.error(f"Invalid search query: {e}")
+            page, facets = None, None
+        except InvalidCursorException:
+            # filters changed since the page was opened
+            reset_pagination()
+            st.rerun()
+
+        # hydrated with the page by the reader pool
+        results = page.files if page else []
+
+        if facets:
+            format_facets(facets)
 
         st.text(f"Showing {len(results)} files ({st.session_state.offset} - {st.session_state.offset + len(results)})")
 
@@ -482,14 +654,16 @@ def main():
             # Pagination controls
             col1, _, col3 = st.columns([1, 2, 1])
             with col1:
-                if st.session_state.offset > 0:
+                if len(st.session_state.cursors) > 1:
                     if st.button("⬅️ Previous"):
+                        st.session_state.cursors.pop()
                         st.session_state.offset = max(0, st.session_state.offset - limit)
                         st.session_state.scroll_to_top = True
                         st.rerun()
             with col3:
-                if len(results) == limit:
+                if page and page.next_cursor:
                     if st.button("Next ➡️"):
+                        st.session_state.cursors.append(page.next_cursor)
                         st.session_state.offset += limit
                         st.session_state.scroll_to_top = True
                         st.rerun()
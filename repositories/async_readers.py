@@ -0,0 +1,79 @@
+from typing import List, Optional, Tuple
+
+from models.author import AuthorModel
+from models.file import FileModel
+from models.search import Facets, SearchPage
+from models.torrent import TorrentModel
+from repositories.facets import FacetsRepository
+from repositories.files import DETAIL_FIELDS, FilesRepository
+from repositories.torrents import TorrentsRepository
+from utils.reader_pool import ReaderPool
+
+
+class AsyncFilesRepository:
+    """FilesRepository reads for asyncio callers, run on a ReaderPool worker each"""
+
+    def __init__(self, pool: ReaderPool) -> None:
+        self.pool = pool
+
+    def _repo(self) -> FilesRepository:
+        # worker threads only
+        return self.pool.repository(FilesRepository)
+
+    async def search_page(self, **kwargs) -> SearchPage:
+        return await self.pool.run(lambda: self._repo().search_page(**kwargs))
+
+    async def cached_search_page(self, **kwargs) -> SearchPage:
+        return await self.pool.run(lambda: self._repo().cached_search_page(**kwargs))
+
+    async def find_by_ids(self, ids: List[int], timeout_ms: Optional[int] = None) -> List[FileModel]:
+        return await self.pool.run(lambda: self._repo().find_by_ids(ids, timeout_ms))
+
+    async def hydrate(self, files: List[FileModel], fields=DETAIL_FIELDS) -> List[FileModel]:
+        return await self.pool.run(lambda: self._repo().hydrate(files, fields))
+
+    async def resolve_md5s(self, md5s: List[str], details: bool = True) -> List[Tuple[str, Optional[FileModel]]]:
+        return await self.pool.run(lambda: list(self._repo().resolve_md5s(md5s, len(md5s) or 1, details)))
+
+    async def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        return await self.pool.run(lambda: self._repo().suggest(prefix, limit))
+
+    async def find_authors(self, prefix: str, limit: int = 20) -> List[AuthorModel]:
+        return await self.pool.run(lambda: self._repo().find_authors(prefix, limit))
+
+
+class AsyncFacetsRepository:
+    """FacetsRepository counts for asyncio callers"""
+
+    def __init__(self, pool: ReaderPool) -> None:
+        self.pool = pool
+
+    def _repo(self) -> FacetsRepository:
+        return self.pool.repository(FacetsRepository)
+
+    async def count(self, **kwargs) -> Facets:
+        return await self.pool.run(lambda: self._repo().count(**kwargs))
+
+    async def cached_count(self, **kwargs) -> Facets:
+        return await self.pool.run(lambda: self._repo().cached_count(**kwargs))
+
+
+class AsyncTorrentsRepository:
+    """TorrentsRepository reads for asyncio callers"""
+
+    def __init__(self, pool: ReaderPool) -> None:
+        self.pool = pool
+
+    def _repo(self) -> TorrentsRepository:
+        return self.pool.repository(TorrentsRepository)
+
+    async def list(
+        self,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout_ms: Optional[int] = None,
+    ) -> List[TorrentModel]:
+        return await self.pool.run(lambda: self._repo().list(limit, offset, timeout_ms))
+
+    async def find_by_id(self, torrent_id: int) -> Optional[TorrentModel]:
+        return await self.pool.run(lambda: self._repo().find_by_id(torrent_id))
@@ -0,0 +1,114 @@
+import sqlite3
+from typing import List, Optional
+
+from models.author import AuthorModel
+from utils.authors import author_key, split_authors
+from utils.cache import LruCache
+from utils.rows import RowMapper, tuple_cursor
+
+AUTHOR_ROWS = RowMapper(
+    AuthorModel,
+    {
+        'author_id': ('id', '{}'),
+        'name': ('name', '{}'),
+        'name_key': ('name_key', '{}'),
+        'file_count': ('file_count', '{}'),
+    },
+)
+
+
+class AuthorsRepository:
+    """
+    Authors of files.author normalized to keys (utils.authors) and the
+    file_authors mapping. Lookups by key or key prefix are range scans
+    of idx_authors_name_key, files of an author one of the
+    file_authors primary key.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.conn = conn
+        self.cur = cursor
+
+        # name_key -> id of authors seen by link()
+        self.ids = LruCache(max_entries=100000)
+
+        self.rows_cur = tuple_cursor(conn)
+
+    def link(self, file_id: int, author: Optional[str]) -> int:
+        """Map a file to the authors of its files.author value, returns their number"""
+        names = split_authors(author)
+        for name in names:
+            author_id = self._author_id(name)
+            self.cur.execute(
+                "INSERT OR IGNORE INTO file_authors (author_id, file_id) VALUES (?, ?)",
+                (author_id, file_id)
+            )
+            if self.cur.rowcount:
+                self.cur.execute(
+                    "UPDATE authors SET file_count = file_count + 1 WHERE id = ?", (author_id,)
+                )
+
+        return len(names)
+
+    def unlink(self, file_id: int):
+        self.cur.execute("""
+            UPDATE authors SET file_count = file_count - 1
+            WHERE id IN (SELECT author_id FROM file_authors WHERE file_id = ?)
+        """, (file_id,))
+        self.cur.execute("DELETE FROM file_authors WHERE file_id = ?", (file_id,))
+
+    def _author_id(self, name: str) -> int:
+        key = author_key(name)
+        author_id = self.ids.get(key)
+        if author_id is None:
+            # the first spelling of a name is kept for display
+            self.cur.execute(
+                "INSERT OR IGNORE INTO authors (name, name_key) VALUES (?, ?)", (name, key)
+            )
+            self.cur.execute("SELECT id FROM authors WHERE name_key = ?", (key,))
+            author_id = self.cur.fetchone()[0]
+            self.ids.put(key, author_id)
+
+        return author_id
+
+    def get(self, author_id: int) -> Optional[AuthorModel]:
+        self.rows_cur.execute("SELECT * FROM authors WHERE id = ?", (author_id,))
+        return AUTHOR_ROWS.fetchone(self.rows_cur)
+
+    def find_by_name(self, name: str) -> Optional[AuthorModel]:
+        """Author with the same key as name, "Tolstoy, Leo" finds "Leo Tolstoy\""""
+        self.rows_cur.execute("SELECT * FROM authors WHERE name_key = ?", (author_key(name),))
+        return AUTHOR_ROWS.fetchone(self.rows_cur)
+
+    def find_by_prefix(self, prefix: str, limit: int = 20) -> List[AuthorModel]:
+        """
+        Authors with files whose key starts with the key of prefix, in key
+        order. "Tolstoy, L" also finds keys starting with "l" and ending
+        with "tolstoy", keys are in "First Last" order.
+        """
+        key = author_key(prefix, reorder=False)
+        if not key:
+            return []
+
+        sql = """
+            SELECT * FROM authors
+            WHERE name_key >= ? AND name_key < ? AND file_count > 0
+        """
+        params = [key, key + '\U0010ffff']
+
+        parts = prefix.split(',')
+        if len(parts) == 2:
+            last, first = author_key(parts[0], reorder=False), author_key(parts[1], reorder=False)
+            if first and last:
+                sql += """
+                UNION
+                SELECT * FROM authors
+                WHERE name_key >= ? AND name_key < ? AND substr(name_key, -?) = ? AND file_count > 0
+                """
+                params += [first, first + '\U0010ffff', len(last) + 1, ' ' + last]
+
+        self.rows_cur.execute(sql + " ORDER BY name_key LIMIT ?", params + [limit])
+
+        results: List[AuthorModel]
+        results = AUTHOR_ROWS.fetchall(self.rows_cur)
+        return results
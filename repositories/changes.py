@@ -0,0 +1,25 @@
+import sqlite3
+from typing import Dict, Iterable
+
+
+class ChangesRepository:
+    """Per-table change counters, cached results store the versions they were computed at"""
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.conn = conn
+        self.cur = cursor
+
+    def bump(self, table: str):
+        """Count a change of table, writers of files call it once per batch"""
+        self.cur.execute(
+            "UPDATE change_counters SET version = version + 1 WHERE name = ?", (table,)
+        )
+
+    def versions(self, tables: Iterable[str]) -> Dict[str, int]:
+        tables = list(tables)
+        rows = self.conn.execute(
+            f"SELECT name, version FROM change_counters WHERE name IN ({', '.join(['?'] * len(tables))})",
+            tables
+        ).fetchall()
+
+        return {row[0]: row[1] for row in rows}
@@ -0,0 +1,210 @@
+import sqlite3
+from collections import Counter
+from typing import Dict, Optional
+
+from models.search import Facets
+from repositories.changes import ChangesRepository
+from repositories.files import FilesRepository
+from repositories.stats import StatsRepository
+from utils.db import QueryTimeoutException, query_deadline
+from utils.result_cache import result_cache
+
+# Tables facet counts are computed from, see cached_count()
+FACETS_TABLES = ('files', 'torrent_files', 'stats')
+
+
+def year_bucket(year) -> str:
+    year = str(year or '')
+    if len(year) == 4 and year.isdigit():
+        return f"{year[:3]}0s"
+
+    return 'unknown'
+
+
+class FacetsRepository:
+    """
+    Result counts per language, decade, extension and is_journal.
+    Without query text they come from the precomputed files_facets
+    aggregate, otherwise matches are counted within a time budget and
+    extrapolated when the budget or SAMPLE_ROWS runs out.
+    """
+
+    SAMPLE_ROWS = 200000
+    FETCH_SIZE = 1000
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.conn = conn
+        self.cur = cursor
+
+        self.stats = StatsRepository(conn, cursor)
+        self.files_repo = FilesRepository(conn, cursor)
+        self.changes = ChangesRepository(conn, cursor)
+
+    def cached_count(self, **kwargs) -> Facets:
+        """count() through the result cache shared by all processes"""
+        return result_cache.get_or_compute(
+            'facets',
+            kwargs,
+            self.changes.versions(FACETS_TABLES),
+            lambda: self.count(**kwargs),
+        )
+
+    def count(
+        self,
+        query_text=None,
+        language=None,
+        year=None,
+        torrent_id=None,
+        local_only=False,
+        extension=None,
+        is_journal=None,
+        timeout_ms: Optional[int] = 2000,
+        match_columns=None,
+        match_mode='auto',
+        author_id=None,
+    ) -> Facets:
+        if self.stats.total() is not None and not query_text and not torrent_id and not local_only \
+                and not author_id:
+            return self._count_aggregate(language, year, extension, is_journal)
+
+        return self._count_matches(
+            timeout_ms,
+            query_text=query_text,
+            language=language,
+            year=year,
+            torrent_id=torrent_id,
+            local_only=local_only,
+            extension=extension,
+            is_journal=is_journal,
+            match_columns=match_columns,
+            match_mode=match_mode,
+            author_id=author_id,
+        )
+
+    def _count_aggregate(self, language, year, extension, is_journal) -> Facets:
+        filters = []
+        params = []
+
+        for column, value in (
+            ('language', language),
+            ('year', year),
+            ('extension', extension),
+            ('is_journal', int(is_journal) if is_journal is not None else None),
+        ):
+            if value is not None and value != '':
+                filters.append(f"{column} = ?")
+                params.append(value)
+
+        if not filters:
+            total = self.stats.total() or 0
+            return Facets(
+                total=total,
+                language=self._labels(self.stats.values('language'), total),
+                year=self._labels(self._buckets(self.stats.values('year')), total),
+                extension=self._labels(self.stats.values('extension'), total),
+                is_journal=self.stats.values('is_journal'),
+            )
+
+        sql = "SELECT language, year, extension, is_journal, count FROM files_facets"
+        sql += " WHERE " + " AND ".join(filters)
+
+        self.cur.execute(sql, params)
+
+        counters = _FacetCounters()
+        for row in self.cur.fetchall():
+            counters.add(row[0], row[1], row[2], row[3], row[4])
+
+        return counters.to_facets(counters.total, exact=True)
+
+    def _count_matches(self, timeout_ms, **query) -> Facets:
+        plan, select, select_params, sql, filters, params = self.files_repo.build_search_query(
+            "f.language, f.year, f.extension, f.is_journal", **query
+        )
+        if filters:
+            sql += " WHERE " + " AND ".join(filters)
+
+        sql += " LIMIT ?"
+        params.append(self.SAMPLE_ROWS)
+
+        counters = _FacetCounters()
+        exact = True
+        try:
+            with query_deadline(self.conn, timeout_ms):
+                self.cur.execute(select + sql, select_params + params)
+                while rows := self.cur.fetchmany(self.FETCH_SIZE):
+                    for row in rows:
+                        counters.add(row[0], row[1], row[2], row[3])
+        except QueryTimeoutException:
+            exact = False
+
+        if counters.total >= self.SAMPLE_ROWS:
+            exact = False
+
+        if exact:
+            return counters.to_facets(counters.total, exact=True)
+
+        estimate = self.files_repo.planner.estimate_rows(query['query_text'], {
+            'language': query['language'] or None,
+            'year': query['year'] or None,
+            'torrent_id': query['torrent_id'] or None,
+            'extension': query['extension'] or None,
+            'is_journal': int(query['is_journal']) if query['is_journal'] is not None else None,
+            'author_id': query['author_id'] or None,
+        })
+
+        return counters.to_facets(max(estimate or 0, counters.total), exact=False)
+
+    def _labels(self, values: Dict[str, int], total: int):
+        """
+        Empty values and the NULLs files_stats leaves out counted as
+        'unknown', as _FacetCounters does
+        """
+        labels = Counter()
+        for value, count in values.items():
+            labels[value or 'unknown'] += count
+
+        if total > sum(labels.values()):
+            labels['unknown'] += total - sum(labels.values())
+
+        return dict(labels)
+
+    def _buckets(self, years: Dict[str, int]):
+        buckets = Counter()
+        for year, count in years.items():
+            buckets[year_bucket(year)] += count
+
+        return dict(buckets)
+
+
+class _FacetCounters:
+    def __init__(self) -> None:
+        self.total = 0
+        self.language = Counter()
+        self.year = Counter()
+        self.extension = Counter()
+        self.is_journal = Counter()
+
+    def add(self, language, year, extension, is_journal, count=1):
+        self.total += count
+        self.language[language or 'unknown'] += count
+        self.year[year_bucket(year)] += count
+        self.extension[extension or 'unknown'] += count
+        self.is_journal[str(is_journal)] += count
+
+    def to_facets(self, total: int, exact: bool) -> Facets:
+        scale = total / self.total if self.total else 0
+
+        def scaled(counter: Counter):
+            return {
+                value: round(count * scale)
+                for value, count in counter.most_common()
+            }
+
+        return Facets(
+            total=total,
+            exact=exact,
+            language=scaled(self.language),
+            year=scaled(self.year),
+            extension=scaled(self.extension),
+            is_journal=scaled(self.is_journal),
+        )
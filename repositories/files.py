@@ -1,77 +1,338 @@
+import itertools
+import json
 import sqlite3
-from typing import List
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from models.author import AuthorModel
 from models.file import FileModel
+from models.search import SearchPage
+from repositories.authors import AuthorsRepository
+from repositories.changes import ChangesRepository
+from repositories.planner import SearchPlanner, fuzzy_expandable, route_query
+from repositories.terms import TermsRepository
+from utils.cache import LruCache
+from utils.db import SORT_KEY_COLUMN_TYPES, SORT_KEY_INDEXES, index_names, query_deadline, table_columns
+from utils.fts import (
+    LEGACY_FTS_COLUMNS,
+    TRIGRAM_COLUMNS,
+    TRIGRAM_TABLE,
+    column_filter,
+    fts_columns,
+    fts_layout,
+)
+from utils.pagination import ResultIdsCache, decode_cursor, encode_cursor, query_hash
+from utils.records import DETAIL_FIELDS
+from utils.result_cache import result_cache
+from utils.rows import RowMapper, tuple_cursor
+from utils.sort_keys import title_sort_key, year_sort_key
+
+# Sort keys accepted by search(order_by=...)
+SORT_COLUMNS = {
+    'id': 'f.id',
+    'year': 'f.year',
+    'title': 'f.title',
+    'rank': 'rank',
+}
+
+# Indexed sort key column and key function replacing SORT_COLUMNS entries
+# once all files have keys
+SORT_KEY_COLUMNS = {
+    'year': ('f.year_sort', year_sort_key),
+    'title': ('f.title_sort', title_sort_key),
+}
+
+# Columns of search result rows, the rest is loaded by hydrate() and
+# local status by _fill_local_status()
+LIST_COLUMNS = (
+    "f.id, f.md5, f.title, f.extension, f.year, f.author, f.language, f.ipfs_cid, "
+    "f.torrent_id, f.byteoffset, f.is_journal, t.path AS torrent_path, "
+    "t.magnet_link as torrent_magnet_link"
+)
+
+LOCAL_COLUMNS = "tf.is_complete as is_complete, tf.local_path as local_path"
+
+# Tables search pages are computed from, see cached_search_page()
+SEARCH_TABLES = ('files', 'torrents', 'torrent_files')
+
+# Largest number of bound parameters per IN (...) lookup
+IN_BATCH_SIZE = 500
+
+# md5s looked up per statement by resolve_md5s()
+RESOLVE_BATCH_SIZE = 10000
+
+
+def _decompress(data: Optional[bytes]):
+    return zlib.decompress(data).decode("utf-8") if data else None
+
+
+FILE_ROWS = RowMapper(
+    FileModel,
+    {
+        'file_id': ('id', '{}'),
+        'md5': ('md5', '{}'),
+        'server_path': ('server_path', '{}'),
+        'ipfs_cid': ('ipfs_cid', '{}'),
+        'torrent': ('torrent_path', '{}'),
+        'torrent_id': ('torrent_id', '{}'),
+        'torrent_magnet_link': ('torrent_magnet_link', '{}'),
+        'title': ('title', '{}'),
+        'description': ('description_compressed', 'decompress({})'),
+        'cover_url': ('cover_url', '{}'),
+        'extension': ('extension', '{}'),
+        'year': ('year', '{}'),
+        'author': ('author', '{}'),
+        'languages': ('language', "{}.split(';') if {} else []"),
+        'is_complete': ('is_complete', '{}'),
+        'byteoffset': ('byteoffset', '{}'),
+        'is_journal': ('is_journal', '{} == 1'),
+        'local_path': ('local_path', '{}'),
+        # light rows of LIST_COLUMNS have no detail columns
+        'hydrated': ('server_path', 'True'),
+    },
+    missing={'server_path': 'None', 'hydrated': 'False'},
+    env={'decompress': _decompress},
+)
+
+
+@dataclass
+class _RankedIds:
+    """Cached ranked search result: ids from result position base on"""
+    base: int
+    ids: List[int]
+    # no results after ids
+    exhausted: bool
+    # FTS match position to continue a top-k scan from, None if ids come
+    # from the joined query
+    resume: Optional[int]
+
 
 class FilesRepository:
+
+    # Ranked searches keep up to this many ordered ids for the following pages
+    RANKED_IDS_LIMIT = 10000
+
+    # Top-k ranked retrieval: ids collected beyond the requested page,
+    # FTS matches read per residual filter check and in total before
+    # falling back to the joined query
+    RANKED_PREFETCH = 200
+    RANKED_CHUNK = 500
+    MAX_RANKED_SCAN = 50000
+
+    # iter_search(): largest number of chunks read by keyset from a plan
+    # that sorts, ids per window relative to the chunk size otherwise
+    KEYSET_MAX_CHUNKS = 10
+    WINDOW_FACTOR = 16
+
+    # Time spent looking up close terms of a fuzzy query
+    FUZZY_BUDGET_MS = 50
+    ranked_ids_cache = ResultIdsCache(ttl=600)
+
+    # (description_compressed, cover_url, server_path) per file id
+    details_cache = LruCache(max_entries=5000, ttl=600)
+
+    # set once no file lacks sort keys
+    sort_keys_complete = False
+
     def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
         self.conn = conn
         self.cur = cursor
 
+        self.planner = SearchPlanner(conn, cursor)
+        self.changes = ChangesRepository(conn, cursor)
+        self.terms = TermsRepository(conn, cursor)
+        self.authors = AuthorsRepository(conn, cursor)
+
+        # for queries mapped to models by FILE_ROWS
+        self.rows_cur = tuple_cursor(conn)
+
     def insert(self, file: FileModel):
-        self.cur.execute("""
-            INSERT OR IGNORE INTO files (
-                md5,
-                title,
-                description_compressed,
-                cover_url,
-                extension,
-                year,
-                author,
-                language,
-                ipfs_cid,
-                torrent_id,
-                server_path,
-                byteoffset,
-                is_journal
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            file.md5,
-            file.title,
-            file.description_compressed,
-            file.cover_url,
-            file.extension,
-            file.year,
-            file.author,
-            ';'.join(file.languages),
-            file.ipfs_cid,
-            file.torrent_id,
-            file.server_path,
-            file.byteoffset,
-            file.is_journal)
-        )
+        values = {
+            'md5': file.md5,
+            'title': file.title,
+            'description_compressed': file.description_compressed,
+            'cover_url': file.cover_url,
+            'extension': file.extension,
+            'year': file.year,
+            'author': file.author,
+            'language': ';'.join(file.languages),
+            'ipfs_cid': file.ipfs_cid,
+            'torrent_id': file.torrent_id,
+            'server_path': file.server_path,
+            'byteoffset': file.byteoffset,
+            'is_journal': file.is_journal,
+        }
+        # catalogs before sort keys get them from tools.backfill_sort_keys
+        if self.has_sort_key_columns():
+            values['title_sort'] = title_sort_key(file.title)
+            values['year_sort'] = year_sort_key(file.year)
+
+        self.cur.execute(f"""
+            INSERT OR IGNORE INTO files ({', '.join(values)})
+            VALUES ({', '.join(['?'] * len(values))})
+        """, tuple(values.values()))
+
+        if not self.cur.rowcount:
+            # md5 already imported, lastrowid would point to another row
+            return None
 
         file_id = self.cur.lastrowid
         return file_id
 
-    def insert_fts(self, file_id: int, text: str):
-        self.cur.execute("""
-            INSERT INTO files_fts (rowid, text)
-            VALUES (?, ?)
-        """, (file_id, text))
+    def delete(self, file_id: int):
+        self.details_cache.pop(file_id)
+        self.cur.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return self.cur.rowcount
 
-    def find_by_ids(self, ids: List[int]):
+    def has_sort_key_columns(self) -> bool:
+        return set(SORT_KEY_COLUMN_TYPES) <= table_columns(self.conn, 'files')
+
+    def sort_keys_ready(self):
+        """True once all files have sort keys and their indexes, see tools.backfill_sort_keys"""
+        if not self.has_sort_key_columns() or not set(SORT_KEY_INDEXES) <= index_names(self.conn):
+            return False
+
+        if not FilesRepository.sort_keys_complete:
+            # NULLs come first in the sort key indexes
+            missing = self.conn.execute(
+                "SELECT 1 FROM files WHERE title_sort IS NULL LIMIT 1"
+            ).fetchone() or self.conn.execute(
+                "SELECT 1 FROM files WHERE year_sort IS NULL LIMIT 1"
+            ).fetchone()
+            FilesRepository.sort_keys_complete = missing is None
+
+        return FilesRepository.sort_keys_complete
+
+    def set_sort_keys(self, keys):
+        """keys: (title_sort, year_sort, file_id) tuples"""
+        self.cur.executemany("UPDATE files SET title_sort = ?, year_sort = ? WHERE id = ?", keys)
+
+    def fts_columns(self):
+        return fts_columns(self.conn)
+
+    def insert_fts(self, file_id: int, values: Dict[str, str], table: str = 'files_fts'):
+        columns = list(values.keys())
+        self.cur.execute(f"""
+            INSERT INTO {table} (rowid, {', '.join(columns)})
+            VALUES (?, {', '.join(['?'] * len(columns))})
+        """, (file_id, *values.values()))
+
+    def delete_fts(self, file_id: int, values: Dict[str, str], table: str = 'files_fts'):
+        """
+        Remove a row from a contentless FTS table. Unless the table has
+        contentless_delete, values must equal the indexed ones.
+        """
+        if table == 'files_fts' and fts_layout(self.conn).contentless_delete:
+            self.cur.execute("DELETE FROM files_fts WHERE rowid = ?", (file_id,))
+            return
+
+        columns = list(values.keys())
+        self.cur.execute(f"""
+            INSERT INTO {table} ({table}, rowid, {', '.join(columns)})
+            VALUES ('delete', ?, {', '.join(['?'] * len(columns))})
+        """, (file_id, *values.values()))
+
+    def list_after(self, after_id: int, limit: int):
+        """Files with id > after_id in id order, without torrent details"""
+        self.rows_cur.execute("""
+            SELECT f.*
+            FROM files f
+            WHERE f.id > ?
+            ORDER BY f.id
+            LIMIT ?
+        """, (after_id, limit))
+
+        results: List[FileModel]
+        results = FILE_ROWS.fetchall(self.rows_cur)
+        return results
+
+    def find_stored(self, file_id: int) -> Optional[FileModel]:
+        """A file as stored, with all columns, the source of its FTS values"""
+        self.rows_cur.execute("SELECT f.* FROM files f WHERE f.id = ?", (file_id,))
+        results = FILE_ROWS.fetchall(self.rows_cur)
+        return results[0] if results else None
+
+    def find_by_ids(self, ids: List[int], timeout_ms: Optional[int] = None):
+        """Files by id as light rows, see hydrate()"""
         sql = f"""
-        SELECT f.*, t.path AS torrent_path, t.magnet_link as torrent_magnet_link,
-            tf.is_complete as is_complete, tf.local_path as local_path
+        SELECT {LIST_COLUMNS}, {LOCAL_COLUMNS}
         FROM files f
         LEFT JOIN torrents t ON t.id = f.torrent_id
         LEFT JOIN torrent_files tf ON f.id = tf.file_id
         WHERE f.id IN ({','.join([str(id) for id in ids])})
         """
 
-        self.cur.execute(sql)
-
         results: List[FileModel]
-        results = []
-        for row in self.cur.fetchall():
-            model = self._row_to_model(row)
-
-            model.load_description(row['description_compressed'])
-            results.append(model)
+        with query_deadline(self.conn, timeout_ms):
+            self.rows_cur.execute(sql)
+            results = FILE_ROWS.fetchall(self.rows_cur)
 
         return results
 
+    def _fill_local_status(self, files: List[FileModel]):
+        """is_complete and local_path of files from the few torrent_files rows"""
+        if not files:
+            return
+
+        ids = [f.file_id for f in files]
+        self.cur.execute(f"""
+            SELECT file_id, is_complete, local_path FROM torrent_files
+            WHERE file_id IN ({', '.join(['?'] * len(ids))})
+        """, ids)
+        local = {row[0]: (row[1], row[2]) for row in self.cur.fetchall()}
+
+        for file in files:
+            if file.file_id in local:
+                file.is_complete, file.local_path = local[file.file_id]
+
+    def hydrate(self, files: List[FileModel], fields=DETAIL_FIELDS):
+        """
+        Load DETAIL_FIELDS of light rows with one batched lookup, recently
+        hydrated files come from details_cache. Pass a subset of fields
+        to skip work, e.g. description decompression.
+        """
+        light = [f for f in files if not f.hydrated and f.file_id is not None]
+
+        details = {}
+        missing = []
+        for file in light:
+            entry = self.details_cache.get(file.file_id)
+            if entry is None:
+                missing.append(file.file_id)
+            else:
+                details[file.file_id] = entry
+
+        missing = list(dict.fromkeys(missing))
+        for i in range(0, len(missing), IN_BATCH_SIZE):
+            batch = missing[i:i + IN_BATCH_SIZE]
+            self.cur.execute(f"""
+                SELECT id, description_compressed, cover_url, server_path
+                FROM files
+                WHERE id IN ({', '.join(['?'] * len(batch))})
+            """, batch)
+
+            for row in self.cur.fetchall():
+                entry = (row[1], row[2], row[3])
+                self.details_cache.put(row[0], entry)
+                details[row[0]] = entry
+
+        for file in light:
+            entry = details.get(file.file_id)
+            if entry is None:
+                continue
+
+            description_compressed, cover_url, server_path = entry
+            if 'description' in fields:
+                file.load_description(description_compressed)
+            if 'cover_url' in fields:
+                file.cover_url = cover_url
+            if 'server_path' in fields:
+                file.server_path = server_path
+
+            file.hydrated = set(DETAIL_FIELDS) <= set(fields)
+
+        return files
+
     def search(
         self,
         query_text=None,
@@ -82,22 +343,458 @@ class FilesRepository:
         local_only=False,
         limit=50,
         offset=0,
-        order_by=None
+        order_by=None,
+        timeout_ms=None,
+        extension=None,
+        is_journal=None,
+        after=None,
+        match_columns=None,
+        match_mode='auto',
+        author_id=None,
     ):
-        sql = """
-        SELECT f.*, t.path AS torrent_path, t.magnet_link as torrent_magnet_link,
-            tf.is_complete as is_complete, tf.local_path as local_path
-        FROM files f
+        return self.search_page(
+            query_text=query_text,
+            language=language,
+            year=year,
+            md5=md5,
+            torrent_id=torrent_id,
+            local_only=local_only,
+            limit=limit,
+            offset=offset,
+            order_by=order_by,
+            timeout_ms=timeout_ms,
+            extension=extension,
+            is_journal=is_journal,
+            after=after,
+            match_columns=match_columns,
+            match_mode=match_mode,
+            author_id=author_id,
+        ).files
+
+    def search_page(
+        self,
+        query_text=None,
+        language=None,
+        year=None,
+        md5=None,
+        torrent_id=None,
+        local_only=False,
+        limit=50,
+        offset=0,
+        order_by=None,
+        timeout_ms=None,
+        extension=None,
+        is_journal=None,
+        after=None,
+        match_columns=None,
+        match_mode='auto',
+        author_id=None,
+    ) -> SearchPage:
+        """
+        Search page of light rows (see hydrate()) ordered by order_by
+        ('id', 'year', 'title' or 'rank', optionally followed by ASC/DESC). Pass next_cursor of a page as
+        `after` to get the next one, offset is only used without `after`.
+        match_columns restricts query_text to some of utils.fts.FTS_COLUMNS,
+        match_mode picks the index, see repositories.planner.MATCH_MODES.
+        author_id restricts results to files of an author, see find_authors().
+        """
+        sort, descending = self._parse_order_by(order_by, query_text)
+        keyed = sort in SORT_KEY_COLUMNS and self.sort_keys_ready()
+
+        search_hash = query_hash(
+            query_text, language, year, md5, torrent_id, local_only,
+            extension, is_journal, sort, descending, match_columns, match_mode, keyed,
+            author_id,
+        )
+        position = None
+        if after:
+            position = decode_cursor(after, search_hash, 'ranked' if sort == 'rank' else 'keyset')
+
+        query = dict(
+            query_text=query_text,
+            language=language,
+            year=year,
+            md5=md5,
+            torrent_id=torrent_id,
+            local_only=local_only,
+            extension=extension,
+            is_journal=is_journal,
+            match_columns=match_columns,
+            match_mode=match_mode,
+            author_id=author_id,
+        )
+
+        if sort == 'rank':
+            return self._search_ranked(
+                query, position, search_hash, limit, offset, descending, timeout_ms
+            )
+
+        plan, select, select_params, sql, filters, params = self.build_search_query(
+            LIST_COLUMNS, **query
+        )
+
+        # FTS5 handles rowid order and ranges itself, file_authors is
+        # walked in file_id order
+        id_column = 'f.id'
+        if plan.driver == 'fts':
+            id_column = f"{plan.fts_table}.rowid"
+        elif plan.driver == 'author':
+            id_column = 'fa.file_id'
+        direction = 'DESC' if descending else 'ASC'
+        op = '<' if descending else '>'
+
+        if sort == 'id':
+            order = f"{id_column} {direction}"
+            if position:
+                filters.append(f"{id_column} {op} ?")
+                params.append(position['i'])
+        elif keyed:
+            # keys are never NULL, the index serves both directions
+            column = SORT_KEY_COLUMNS[sort][0]
+            order = f"{column} {direction}, {id_column} {direction}"
+            if position:
+                filters.append(f"({column}, {id_column}) {op} (?, ?)")
+                params += [position['v'], position['i']]
+        else:
+            column = SORT_COLUMNS[sort]
+            order = f"{column} {direction} NULLS FIRST, {id_column} {direction}"
+
+            if position and position['v'] is None:
+                filters.append(f"(({column} IS NULL AND {id_column} {op} ?) OR {column} IS NOT NULL)")
+                params.append(position['i'])
+            elif position:
+                filters.append(f"({column} {op} ? OR ({column} = ? AND {id_column} {op} ?))")
+                params += [position['v'], position['v'], position['i']]
+
+        if filters:
+            sql += " WHERE " + " AND ".join(filters)
+
+        sql += f" ORDER BY {order} LIMIT ? OFFSET ?"
+        params.append(limit + 1)
+        params.append(0 if position else offset)
+
+        with query_deadline(self.conn, timeout_ms):
+            self.rows_cur.execute(select + sql, select_params + params)
+            rows = self.rows_cur.fetchall()
+
+        results: List[FileModel]
+        results = list(map(FILE_ROWS.factory(self.rows_cur.description), rows[:limit]))
+        self._fill_local_status(results)
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = results[-1]
+            value = getattr(last, sort) if sort != 'id' else None
+            if keyed:
+                value = SORT_KEY_COLUMNS[sort][1](value)
+
+            next_cursor = encode_cursor({
+                'h': search_hash,
+                'v': value,
+                'i': last.file_id,
+            })
+
+        return SearchPage(files=results, next_cursor=next_cursor)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Typeahead completions of the last word of prefix, most frequent first"""
+        return self.terms.suggest(prefix, limit)
+
+    def find_authors(self, prefix: str, limit: int = 20) -> List[AuthorModel]:
+        """Authors whose normalized name starts with prefix, for author_id filters"""
+        return self.authors.find_by_prefix(prefix, limit)
+
+    def find_author(self, name: str) -> Optional[AuthorModel]:
+        return self.authors.find_by_name(name)
+
+    def cached_search_page(self, **kwargs) -> SearchPage:
+        """search_page() through the result cache shared by all processes"""
+        return result_cache.get_or_compute(
+            'search_page',
+            kwargs,
+            self.changes.versions(SEARCH_TABLES),
+            lambda: self.search_page(**kwargs),
+        )
+
+    def iter_search(
+        self,
+        chunk_size: int = 1000,
+        fields=(),
+        timeout_ms: Optional[int] = None,
+        **query,
+    ) -> Iterator[FileModel]:
+        """
+        All files matching the search_page() filters in id order, read in
+        chunks of chunk_size (see chunk_query()). Each chunk is its own
+        statement, so no read transaction spans the iteration and memory
+        does not grow with the result. fields among DETAIL_FIELDS are
+        hydrated per chunk.
+        """
+        hydrated = tuple(f for f in fields if f in DETAIL_FIELDS)
+        mode, sql, params, (first, last) = self.chunk_query(chunk_size, **query)
+
+        position = first - 1
+        while position < last:
+            if mode == 'keyset':
+                chunk_params = params + [position, chunk_size]
+            else:
+                chunk_params = params + [position + 1, min(last, position + chunk_size * self.WINDOW_FACTOR)]
+
+            with query_deadline(self.conn, timeout_ms):
+                self.rows_cur.execute(sql, chunk_params)
+                rows = self.rows_cur.fetchall()
+
+            files: List[FileModel]
+            files = list(map(FILE_ROWS.factory(self.rows_cur.description), rows))
+            self._fill_local_status(files)
+            if hydrated:
+                self.hydrate(files, hydrated)
+
+            yield from files
+
+            if mode == 'keyset':
+                if len(rows) < chunk_size:
+                    return
+                position = files[-1].file_id
+            else:
+                position = chunk_params[-1]
+
+    def chunk_query(self, chunk_size: int, **query) -> Tuple[str, str, list, Tuple[int, int]]:
+        """
+        Statement iter_search() reads chunks with: (mode, sql, params, id
+        bounds). 'keyset' statements take (after_id, limit) and walk an
+        order ending in file id. Plans that would sort the remaining matches
+        for every chunk (e.g. language alone, idx_files_language_year is in
+        year order) walk fixed windows of WINDOW_FACTOR * chunk_size ids of
+        the primary key instead, 'window' statements take (first_id,
+        last_id). Few matches are still read by keyset, windows would scan
+        the whole table.
+        """
+        plan, select, select_params, sql, filters, params = self.build_search_query(LIST_COLUMNS, **query)
+
+        bounds = plan.id_range or self.conn.execute("SELECT min(id), max(id) FROM files").fetchone()
+        bounds = (bounds[0] or 0, bounds[1] or -1)
+
+        # the driving table's own order, f.id would be sorted
+        id_column = 'f.id'
+        if plan.driver == 'fts':
+            id_column = f"{plan.fts_table}.rowid"
+        elif plan.driver == 'author':
+            id_column = 'fa.file_id'
+        elif plan.driver == 'local':
+            id_column = 'tf.file_id'
+
+        where = " WHERE " + " AND ".join(filters + [f"{id_column} > ?"])
+        keyset = f"{select}{sql}{where} ORDER BY {id_column} LIMIT ?"
+        keyset_params = select_params + params
+
+        if plan.driver not in ('scan', 'index'):
+            return 'keyset', keyset, keyset_params, bounds
+
+        details = self.conn.execute(
+            "EXPLAIN QUERY PLAN " + keyset, keyset_params + [0, chunk_size]
+        ).fetchall()
+        if not any('TEMP B-TREE' in row[-1] for row in details):
+            return 'keyset', keyset, keyset_params, bounds
+
+        estimate = self.planner.estimate_rows(query.get('query_text'), self._plan_filters(
+            query.get('md5'), query.get('torrent_id'), query.get('language'), query.get('extension'),
+            query.get('year'), query.get('is_journal'),
+        ))
+        if estimate is not None and estimate <= chunk_size * self.KEYSET_MAX_CHUNKS:
+            return 'keyset', keyset, keyset_params, bounds
+
+        # NOT INDEXED still allows rowid ranges, filters are checked per row.
+        # Joins of sql other than torrents are not carried over, local_only
+        # becomes a filter as well
+        window_filters = list(filters)
+        if query.get('local_only'):
+            window_filters.append("EXISTS (SELECT 1 FROM torrent_files tf WHERE tf.file_id = f.id)")
+
+        window = (
+            f"{select} FROM files f NOT INDEXED LEFT JOIN torrents t ON t.id = f.torrent_id"
+            " WHERE " + " AND ".join(window_filters + ["f.id BETWEEN ? AND ?"]) + " ORDER BY f.id"
+        )
+        return 'window', window, select_params + params, bounds
+
+    def resolve_md5s(
+        self,
+        md5s: Iterable[str],
+        batch_size: int = RESOLVE_BATCH_SIZE,
+        details: bool = True,
+    ) -> Iterator[Tuple[str, Optional[FileModel]]]:
+        """
+        (md5, file or None) for each distinct md5 of a batch, batches of
+        batch_size read from md5s as they come. A batch is sorted and
+        joined against the md5 index as one JSON array parameter, which
+        walks the index in order and, unlike a temporary table, works on
+        read-only connections. details also selects DETAIL_FIELDS.
+        """
+        columns = f"{LIST_COLUMNS}, {LOCAL_COLUMNS}"
+        if details:
+            columns += ", f.server_path, f.cover_url, f.description_compressed"
+
+        sql = f"""
+        SELECT {columns}
+        FROM json_each(?) j
+        CROSS JOIN files f ON f.md5 = j.value
         LEFT JOIN torrents t ON t.id = f.torrent_id
+        LEFT JOIN torrent_files tf ON f.id = tf.file_id
         """
 
+        md5s = iter(md5s)
+        while True:
+            chunk = list(itertools.islice(md5s, batch_size))
+            if not chunk:
+                return
+
+            batch = sorted({md5.strip().lower() for md5 in chunk} - {''})
+            self.rows_cur.execute(sql, (json.dumps(batch),))
+            factory = FILE_ROWS.factory(self.rows_cur.description)
+            found = {}
+            for row in self.rows_cur.fetchall():
+                file = factory(row)
+                found[file.md5] = file
+
+            for md5 in batch:
+                yield md5, found.get(md5)
+
+    def _parse_order_by(self, order_by: Optional[str], query_text):
+        if not order_by:
+            return 'id', False
+
+        parts = order_by.split()
+        sort = parts[0].lower()
+        descending = len(parts) > 1 and parts[1].upper() == 'DESC'
+
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"unsupported order_by {order_by}")
+
+        if sort == 'rank' and not query_text:
+            return 'id', descending
+
+        return sort, descending
+
+    def build_search_query(
+        self,
+        columns,
+        query_text=None,
+        language=None,
+        year=None,
+        md5=None,
+        torrent_id=None,
+        local_only=False,
+        extension=None,
+        is_journal=None,
+        match_columns=None,
+        match_mode='auto',
+        author_id=None,
+        with_rank=False,
+        route=None,
+    ):
+        """
+        Planned SELECT of columns over files matching the filters:
+        (plan, select, select_params, from_sql, where_filters, params).
+        route is the (FTS table, MATCH) of query_text if already routed.
+        """
+        select = f"SELECT {columns}"
+        select_params = []
+
+        fts_table = 'files_fts'
+        if query_text:
+            fts_table, query_text = route or self._route_match(query_text, match_columns, match_mode)
+
         filters = []
         params = []
 
-        if query_text:
-            sql += " JOIN files_fts ON files_fts.rowid = f.id"
-            filters.append("files_fts MATCH ?")
+        plan = self.planner.plan(
+            query_text,
+            self._plan_filters(md5, torrent_id, language, extension, year, is_journal, author_id),
+            fts_table,
+            local_only,
+        )
+
+        if plan.driver == 'fts':
+            # CROSS JOIN keeps the FTS table as the outer loop
+            sql = f" FROM {fts_table} CROSS JOIN files f ON f.id = {fts_table}.rowid"
+            filters.append(f"{fts_table} MATCH ?")
             params.append(query_text)
+        elif plan.driver == 'local':
+            sql = " FROM torrent_files tf CROSS JOIN files f ON f.id = tf.file_id"
+        elif plan.driver == 'author':
+            # one range of the file_authors primary key
+            sql = " FROM file_authors fa CROSS JOIN files f ON f.id = fa.file_id"
+            filters.append("fa.author_id = ?")
+            params.append(author_id)
+        else:
+            sql = " FROM files f"
+            if plan.index:
+                sql += f" INDEXED BY {plan.index}"
+
+        if plan.id_range:
+            # FTS5 restricts its doclists to rowid ranges too
+            id_column = f"{fts_table}.rowid" if plan.driver == 'fts' else 'f.id'
+            filters.append(f"{id_column} BETWEEN ? AND ?")
+            params += list(plan.id_range)
+
+        if plan.driver in ('index', 'local', 'author') and query_text:
+            # probe FTS for each candidate row only
+            filters.append(
+                f"EXISTS (SELECT 1 FROM {fts_table} WHERE {fts_table} MATCH ? AND {fts_table}.rowid = f.id)"
+            )
+            params.append(query_text)
+
+            if with_rank:
+                select += f", (SELECT rank FROM {fts_table} WHERE {fts_table} MATCH ? AND {fts_table}.rowid = f.id) AS rank"
+                select_params.append(query_text)
+
+        sql += " LEFT JOIN torrents t ON t.id = f.torrent_id"
+
+        file_filters, file_params = self._file_filters(
+            language, year, md5, extension, is_journal, torrent_id,
+            author_id if plan.driver != 'author' else None,
+        )
+        filters += file_filters
+        params += file_params
+
+        if local_only and plan.driver != 'local':
+            sql += " INNER JOIN torrent_files tf ON f.id = tf.file_id"
+
+        return plan, select, select_params, sql, filters, params
+
+    def _route_match(self, query_text, match_columns, match_mode):
+        """FTS table and MATCH expression of a user query"""
+        layout = fts_layout(self.conn)
+        if match_mode == 'fuzzy' and fuzzy_expandable(query_text):
+            fts_table, match = 'files_fts', self.terms.fuzzy_match(query_text, self.FUZZY_BUDGET_MS)
+        else:
+            fts_table, match = route_query(query_text, match_mode, layout, match_columns)
+
+        if match_columns and fts_table == TRIGRAM_TABLE:
+            match = column_filter(match, match_columns, TRIGRAM_COLUMNS)
+        elif match_columns:
+            if layout.columns == LEGACY_FTS_COLUMNS:
+                raise ValueError("column filters need the multi-column FTS layout, run tools.rebuild_fts")
+
+            match = column_filter(match, match_columns)
+
+        return fts_table, match
+
+    def _plan_filters(self, md5, torrent_id, language, extension, year, is_journal, author_id=None):
+        return {
+            'md5': md5 or None,
+            'torrent_id': torrent_id or None,
+            'language': language or None,
+            'extension': extension or None,
+            'year': year or None,
+            'is_journal': int(is_journal) if is_journal is not None else None,
+            'author_id': author_id or None,
+        }
+
+    def _file_filters(self, language, year, md5, extension, is_journal, torrent_id, author_id=None):
+        """WHERE conditions on files f columns"""
+        filters = []
+        params = []
 
         if language:
             filters.append('f.language = ?')
@@ -111,37 +808,177 @@ class FilesRepository:
             filters.append("f.md5 = ?")
             params.append(md5)
 
-        if local_only:
-            sql += " INNER JOIN torrent_files tf ON f.id = tf.file_id"
-            filters.append("f.id IN (SELECT file_id FROM torrent_files)")
-        else:
-            sql += " LEFT JOIN torrent_files tf ON f.id = tf.file_id"
+        if extension:
+            filters.append("f.extension = ?")
+            params.append(extension)
+
+        if is_journal is not None:
+            filters.append("f.is_journal = ?")
+            params.append(int(is_journal))
 
         if torrent_id:
             filters.append("f.torrent_id = ?")
             params.append(torrent_id)
 
+        if author_id:
+            filters.append("f.id IN (SELECT file_id FROM file_authors WHERE author_id = ?)")
+            params.append(author_id)
+
+        return filters, params
+
+    def _search_ranked(self, query, position, search_hash, limit, offset, descending, timeout_ms):
+        start = position['p'] if position else offset
+        key = position['r'] if position else None
+        entry = self.ranked_ids_cache.get(key) if key else None
+
+        # ids needed for the page and to tell whether another one follows
+        end = start + limit + 1
+
+        usable = entry is not None and entry.base <= start
+        if usable and (end <= entry.base + len(entry.ids) or entry.exhausted):
+            pass
+        else:
+            # routed once per search, fuzzy expansion takes a while
+            query = dict(query, route=self._route_match(
+                query['query_text'], query['match_columns'], query['match_mode']
+            ))
+
+            if usable and entry.resume is not None:
+                entry = self._top_ranked_ids(query, entry, end, descending, timeout_ms)
+                if entry.resume is None:
+                    entry = self._joined_ranked_ids(query, start, end, descending, timeout_ms)
+            else:
+                entry = self._new_ranked_ids(query, start, end, descending, timeout_ms)
+
+            key = self.ranked_ids_cache.put(entry)
+
+        page_ids = entry.ids[start - entry.base:end - entry.base]
+
+        files_by_id = {
+            f.file_id: f for f in self.find_by_ids(page_ids[:limit], timeout_ms)
+        } if page_ids else {}
+
+        next_cursor = None
+        if len(page_ids) > limit:
+            next_cursor = encode_cursor({'h': search_hash, 'r': key, 'p': start + limit})
+
+        return SearchPage(
+            files=[files_by_id[id] for id in page_ids[:limit] if id in files_by_id],
+            next_cursor=next_cursor,
+        )
+
+    def _new_ranked_ids(self, query, start, end, descending, timeout_ms) -> '_RankedIds':
+        fts_table, match = query['route']
+        plan = self.planner.plan(match, self._plan_filters(
+            query['md5'], query['torrent_id'], query['language'],
+            query['extension'], query['year'], query['is_journal'], query['author_id'],
+        ), fts_table, query['local_only'])
+
+        if plan.driver == 'fts':
+            residual = self._has_residual_filters(query)
+            # without residual filters FTS positions are result positions
+            base = 0 if residual else start
+            entry = self._top_ranked_ids(
+                query, _RankedIds(base=base, ids=[], exhausted=False, resume=base),
+                end, descending, timeout_ms,
+            )
+            if entry.resume is not None:
+                return entry
+
+        return self._joined_ranked_ids(query, start, end, descending, timeout_ms)
+
+    def _joined_ranked_ids(self, query, start, end, descending, timeout_ms) -> '_RankedIds':
+        """
+        Ranked ids from the planned join over all matching rows, for
+        index-first plans and filters rejecting most FTS matches
+        """
+        plan, select, select_params, sql, filters, params = self.build_search_query(
+            "f.id", with_rank=True, **query
+        )
+        sql += " WHERE " + " AND ".join(filters)
+        sql += f" ORDER BY rank {'DESC' if descending else 'ASC'} LIMIT ? OFFSET ?"
+        ids_limit = max(self.RANKED_IDS_LIMIT, end - start)
+        params += [ids_limit, start]
+
+        with query_deadline(self.conn, timeout_ms):
+            self.cur.execute(select + sql, select_params + params)
+            ids = [row[0] for row in self.cur.fetchall()]
+
+        return _RankedIds(base=start, ids=ids, exhausted=len(ids) < ids_limit, resume=None)
+
+    def _has_residual_filters(self, query):
+        return bool(
+            query['language'] or query['year'] or query['md5'] or query['extension'] or
+            query['is_journal'] is not None or query['torrent_id'] or query['local_only'] or
+            query['author_id']
+        )
+
+    def _top_ranked_ids(self, query, entry: '_RankedIds', end, descending, timeout_ms) -> '_RankedIds':
+        """
+        Top-k phase of a ranked search: extend entry with rowids read in
+        rank order from the FTS table alone, checking residual filters
+        on files per chunk, until it covers `end` plus RANKED_PREFETCH.
+        Returns an entry without resume when MAX_RANKED_SCAN matches or
+        RANKED_IDS_LIMIT ids are not enough.
+        """
+        fts_table, match = query['route']
+
+        filters, params = self._file_filters(
+            query['language'], query['year'], query['md5'],
+            query['extension'], query['is_journal'], query['torrent_id'], query['author_id'],
+        )
+        if query['local_only']:
+            filters.append("f.id IN (SELECT file_id FROM torrent_files)")
+
+        target = end + self.RANKED_PREFETCH - entry.base
         if filters:
-            sql += " WHERE " + " AND ".join(filters)
+            scan_limit = self.MAX_RANKED_SCAN - entry.resume
+        else:
+            scan_limit = target - len(entry.ids)
 
-        if order_by:
-            sql += f" ORDER BY {order_by} NULLS FIRST"
+        ids = list(entry.ids)
+        resume = entry.resume
+        exhausted = False
 
-        sql += " LIMIT ? OFFSET ?"
-        params.append(limit)
-        params.append(offset)
+        if scan_limit <= 0 or len(ids) >= self.RANKED_IDS_LIMIT:
+            return _RankedIds(base=entry.base, ids=ids, exhausted=False, resume=None)
 
-        self.cur.execute(sql, params)
+        with query_deadline(self.conn, timeout_ms):
+            self.rows_cur.execute(f"""
+                SELECT rowid FROM {fts_table}
+                WHERE {fts_table} MATCH ?
+                ORDER BY rank {'DESC' if descending else 'ASC'}
+                LIMIT ? OFFSET ?
+            """, (match, scan_limit, resume))
 
-        results: List[FileModel]
-        results = []
-        for row in self.cur.fetchall():
-            model = self._row_to_model(row)
+            scanned = 0
+            while len(ids) < target:
+                chunk = [row[0] for row in self.rows_cur.fetchmany(self.RANKED_CHUNK)]
+                scanned += len(chunk)
+                resume += len(chunk)
 
-            model.load_description(row['description_compressed'])
-            results.append(model)
+                ids += self._filter_ids(chunk, filters, params) if filters and chunk else chunk
 
-        return results
+                if len(chunk) < self.RANKED_CHUNK:
+                    # all matches read, or scan_limit reached
+                    exhausted = scanned < scan_limit
+                    break
+
+        if len(ids) < target and not exhausted:
+            # scan budget spent on rows rejected by filters
+            return _RankedIds(base=entry.base, ids=ids, exhausted=False, resume=None)
+
+        return _RankedIds(base=entry.base, ids=ids, exhausted=exhausted, resume=resume)
+
+    def _filter_ids(self, ids: List[int], filters, params):
+        """ids of files matching filters, in the given order"""
+        self.cur.execute(f"""
+            SELECT f.id FROM files f
+            WHERE f.id IN ({', '.join(['?'] * len(ids))}) AND {' AND '.join(filters)}
+        """, ids + params)
+        matching = {row[0] for row in self.cur.fetchall()}
+
+        return [id for id in ids if id in matching]
 
     def set_byteoffset_by_md5(self, md5: str, byteoffset: int):
         self.cur.execute(
@@ -149,25 +986,3 @@ class FilesRepository:
             (byteoffset, md5, )
         )
         return self.cur.rowcount
-
-    def _row_to_model(self, row):
-        model = FileModel(
-            file_id=row['id'],
-            md5=row['md5'],
-            server_path=row['server_path'],
-            ipfs_cid=row['ipfs_cid'],
-            torrent=row['torrent_path'],
-            torrent_id=row['torrent_id'],
-            torrent_magnet_link=row['torrent_magnet_link'],
-            title=row['title'],
-            cover_url=row['cover_url'],
-            extension=row['extension'],
-            year=row['year'],
-            author=row['author'],
-            is_complete=row['is_complete'],
-            byteoffset=row['byteoffset'],
-            is_journal=row['is_journal'] == 1,
-            local_path=row['local_path'],
-        )
-
-        return model
@@ -0,0 +1,292 @@
+import re
+import sqlite3
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from repositories.stats import StatsRepository
+from utils.db import index_names
+from utils.fts import TRIGRAM_COLUMNS, TRIGRAM_TABLE, FtsLayout
+
+# Index driving an index-first plan for each filter
+FILTER_INDEXES = {
+    'torrent_id': 'idx_files_torrent_id',
+    'language': 'idx_files_language_year',
+    'extension': 'idx_files_extension',
+    'year': 'idx_files_year',
+    'is_journal': 'idx_files_is_journal',
+}
+
+FTS_OPERATORS = {'AND', 'OR', 'NOT', 'NEAR'}
+
+# Match modes of FilesRepository.search(match_mode=...)
+# auto - FTS5 syntax as is, plain words as 'words' or 'substring'
+# words - all words must match
+# prefix - all words must match, the last one as a prefix
+# substring - words may occur inside other words (trigram index)
+# fuzzy - unknown words also match close indexed terms (repositories.terms)
+MATCH_MODES = ('auto', 'words', 'prefix', 'substring', 'fuzzy')
+
+# Shortest word the trigram tokenizer can match
+TRIGRAM_MIN_LENGTH = 3
+
+_syntax_re = re.compile(r'["():*^{}]|\b(AND|OR|NOT|NEAR)\b')
+_punctuation_re = re.compile(r'[^\w\s]')
+
+_token_re = re.compile(r'(\w+)"?(\*?)')
+# column filters: "title:", "{title author}:"
+_column_filter_re = re.compile(r'(\{[^}]*\}|\w+)\s*:')
+
+
+def fts_tokens(query: str):
+    """Approximate unicode61 tokenization: (token, is_prefix) pairs"""
+    query = _column_filter_re.sub(' ', query)
+    folded = unicodedata.normalize('NFKD', query)
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+
+    tokens = []
+    for word, star in _token_re.findall(folded):
+        if word in FTS_OPERATORS:
+            continue
+        tokens.append((word.lower(), bool(star)))
+
+    return tokens
+
+
+def fuzzy_expandable(query_text: str) -> bool:
+    """
+    query_text is plain words the fuzzy mode can expand, FTS syntax and
+    queries without words are matched like the 'words' mode
+    """
+    return not _syntax_re.search(query_text) and bool(fts_tokens(query_text))
+
+
+def quote_term(word: str):
+    return '"' + word.replace('"', '""') + '"'
+
+
+def route_query(
+    query_text: str,
+    mode: str,
+    layout: FtsLayout,
+    match_columns: Optional[List[str]] = None,
+):
+    """FTS table and MATCH expression for a user query: (table, match)"""
+    if mode not in MATCH_MODES:
+        raise ValueError(f"unknown match mode {mode}")
+
+    words = query_text.split()
+    trigram_usable = layout.has_trigram and layout.trigram_phrases and \
+        set(match_columns or TRIGRAM_COLUMNS) <= set(TRIGRAM_COLUMNS)
+
+    if mode == 'auto':
+        if _syntax_re.search(query_text):
+            return 'files_fts', query_text
+
+        # "c++", "o'neil" and alike do not survive word tokenization
+        if trigram_usable and _punctuation_re.search(query_text):
+            mode = 'substring'
+        else:
+            mode = 'words'
+
+    if mode == 'substring':
+        long_words = [w for w in words if len(w) >= TRIGRAM_MIN_LENGTH]
+        if trigram_usable and long_words:
+            return TRIGRAM_TABLE, ' '.join(quote_term(w) for w in long_words)
+
+        mode = 'prefix'
+
+    # fuzzy expansion needs the database, FilesRepository does it for
+    # queries passing fuzzy_expandable()
+    if mode == 'fuzzy':
+        mode = 'words'
+
+    match = ' '.join(quote_term(w) for w in words)
+    if mode == 'prefix' and words:
+        match += '*'
+
+    return 'files_fts', match
+
+
+@dataclass
+class SearchPlan:
+    # 'fts' - walk FTS matches, then check filters on files
+    # 'index' - walk a files index, then probe FTS per candidate row
+    # 'local' - walk torrent_files (local only searches), then probe FTS
+    # 'author' - walk file_authors of one author, then probe FTS
+    # 'scan' - no query text, left to SQLite
+    driver: str
+    index: Optional[str] = None
+    fts_table: str = 'files_fts'
+
+    fts_rows: Optional[int] = None
+    index_rows: Optional[int] = None
+
+    # file id range holding all rows of a torrent_id filter, see
+    # tools.recluster
+    id_range: Optional[Tuple[int, int]] = None
+
+
+class SearchPlanner:
+    """
+    Picks between FTS-first and index-first execution of a search using
+    cached statistics (files_stats, fts5vocab).
+    """
+
+    # Relative cost of probing FTS for a single rowid per query token,
+    # compared to fetching a files row for an FTS match
+    FTS_PROBE_COST = 2.0
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.conn = conn
+        self.stats = StatsRepository(conn, cursor)
+
+    def estimate_fts(self, query_text: str) -> Optional[int]:
+        tokens = fts_tokens(query_text)
+        if not tokens:
+            return None
+
+        counts = []
+        for token, is_prefix in tokens:
+            if is_prefix:
+                counts.append(self.stats.prefix_docs(token))
+            else:
+                counts.append(self.stats.term_docs(token))
+
+        if 'OR' in query_text.split():
+            return sum(counts)
+
+        return min(counts)
+
+    def estimate_filter(self, filters: Dict[str, Any]):
+        """Best index for filters and estimated rows it yields"""
+        # older catalogs may lack some, see tools.build_filter_indexes
+        indexes = index_names(self.conn)
+
+        best = None
+        for name, value in filters.items():
+            if value is None or FILTER_INDEXES.get(name) not in indexes:
+                continue
+
+            rows = self.stats.count(name, value)
+            if name == 'language' and filters.get('year') is not None:
+                # served by composite (language, year) index
+                total = self.stats.total() or 1
+                rows = rows * self.stats.count('year', filters['year']) // total
+
+            if best is None or rows < best[1]:
+                best = (FILTER_INDEXES[name], rows)
+
+        return best
+
+    def estimate_rows(self, query_text: Optional[str], filters: Dict[str, Any]) -> Optional[int]:
+        """Matching rows assuming independent filters, None without statistics"""
+        total = self.stats.total()
+        if total is None:
+            return None
+
+        rows = float(total)
+        if query_text:
+            rows = self.estimate_fts(query_text) or 0
+
+        for name, value in filters.items():
+            if value is not None and name in FILTER_INDEXES:
+                rows *= self.stats.count(name, value) / max(total, 1)
+
+        if filters.get('author_id') is not None:
+            rows *= self.stats.author_count(filters['author_id']) / max(total, 1)
+
+        return int(rows)
+
+    def plan(
+        self,
+        query_text: Optional[str],
+        filters: Dict[str, Any],
+        fts_table: str = 'files_fts',
+        local_only: bool = False,
+    ) -> SearchPlan:
+        plan = self._plan(query_text, filters, fts_table, local_only)
+
+        torrent_id = filters.get('torrent_id')
+        if torrent_id is not None and plan.driver in ('fts', 'index', 'scan') and \
+                plan.index in (None, FILTER_INDEXES['torrent_id']):
+            # a rowid range of a reclustered torrent beats its index
+            plan.id_range = self.stats.torrent_range(torrent_id)
+            if plan.id_range:
+                plan.index = None
+
+        return plan
+
+    def _plan(
+        self,
+        query_text: Optional[str],
+        filters: Dict[str, Any],
+        fts_table: str,
+        local_only: bool,
+    ) -> SearchPlan:
+        if filters.get('md5') is not None and query_text:
+            # unique lookup always wins
+            return SearchPlan(driver='index', index_rows=1, fts_table=fts_table)
+
+        if local_only:
+            return self._plan_subset('local', self.stats.local_count(), query_text, fts_table)
+
+        if filters.get('author_id') is not None:
+            author_rows = self.stats.author_count(filters['author_id'])
+            return self._plan_subset('author', author_rows, query_text, fts_table)
+
+        if not query_text:
+            return SearchPlan(driver='scan')
+
+        if fts_table != 'files_fts':
+            # no vocabulary statistics for other indexes
+            return SearchPlan(driver='fts', fts_table=fts_table)
+
+        if self.stats.total() is None:
+            # no statistics collected yet
+            return SearchPlan(driver='fts')
+
+        fts_rows = self.estimate_fts(query_text)
+        best = self.estimate_filter(filters)
+        if fts_rows is None or best is None:
+            return SearchPlan(driver='fts', fts_rows=fts_rows)
+
+        index, index_rows = best
+        tokens = len(fts_tokens(query_text))
+
+        if index_rows * (1 + tokens * self.FTS_PROBE_COST) < fts_rows:
+            return SearchPlan(
+                driver='index',
+                index=index,
+                fts_rows=fts_rows,
+                index_rows=index_rows,
+            )
+
+        return SearchPlan(driver='fts', fts_rows=fts_rows, index_rows=index_rows)
+
+    def _plan_subset(
+        self,
+        driver: str,
+        subset_rows: int,
+        query_text: Optional[str],
+        fts_table: str,
+    ) -> SearchPlan:
+        """Plan of searches within a small set of files walked by driver"""
+        if not query_text:
+            return SearchPlan(driver=driver, index_rows=subset_rows)
+
+        fts_rows = None
+        if fts_table == 'files_fts' and self.stats.total() is not None:
+            fts_rows = self.estimate_fts(query_text)
+
+        tokens = len(fts_tokens(query_text))
+        if fts_rows is not None and fts_rows < subset_rows * (1 + tokens * self.FTS_PROBE_COST):
+            return SearchPlan(driver='fts', fts_rows=fts_rows, index_rows=subset_rows)
+
+        # probing few files beats walking unknown FTS matches
+        return SearchPlan(
+            driver=driver,
+            fts_table=fts_table,
+            fts_rows=fts_rows,
+            index_rows=subset_rows,
+        )
@@ -0,0 +1,144 @@
+import sqlite3
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.db import create_shadow_table, fill_table, swap_shadow_tables
+
+# Columns of files with cached value counts, facet name -> column
+STATS_FACETS = {
+    'language': 'language',
+    'extension': 'extension',
+    'year': 'year',
+    'is_journal': 'is_journal',
+    'torrent_id': 'torrent_id',
+}
+
+# Columns of the files_facets aggregate (counts per value combination)
+CUBE_COLUMNS = ('language', 'extension', 'year', 'is_journal')
+
+# Facet holding the total number of files
+TOTAL_FACET = ''
+
+
+class StatsRepository:
+    """Cached value counts of files columns and FTS term frequencies"""
+
+    CACHE_TTL = 600
+
+    # shared by all repositories of the process
+    _counts: Dict[Tuple[str, str], int]
+    _counts = {}
+    _loaded_at = 0.0
+
+    _term_docs: Dict[str, int]
+    _term_docs = {}
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.conn = conn
+        self.cur = cursor
+
+    def refresh(self):
+        """
+        Recount values into shadow tables swapped in at the end, scans
+        files so may take a while but never holds the write lock long
+        """
+        facets = create_shadow_table(self.cur, 'files_facets')
+        stats = create_shadow_table(self.cur, 'files_stats')
+
+        fill_table(self.conn, facets, CUBE_COLUMNS + ('count',), f"""
+            SELECT {', '.join(CUBE_COLUMNS)}, count(*) FROM files
+            GROUP BY {', '.join(CUBE_COLUMNS)}
+        """)
+
+        fill_table(self.conn, stats, ('facet', 'value', 'count'), f"""
+            SELECT ?, '', coalesce(sum(count), 0) FROM {facets}
+        """, (TOTAL_FACET,))
+
+        for facet, column in STATS_FACETS.items():
+            # cube columns are counted from the cube, others from their index
+            source = facets if column in CUBE_COLUMNS else 'files'
+            count = 'sum(count)' if column in CUBE_COLUMNS else 'count(*)'
+
+            fill_table(self.conn, stats, ('facet', 'value', 'count'), f"""
+                SELECT ?, {column}, {count} FROM {source}
+                WHERE {column} IS NOT NULL
+                GROUP BY {column}
+            """, (facet,))
+
+        swap_shadow_tables(self.conn, ['files_facets', 'files_stats'])
+        StatsRepository._loaded_at = 0.0
+
+    def _load(self):
+        if time.time() - StatsRepository._loaded_at < self.CACHE_TTL:
+            return
+
+        self.cur.execute("SELECT facet, value, count FROM files_stats")
+        StatsRepository._counts = {
+            (row[0], str(row[1])): row[2] for row in self.cur.fetchall()
+        }
+        StatsRepository._term_docs = {}
+        StatsRepository._loaded_at = time.time()
+
+    def total(self) -> Optional[int]:
+        """Number of files, None if statistics were never collected"""
+        self._load()
+        return StatsRepository._counts.get((TOTAL_FACET, ''))
+
+    def count(self, facet: str, value) -> int:
+        self._load()
+        return StatsRepository._counts.get((facet, str(value)), 0)
+
+    def values(self, facet: str) -> Dict[str, int]:
+        self._load()
+        return {
+            value: count
+            for (f, value), count in StatsRepository._counts.items()
+            if f == facet
+        }
+
+    def local_count(self) -> int:
+        """Files with a torrent_files record, small and changing so not cached"""
+        row = self.conn.execute("SELECT count(*) FROM torrent_files").fetchone()
+        return row[0]
+
+    def author_count(self, author_id: int) -> int:
+        """Files of an author, kept current by repositories.authors"""
+        row = self.conn.execute(
+            "SELECT file_count FROM authors WHERE id = ?", (author_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def torrent_range(self, torrent_id: int) -> Optional[Tuple[int, int]]:
+        """(first_id, last_id) holding all files of a reclustered torrent"""
+        row = self.conn.execute(
+            "SELECT first_id, last_id FROM torrent_id_ranges WHERE torrent_id = ?", (torrent_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def term_docs(self, term: str) -> int:
+        """Number of documents containing an (already tokenized) FTS term"""
+        self._load()
+
+        docs = StatsRepository._term_docs.get(term)
+        if docs is None:
+            self.cur.execute(
+                "SELECT doc FROM files_fts_vocab WHERE term = ?", (term,)
+            )
+            row = self.cur.fetchone()
+            docs = row[0] if row else 0
+            StatsRepository._term_docs[term] = docs
+
+        return docs
+
+    def prefix_docs(self, prefix: str, max_terms: int = 1000) -> int:
+        """Upper bound of documents matching a prefix query"""
+        self.cur.execute("""
+            SELECT sum(doc) FROM (
+                SELECT doc FROM files_fts_vocab
+                WHERE term >= ? AND term < ?
+                LIMIT ?
+            )
+        """, (prefix, prefix + '\U0010ffff', max_terms))
+
+        row = self.cur.fetchone()
+        return (row[0] or 0) if row else 0
@@ -0,0 +1,210 @@
+import sqlite3
+import time
+from typing import List, Tuple
+
+from repositories.planner import fts_tokens, quote_term
+from utils.db import SHADOW_BATCH_SIZE, create_shadow_table, fill_table, swap_shadow_tables
+from utils.fuzzy import deletes, edit_distance
+
+# Terms in fewer documents are left out of files_terms (typos, identifiers)
+MIN_TERM_DOCS = 2
+
+# Prefixes up to this length get precomputed top terms in files_term_prefixes,
+# longer ones range scan files_terms
+MAX_PREFIX_LENGTH = 3
+
+# Terms kept per precomputed prefix
+PREFIX_TOP_TERMS = 20
+
+# Terms read from files_fts_vocab per suggestion before files_terms is built
+VOCAB_SCAN_LIMIT = 2000
+
+# Terms with deletion variants in files_term_deletes for fuzzy matching
+FUZZY_MIN_LENGTH = 4
+FUZZY_MAX_LENGTH = 20
+FUZZY_MIN_DOCS = 3
+
+# Close terms a fuzzy query word is expanded to
+FUZZY_CANDIDATES = 3
+
+# Words of up to this length may differ by one edit, longer ones by two.
+# Longer terms are indexed with their two-deletion variants
+FUZZY_SHORT_WORD = 5
+
+
+def _max_distance(word: str) -> int:
+    return 1 if len(word) <= FUZZY_SHORT_WORD else 2
+
+
+class TermsRepository:
+    """
+    Term document frequencies copied from files_fts_vocab for typeahead
+    suggestions. refresh() rebuilds them and should run after imports.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.conn = conn
+        self.cur = cursor
+
+    def refresh(self):
+        """
+        Reread the FTS vocabulary into shadow tables swapped in at the
+        end, scans the whole index so may take a while but never holds
+        the write lock long
+        """
+        terms = create_shadow_table(self.cur, 'files_terms')
+        prefixes = create_shadow_table(self.cur, 'files_term_prefixes')
+        term_deletes = create_shadow_table(self.cur, 'files_term_deletes')
+
+        fill_table(self.conn, terms, ('term', 'doc'), """
+            SELECT term, doc FROM files_fts_vocab
+            WHERE doc >= ?
+        """, (MIN_TERM_DOCS,))
+
+        for length in range(1, MAX_PREFIX_LENGTH + 1):
+            fill_table(self.conn, prefixes, ('prefix', 'position', 'term', 'doc'), f"""
+                SELECT prefix, position, term, doc FROM (
+                    SELECT substr(term, 1, ?) AS prefix, term, doc,
+                        row_number() OVER (PARTITION BY substr(term, 1, ?) ORDER BY doc DESC, term) AS position
+                    FROM {terms}
+                    WHERE length(term) >= ?
+                )
+                WHERE position <= ?
+            """, (length, length, length, PREFIX_TOP_TERMS))
+
+        self._refresh_deletes(terms, term_deletes)
+
+        swap_shadow_tables(self.conn, ['files_terms', 'files_term_prefixes', 'files_term_deletes'])
+        return self.count()
+
+    def _refresh_deletes(self, terms: str, term_deletes: str, batch_size: int = SHADOW_BATCH_SIZE):
+        """
+        Deletion neighbourhood of frequent terms: variants with one
+        deleted character, two for terms longer than FUZZY_SHORT_WORD
+        """
+        terms_cur = self.conn.cursor()
+        terms_cur.execute(f"""
+            SELECT term FROM {terms}
+            WHERE doc >= ? AND length(term) BETWEEN ? AND ?
+        """, (FUZZY_MIN_DOCS, FUZZY_MIN_LENGTH, FUZZY_MAX_LENGTH))
+
+        while rows := terms_cur.fetchmany(batch_size):
+            self.cur.executemany(
+                f"INSERT OR IGNORE INTO {term_deletes} (variant, term) VALUES (?, ?)",
+                [
+                    (variant, row[0])
+                    for row in rows
+                    if not row[0].isdigit()
+                    for variant in deletes(row[0], _max_distance(row[0]))
+                ]
+            )
+            self.conn.commit()
+
+    def count(self) -> int:
+        row = self.conn.execute("SELECT count(*) FROM files_terms").fetchone()
+        return row[0]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Most frequent (term, docs) starting with an already folded prefix"""
+        if not prefix:
+            return []
+
+        if len(prefix) <= MAX_PREFIX_LENGTH and limit <= PREFIX_TOP_TERMS:
+            self.cur.execute("""
+                SELECT term, doc FROM files_term_prefixes
+                WHERE prefix = ?
+                ORDER BY position
+                LIMIT ?
+            """, (prefix, limit))
+            rows = self.cur.fetchall()
+            if rows or self._built():
+                return [(row[0], row[1]) for row in rows]
+
+        if self._built():
+            self.cur.execute("""
+                SELECT term, doc FROM files_terms
+                WHERE term >= ? AND term < ?
+                ORDER BY doc DESC
+                LIMIT ?
+            """, (prefix, prefix + '\U0010ffff', limit))
+            return [(row[0], row[1]) for row in self.cur.fetchall()]
+
+        # not refreshed yet: most frequent of the first terms in vocabulary order
+        self.cur.execute("""
+            SELECT term, doc FROM files_fts_vocab
+            WHERE term >= ? AND term < ?
+            LIMIT ?
+        """, (prefix, prefix + '\U0010ffff', VOCAB_SCAN_LIMIT))
+        terms = sorted(((row[0], row[1]) for row in self.cur.fetchall()), key=lambda t: -t[1])
+
+        return terms[:limit]
+
+    def suggest(self, text: str, limit: int = 10) -> List[str]:
+        """Completions of the last word of text, earlier words kept as typed"""
+        words = text.split()
+        if not words or text[-1:].isspace():
+            return []
+
+        tokens = fts_tokens(words[-1])
+        if not tokens:
+            return []
+
+        head = ' '.join(words[:-1])
+        return [
+            f"{head} {term}" if head else term
+            for term, _ in self.complete(tokens[-1][0], limit)
+        ]
+
+    def fuzzy_candidates(self, word: str, limit: int = FUZZY_CANDIDATES) -> List[Tuple[str, int]]:
+        """
+        Indexed terms within edit distance of an already folded word as
+        (term, distance), closest and most frequent first
+        """
+        max_distance = _max_distance(word)
+
+        # up to n deletions on both sides meet for terms up to n edits
+        # away, substitutions take one on each side
+        variants = list(deletes(word, max_distance))
+        self.cur.execute(f"""
+            SELECT DISTINCT d.term, t.doc FROM files_term_deletes d
+            JOIN files_terms t ON t.term = d.term
+            WHERE d.variant IN ({', '.join(['?'] * len(variants))})
+        """, variants)
+
+        candidates = []
+        for term, doc in self.cur.fetchall():
+            distance = edit_distance(word, term, max_distance)
+            if distance <= max_distance:
+                candidates.append((distance, -doc, term))
+
+        return [(term, distance) for distance, _, term in sorted(candidates)[:limit]]
+
+    def fuzzy_match(self, query_text: str, budget_ms: float) -> str:
+        """
+        FTS5 expression matching all words of query_text, each unknown
+        word OR-ed with its closest indexed terms. Words left when the
+        budget runs out are matched exactly.
+        """
+        deadline = time.monotonic() + budget_ms / 1000
+
+        parts = []
+        for token, _ in fts_tokens(query_text):
+            terms = [token]
+            if len(token) >= FUZZY_MIN_LENGTH and time.monotonic() < deadline and not self._known(token):
+                terms += [term for term, _ in self.fuzzy_candidates(token) if term != token]
+
+            if len(terms) == 1:
+                parts.append(quote_term(token))
+            else:
+                parts.append('(' + ' OR '.join(quote_term(t) for t in terms) + ')')
+
+        # implicit AND does not combine with parenthesized groups
+        return ' AND '.join(parts)
+
+    def _known(self, term: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM files_terms WHERE term = ?", (term,)
+        ).fetchone() is not None
+
+    def _built(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM files_terms LIMIT 1").fetchone() is not None
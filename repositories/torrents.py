@@ -2,33 +2,66 @@ import sqlite3
 from typing import List, Optional
 
 from models.torrent import TorrentFileModel, TorrentModel
+from utils.db import query_deadline
+from utils.rows import RowMapper, tuple_cursor
+
+# Largest number of bound parameters per IN (...) lookup
+IN_BATCH_SIZE = 500
+
+TORRENT_ROWS = RowMapper(TorrentModel, {
+    'path': ('path', '{}'),
+    'torrent_id': ('id', '{}'),
+    'magnet_link': ('magnet_link', '{}'),
+    'added_to_torrents_list_at': ('added_to_torrents_list_at', '{}'),
+    'data_size': ('data_size', '{}'),
+    'num_files': ('num_files', '{}'),
+    'embargo': ('embargo', 'bool({}) if {} is not None else None'),
+    'obsolete': ('obsolete', 'bool({}) if {} is not None else None'),
+    'is_seeding': ('is_seeding', '{} == 1'),
+    'is_seed_all': ('is_seed_all', '{} == 1'),
+})
+
+TORRENT_FILE_ROWS = RowMapper(TorrentFileModel, {
+    'torrent_file_id': ('id', '{}'),
+    'torrent_id': ('torrent_id', '{}'),
+    'filename': ('filename', '{}'),
+    'file_id': ('file_id', '{}'),
+    'is_complete': ('is_complete', '{}'),
+    'local_path': ('local_path', '{}'),
+    'byteoffset': ('byteoffset', '{}'),
+})
+
 
 class TorrentsRepository:
     def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
         self.conn = conn
         self.cur = cursor
 
+        # for queries mapped to models by TORRENT_ROWS/TORRENT_FILE_ROWS
+        self.rows_cur = tuple_cursor(conn)
+
     def find_by_magnet_link(self, magnet_link: str):
         sql = "SELECT * FROM torrents WHERE magnet_link = ?"
-        self.cur.execute(sql, (magnet_link,))
-
-        row = self.cur.fetchone()
-        if row:
-            return self._row_to_model(row)
+        self.rows_cur.execute(sql, (magnet_link,))
 
-        return None
+        torrent: Optional[TorrentModel]
+        torrent = TORRENT_ROWS.fetchone(self.rows_cur)
+        return torrent
 
     def find_by_id(self, torrent_id: int):
         sql = "SELECT * FROM torrents WHERE id = ?"
-        self.cur.execute(sql, (torrent_id,))
-
-        row = self.cur.fetchone()
-        if row:
-            return self._row_to_model(row)
-
-        return None
-
-    def list(self, limit: Optional[int] = None, offset: Optional[int] = None):
+        self.rows_cur.execute(sql, (torrent_id,))
+
+        torrent: Optional[TorrentModel]
+        torrent = TORRENT_ROWS.fetchone(self.rows_cur)
+        return torrent
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout_ms: Optional[int] = None,
+    ):
         sql = "SELECT * FROM torrents"
         params = []
 
@@ -40,20 +73,21 @@ class TorrentsRepository:
             sql += " OFFSET ?"
             params.append(offset)
 
-        self.cur.execute(sql, params)
-        return [
-            self._row_to_model(row)
-            for row in self.cur.fetchall()
-        ]
+        torrents: List[TorrentModel]
+        with query_deadline(self.conn, timeout_ms):
+            self.rows_cur.execute(sql, params)
+            torrents = TORRENT_ROWS.fetchall(self.rows_cur)
+
+        return torrents
 
     def list_seeding(self):
         sql = "SELECT * FROM torrents WHERE is_seeding = 1"
 
-        self.cur.execute(sql)
-        return [
-            self._row_to_model(row)
-            for row in self.cur.fetchall()
-        ]
+        self.rows_cur.execute(sql)
+
+        torrents: List[TorrentModel]
+        torrents = TORRENT_ROWS.fetchall(self.rows_cur)
+        return torrents
 
     def insert(self, path: str):
         self.cur.execute("INSERT OR IGNORE INTO torrents (path) VALUES (?)", (path,))
@@ -123,42 +157,33 @@ class TorrentsRepository:
             )
             return self.cur.lastrowid
 
-    def _row_to_model(self, row):
-        return TorrentModel(
-            path=row['path'],
-            torrent_id=row['id'],
-            magnet_link=row['magnet_link'],
-            added_to_torrents_list_at=row['added_to_torrents_list_at'],
-            data_size=row['data_size'],
-            num_files=row['num_files'],
-            embargo=bool(row['embargo']) if row['embargo'] is not None else None,
-            obsolete=bool(row['obsolete']) if row['obsolete'] is not None else None,
-            is_seeding=row['is_seeding'] == 1,
-            is_seed_all=row['is_seed_all'] == 1,
-        )
-
     # Torrent file methods
 
     def list_files(self, torrent_ids: List[int]):
-        sql = f"""
-        SELECT tf.id, tf.torrent_id, tf.filename, tf.file_id, tf.is_complete, tf.local_path, f.byteoffset FROM torrent_files tf
-            LEFT JOIN files f on tf.file_id = f.id
-            WHERE tf.torrent_id IN ({','.join(['?'] * len(torrent_ids))})
-        """
-        self.cur.execute(sql, torrent_ids)
-
-        return [
-            TorrentFileModel(
-                torrent_file_id=row['id'],
-                torrent_id=row['torrent_id'],
-                filename=row['filename'],
-                file_id=row['file_id'],
-                is_complete=row['is_complete'],
-                local_path=row['local_path'],
-                byteoffset=row['byteoffset'],
-            )
-            for row in self.cur.fetchall()
-        ]
+        files: List[TorrentFileModel]
+        files = []
+
+        for i in range(0, len(torrent_ids), IN_BATCH_SIZE):
+            batch = torrent_ids[i:i + IN_BATCH_SIZE]
+            sql = f"""
+            SELECT tf.id, tf.torrent_id, tf.filename, tf.file_id, tf.is_complete, tf.local_path, f.byteoffset FROM torrent_files tf
+                LEFT JOIN files f on tf.file_id = f.id
+                WHERE tf.torrent_id IN ({','.join(['?'] * len(batch))})
+            """
+            self.rows_cur.execute(sql, batch)
+            files += TORRENT_FILE_ROWS.fetchall(self.rows_cur)
+
+        return files
+
+    def list_all_files(self):
+        self.rows_cur.execute("""
+            SELECT tf.id, tf.torrent_id, tf.filename, tf.file_id, tf.is_complete, tf.local_path, f.byteoffset FROM torrent_files tf
+                LEFT JOIN files f on tf.file_id = f.id
+        """)
+
+        files: List[TorrentFileModel]
+        files = TORRENT_FILE_ROWS.fetchall(self.rows_cur)
+        return files
 
     def count_files(self, torrent_id):
         self.cur.execute(
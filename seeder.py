@@ -14,6 +14,7 @@ from repositories.aa_torrents import AnnasArchiveTorrentsRepository
 from services.torrent import TorrentService
 from utils.db import connect_db
 from utils.helpers import infohash_from_magnet
+from utils.query_log import query_log
 from utils.torrent import FailedToGetMetadataException, FileNotFoundException, TorrentDownloader
 import glob
 import requests
@@ -219,27 +220,30 @@ class Seeder:
 			for f in self.downloader.torrent_files(item.torrent_handle)
 		}
 
-		offset = 0
+		after = None
 		while True:
 			self.db.execute("BEGIN")
 
-			files = self.files_repo.search(
+			page = self.files_repo.search_page(
 				torrent_id=item.model.torrent_id,
 				limit=100,
-				offset=offset
+				order_by='id',
+				after=after,
 			)
 
-			if not len(files):
-				break
-
-			for file in files:
+			self.files_repo.hydrate(page.files, fields=('server_path',))
+			for file in page.files:
 				try:
 					self._create_torrent_file_record(item, torrent_paths_by_basename, file)
 				except Exception as e:
 					print(e)
 
 			self.db.commit()
-			offset += 100
+
+			if not page.next_cursor:
+				break
+
+			after = page.next_cursor
 
 
 	def set_complete(self, item: SeederTorrent):
@@ -295,6 +299,7 @@ class Seeder:
 
 		file_ids = [f.file_id for f in st.model.files]
 		file_models = self.files_repo.find_by_ids(file_ids)
+		self.files_repo.hydrate(file_models, fields=('server_path',))
 
 		for file_model in file_models:
 			if not file_model.ipfs_cid:
@@ -349,6 +354,7 @@ class Seeder:
 
 
 	def main(self):
+		query_log.install_dump_signal()
 
 		torrents_to_seed = self.torrents_svc.list_seeding()
 		self.start_torrents(torrents_to_seed)
@@ -0,0 +1,57 @@
+import asyncio
+import sqlite3
+from typing import Optional
+
+from models.search import Facets, SearchPage
+from repositories.async_readers import AsyncFacetsRepository, AsyncFilesRepository, AsyncTorrentsRepository
+from repositories.files import FilesRepository
+from utils.records import DETAIL_FIELDS, detail_fields
+from utils.reader_pool import ReaderPool
+
+
+class AsyncFilesService:
+    """
+    Searches for asyncio callers on a ReaderPool: concurrent requests
+    and the page and facet counts of one request run in parallel.
+    """
+
+    def __init__(self, pool: ReaderPool) -> None:
+        self.pool = pool
+
+        self.files_repo = AsyncFilesRepository(pool)
+        self.facets_repo = AsyncFacetsRepository(pool)
+        self.torrents_repo = AsyncTorrentsRepository(pool)
+
+    async def search_page(self, fields=DETAIL_FIELDS, **query) -> SearchPage:
+        """
+        Cached search page in a single worker call, hydrated if fields
+        include detail fields
+        """
+        hydrated = detail_fields(fields)
+
+        def search():
+            repo = self.pool.repository(FilesRepository)
+            page = repo.cached_search_page(**query)
+            if hydrated:
+                repo.hydrate(page.files, hydrated)
+            return page
+
+        return await self.pool.run(search)
+
+    async def count_facets(self, **query) -> Optional[Facets]:
+        """Facet counts, None if the query cannot be counted"""
+        try:
+            return await self.facets_repo.cached_count(**query)
+        except sqlite3.OperationalError:
+            return None
+
+    async def search_with_facets(self, query: dict, facets_query: dict):
+        """(page, facets) computed in parallel"""
+        page, facets = await asyncio.gather(
+            self.search_page(**query),
+            self.count_facets(**facets_query),
+        )
+        return page, facets
+
+    async def suggest(self, prefix: str, limit: int = 10):
+        return await self.files_repo.suggest(prefix, limit)
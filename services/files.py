@@ -1,10 +1,11 @@
 import os
 import sqlite3
-from typing import Optional
+from typing import List, Optional
 from models.file import FileModel
 from models.torrent import TorrentFileModel
 from repositories.files import FilesRepository
 from repositories.torrents import TorrentsRepository
+from utils.fts import LEGACY_FTS_COLUMNS, TRIGRAM_TABLE, fts_layout, fts_values, trigram_values
 
 
 class FilesService:
@@ -38,12 +39,66 @@ class FilesService:
 
         file_id = self.files_repo.insert(file)
         if file_id:
-            search_string = self._get_file_search_string(file)
+            self.files_repo.insert_fts(file_id, self._get_fts_values(file))
+            self.files_repo.authors.link(file_id, file.author)
 
-            self.files_repo.insert_fts(file_id, search_string)
+            if fts_layout(self.db).has_trigram:
+                self.files_repo.insert_fts(file_id, trigram_values(file), table=TRIGRAM_TABLE)
 
         return file_id
 
+    def remove_file(self, file_id: int) -> bool:
+        """
+        Remove a file with its full-text postings and torrent file record.
+        The FTS 'delete' values are rebuilt from the stored row, they must
+        equal the indexed ones. False if there is no such file.
+        """
+        file = self.files_repo.find_stored(file_id)
+        if file is None:
+            return False
+
+        assert(file.hydrated)
+
+        # imports index empty descriptions as '' and store them as NULL
+        if file.description is None:
+            file.description = ''
+
+        self.db.commit()
+        self.db.execute('BEGIN')
+        try:
+            self.files_repo.delete_fts(file_id, self._get_fts_values(file))
+            if fts_layout(self.db).has_trigram:
+                self.files_repo.delete_fts(file_id, trigram_values(file), table=TRIGRAM_TABLE)
+
+            if self.torrents_repo.remove_file(file_id) and file.torrent_id is not None:
+                if not self.torrents_repo.count_files(file.torrent_id):
+                    self.torrents_svc.stop_seed_torrent(file.torrent_id)
+
+            self.files_repo.authors.unlink(file_id)
+            self.files_repo.delete(file_id)
+            self.files_repo.changes.bump('files')
+
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise e
+
+        return True
+
+    def _get_fts_values(self, file: FileModel):
+        if fts_layout(self.db).columns == LEGACY_FTS_COLUMNS:
+            return {'text': self._get_file_search_string(file)}
+
+        return fts_values(file)
+
+    def search(self, query_text: Optional[str] = None, limit: int = 50, **filters) -> List[FileModel]:
+        """Best ranked files matching query_text, filters as for FilesRepository.search()"""
+        filters.setdefault('order_by', 'rank DESC' if query_text else None)
+        return self.files_repo.search(query_text=query_text or None, limit=limit, **filters)
+
+    def suggest(self, prefix: str, limit: int = 10):
+        return self.files_repo.suggest(prefix, limit)
+
     def add_to_seeds(self, file: FileModel):
         assert(file.file_id is not None)
         assert(file.torrent_id is not None)
@@ -0,0 +1,128 @@
+import re
+import sqlite3
+from typing import Callable, Optional
+
+from repositories.files import FilesRepository
+from utils.fts import (
+    LEGACY_FTS_COLUMNS,
+    TRIGRAM_TABLE,
+    FtsOptions,
+    create_fts_table,
+    create_trigram_table,
+    fts_values,
+    set_rank_weights,
+    fts_layout,
+    trigram_values,
+)
+
+_create_re = re.compile(r'^CREATE VIRTUAL TABLE\s+(IF NOT EXISTS\s+)?("[^"]+"|\w+)', re.IGNORECASE)
+
+
+class FtsService:
+    def __init__(self, db: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.db = db
+        self.cur = cursor
+
+        self.files_repo = FilesRepository(db, cursor)
+
+    def rebuild(
+        self,
+        options: FtsOptions,
+        batch_size: int = 10000,
+        progress: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Build files_fts (and the trigram index if enabled) with options
+        from the files table next to the current index, then swap them.
+        Imports must not run meanwhile.
+        """
+        def create_tables():
+            create_fts_table(self.cur, 'files_fts_new', options)
+            if options.trigram:
+                create_trigram_table(self.cur, f"{TRIGRAM_TABLE}_new", options)
+
+        return self._rebuild(create_tables, options.trigram, batch_size, progress)
+
+    def reindex(self, batch_size: int = 10000, progress: Optional[Callable[[int], None]] = None):
+        """
+        Rebuild the FTS tables with their current definitions and rank
+        weights, e.g. after file ids changed (tools.recluster)
+        """
+        layout = fts_layout(self.db)
+        if layout.columns == LEGACY_FTS_COLUMNS:
+            raise ValueError("legacy FTS layout, run tools.rebuild_fts instead")
+
+        rank = self.db.execute("SELECT v FROM files_fts_config WHERE k = 'rank'").fetchone()
+
+        def create_tables():
+            for table in ('files_fts', TRIGRAM_TABLE) if layout.has_trigram else ('files_fts',):
+                sql = self.db.execute(
+                    "SELECT sql FROM sqlite_master WHERE name = ?", (table,)
+                ).fetchone()[0]
+                self.cur.execute(_create_re.sub(f"CREATE VIRTUAL TABLE {table}_new", sql))
+
+            if rank:
+                self.cur.execute(
+                    "INSERT INTO files_fts_new (files_fts_new, rank) VALUES ('rank', ?)", (rank[0],)
+                )
+
+        return self._rebuild(create_tables, layout.has_trigram, batch_size, progress)
+
+    def _rebuild(
+        self,
+        create_tables: Callable[[], None],
+        trigram: bool,
+        batch_size: int,
+        progress: Optional[Callable[[int], None]],
+    ):
+        self.db.commit()
+        self.cur.execute("DROP TABLE IF EXISTS files_fts_new")
+        self.cur.execute(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}_new")
+        create_tables()
+        self.db.commit()
+
+        after_id = 0
+        count = 0
+        while True:
+            files = self.files_repo.list_after(after_id, batch_size)
+            if not files:
+                break
+
+            for file in files:
+                assert(file.file_id)
+                self.files_repo.insert_fts(file.file_id, fts_values(file), table='files_fts_new')
+                if trigram:
+                    self.files_repo.insert_fts(
+                        file.file_id, trigram_values(file), table=f"{TRIGRAM_TABLE}_new"
+                    )
+
+            self.db.commit()
+
+            after_id = files[-1].file_id or after_id
+            count += len(files)
+            if progress:
+                progress(count)
+
+        self.db.execute("BEGIN")
+        try:
+            self.cur.execute("DROP TABLE IF EXISTS files_fts_vocab")
+            self.cur.execute("DROP TABLE files_fts")
+            self.cur.execute("ALTER TABLE files_fts_new RENAME TO files_fts")
+            self.cur.execute("CREATE VIRTUAL TABLE files_fts_vocab USING fts5vocab(files_fts, row)")
+
+            self.cur.execute(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}")
+            if trigram:
+                self.cur.execute(f"ALTER TABLE {TRIGRAM_TABLE}_new RENAME TO {TRIGRAM_TABLE}")
+
+            self.files_repo.changes.bump('files')
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise e
+
+        return count
+
+    def set_weights(self, options: FtsOptions):
+        set_rank_weights(self.cur, 'files_fts', options)
+        self.files_repo.changes.bump('files')
+        self.db.commit()
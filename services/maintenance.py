@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import config
+from repositories.changes import ChangesRepository
+from repositories.stats import StatsRepository
+from repositories.terms import TermsRepository
+from utils.db import QueryTimeoutException, query_deadline
+from utils.fts import TRIGRAM_TABLE, fts_layout
+
+# Pages written per FTS 'merge' command, a few milliseconds of work
+MERGE_PAGES = 200
+
+# Rows sampled per index by ANALYZE
+ANALYSIS_LIMIT = 1000
+
+# How long a TRUNCATE checkpoint waits for readers of the WAL before
+# falling back to a PASSIVE one
+CHECKPOINT_WAIT_MS = 200
+
+# Load average above which the system is not idle, None to ignore load
+MAX_IDLE_LOAD = getattr(config, 'MAINTENANCE_MAX_LOAD', None)
+
+
+@dataclass
+class BtreeUsage:
+    """Space of a table or index from dbstat"""
+    name: str
+    pages: int
+    size: int
+    unused: int
+    leaf_pages: int
+    # leaf pages not following the previous leaf in the file
+    leaf_jumps: int
+
+    @property
+    def fragmentation(self) -> float:
+        return self.leaf_jumps / self.leaf_pages if self.leaf_pages else 0.0
+
+
+class MaintenanceService:
+    """
+    Short maintenance steps for the catalog: incremental FTS merges,
+    planner and search statistics, WAL checkpoints and a fragmentation
+    report. Each write step is its own short transaction, readers are
+    never blocked (WAL). Steps that depend on data remember the change
+    counter versions they ran at and only run again after writes.
+    """
+
+    def __init__(self, db: sqlite3.Connection, cursor: sqlite3.Cursor) -> None:
+        self.db = db
+        self.cur = cursor
+
+        self.changes = ChangesRepository(db, cursor)
+        self.stats = StatsRepository(db, cursor)
+        self.terms = TermsRepository(db, cursor)
+
+    def merge_fts(self, budget_ms: int) -> int:
+        """
+        Incremental FTS segment merges until done or budget_ms passed,
+        returns steps. Each table gets an equal share of the budget left,
+        time a table does not need goes to the next one.
+        """
+        deadline = time.monotonic() + budget_ms / 1000
+        steps = 0
+
+        tables = ['files_fts']
+        if fts_layout(self.db).has_trigram:
+            tables.append(TRIGRAM_TABLE)
+
+        for i, table in enumerate(tables):
+            now = time.monotonic()
+            table_deadline = now + (deadline - now) / (len(tables) - i)
+
+            while time.monotonic() < table_deadline:
+                before = self.db.total_changes
+                self.cur.execute(
+                    f"INSERT INTO {table} ({table}, rank) VALUES ('merge', ?)", (MERGE_PAGES,)
+                )
+                self.db.commit()
+                steps += 1
+
+                # fewer than 2 changes: no merge work left
+                if self.db.total_changes - before < 2:
+                    break
+
+        return steps
+
+    def analyze(self, force: bool = False) -> bool:
+        """
+        Sampled ANALYZE once files changed. PRAGMA optimize alone only
+        looks at queries of its own connection before SQLite 3.46, which
+        are none here.
+        """
+        version = self._version('files')
+        if not force and not self._due('analyze', version):
+            return False
+
+        self.cur.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        self.cur.execute("ANALYZE")
+        self.cur.execute("PRAGMA optimize")
+        self._done('analyze', version)
+        return True
+
+    def refresh_stats(self, force: bool = False) -> bool:
+        """files_stats and suggestion terms (tools.refresh_stats) once files changed"""
+        version = self._version('files')
+        if not force and not self._due('stats', version):
+            return False
+
+        # each rebuilds shadow tables in short transactions
+        self.stats.refresh()
+        self.changes.bump('stats')
+        self.db.commit()
+
+        self.terms.refresh()
+        self._done('stats', version)
+        return True
+
+    def checkpoint(self) -> Tuple[str, int, int]:
+        """
+        Copy the WAL into the database and truncate it, PASSIVE if
+        readers still use it: (mode, wal pages, checkpointed pages)
+        """
+        self.db.commit()
+        timeout = self.db.execute("PRAGMA busy_timeout").fetchone()[0]
+        self.db.execute(f"PRAGMA busy_timeout = {CHECKPOINT_WAIT_MS}")
+        try:
+            busy, log, checkpointed = self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if not busy:
+                return 'truncate', log, checkpointed
+
+            busy, log, checkpointed = self.db.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            return 'passive', log, checkpointed
+        finally:
+            self.db.execute(f"PRAGMA busy_timeout = {timeout}")
+
+    def fragmentation(self, timeout_ms: Optional[int] = None) -> Optional[List[BtreeUsage]]:
+        """Usage of every table and index, None if dbstat is missing or timeout_ms passed"""
+        try:
+            with query_deadline(self.db, timeout_ms):
+                rows = self.db.execute("""
+                    SELECT name, count(*), sum(pgsize), sum(unused), sum(is_leaf),
+                        sum(is_leaf AND pageno != previous + 1)
+                    FROM (
+                        SELECT name, pageno, pgsize, unused, pagetype = 'leaf' AS is_leaf,
+                            lag(pageno) OVER (PARTITION BY name, pagetype = 'leaf' ORDER BY path) AS previous
+                        FROM dbstat
+                    )
+                    GROUP BY name
+                    ORDER BY sum(pgsize) DESC
+                """).fetchall()
+        except QueryTimeoutException:
+            return None
+        except sqlite3.OperationalError as e:
+            if 'dbstat' in str(e):
+                return None
+            raise
+
+        return [BtreeUsage(*row) for row in rows]
+
+    def free_pages(self) -> Tuple[int, int]:
+        """(free pages, total pages) of the database file"""
+        free = self.db.execute("PRAGMA freelist_count").fetchone()[0]
+        total = self.db.execute("PRAGMA page_count").fetchone()[0]
+        return free, total
+
+    def activity(self):
+        """Changes with every write to the catalog: change counters and WAL size"""
+        versions = tuple(
+            tuple(row) for row in self.db.execute(
+                "SELECT name, version FROM change_counters ORDER BY name"
+            ).fetchall()
+        )
+        wal = f"{config.DB_FILE}-wal"
+        return versions, os.path.getsize(wal) if os.path.exists(wal) else 0
+
+    def load_ok(self) -> bool:
+        return MAX_IDLE_LOAD is None or os.getloadavg()[0] <= MAX_IDLE_LOAD
+
+    def _version(self, table: str) -> int:
+        return self.changes.versions([table]).get(table, 0)
+
+    def _due(self, task: str, version: int) -> bool:
+        row = self.db.execute(
+            "SELECT version FROM maintenance_state WHERE task = ?", (task,)
+        ).fetchone()
+        return row is None or row[0] != version
+
+    def _done(self, task: str, version: int):
+        self.cur.execute(
+            "INSERT OR REPLACE INTO maintenance_state (task, version, finished_at) VALUES (?, ?, ?)",
+            (task, version, time.time())
+        )
+        self.db.commit()
@@ -3,6 +3,9 @@ from models.torrent import TorrentFileModel, TorrentModel
 from repositories.files import FilesRepository
 from repositories.torrents import TorrentsRepository
 
+# populate_files reads all torrent_files rows for more torrents than this
+SCAN_TORRENT_FILES_AFTER = 500
+
 
 class TorrentService:
     def __init__(self, db, cursor) -> None:
@@ -29,22 +32,23 @@ class TorrentService:
         self.torrents_repo.upsert(torrent)
 
     def populate_files(self, models: List[TorrentModel]):
-        filtered = filter(lambda t: not t.is_seed_all, models)
-        ids = list(map(lambda t: t.torrent_id or -1, filtered))
+        ids = [t.torrent_id or -1 for t in models if not t.is_seed_all]
 
-        files = self.torrents_repo.list_files(ids)
+        # only seeded files have torrent_files rows, with many torrents
+        # reading them all beats a long IN (...) list
+        if len(ids) > SCAN_TORRENT_FILES_AFTER:
+            files = self.torrents_repo.list_all_files()
+        else:
+            files = self.torrents_repo.list_files(ids)
 
         files_by_id: Dict[int, List[TorrentFileModel]]
         files_by_id = {}
         for f in files:
-            if f.torrent_id not in files_by_id:
-                files_by_id[f.torrent_id] = []
-
-            files_by_id[f.torrent_id].append(f)
+            files_by_id.setdefault(f.torrent_id, []).append(f)
 
         for model in models:
             assert(model.torrent_id)
-            model.files = files_by_id.get(model.torrent_id, [])
+            model.files = files_by_id.get(model.torrent_id, []) if not model.is_seed_all else []
 
         return models
 
@@ -0,0 +1,284 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import config
+from utils.db import QueryTimeoutException, connect_db, query_deadline, table_columns
+from utils.fts import TRIGRAM_TABLE
+
+# Small b-trees read completely: FTS segment indexes and configuration,
+# lookup tables and their indexes
+STRUCTURE_BTREES = (
+    'files_fts_idx',
+    'files_fts_config',
+    f'{TRIGRAM_TABLE}_idx',
+    f'{TRIGRAM_TABLE}_config',
+    'change_counters',
+    'torrents',
+    'idx_torrents_path',
+    'torrent_files',
+    'idx_torrent_files_file_id',
+    'files_stats',
+    'files_facets',
+    'torrent_id_ranges',
+    'files_terms',
+    'files_term_prefixes',
+    'authors',
+    'idx_authors_name_key',
+)
+
+# files_fts_data rows read by every FTS query: averages and structure
+FTS_RECORD_IDS = (1, 10)
+
+# Columns of files whose indexes are probed with values of sampled rows
+PROBE_COLUMNS = ('md5', 'torrent_id', 'title_sort', 'year_sort', 'language')
+
+# Largest number of sampled files rows
+MAX_PROBES = 4096
+
+# dbstat pages (or rows without dbstat) read between budget checks
+BTREE_READ_BATCH = 64
+
+# Budgets of warmups on startup of the UI and the API
+WARMUP_ON_START = getattr(config, 'WARMUP_ON_START', True)
+WARMUP_MB = getattr(config, 'WARMUP_MB', 256)
+WARMUP_SECONDS = getattr(config, 'WARMUP_SECONDS', 60)
+
+# Replayed statements of the slow query log and time per statement
+REPLAY_QUERIES = getattr(config, 'WARMUP_QUERIES', 50)
+REPLAY_TIMEOUT_MS = 2000
+
+
+@dataclass
+class WarmupReport:
+    structure_bytes: int = 0
+    probes: int = 0
+    queries: int = 0
+    elapsed_ms: float = 0.0
+    # False if the memory or time budget ran out first
+    complete: bool = True
+
+    def __str__(self) -> str:
+        return (
+            f"warmup {'done' if self.complete else 'stopped at budget'} in "
+            f"{self.elapsed_ms / 1000:.1f}s: {self.structure_bytes / 1024 / 1024:.1f} MB structure, "
+            f"{self.probes} index probes, {self.queries} replayed queries"
+        )
+
+
+class WarmupService:
+    """
+    Faults in the pages first searches need after a cold start, in order:
+    small structure b-trees, upper levels of the files table and its hot
+    indexes (point probes at sampled rows) and pages of recently logged
+    slow queries (replay). Pages are read through SQLite itself, b-tree
+    page locations are only known by walking them. max_bytes bounds the
+    first two phases, timeout_s all of them.
+    """
+
+    def __init__(self, db: sqlite3.Connection, max_bytes: int, timeout_s: float) -> None:
+        self.db = db
+        self.max_bytes = max_bytes
+        self.timeout_s = timeout_s
+
+        # plain cursor, warmup queries must not be logged as slow ones
+        self.cur = sqlite3.Cursor(db)
+        self.page_size = self.cur.execute("PRAGMA page_size").fetchone()[0]
+
+    def run(self, progress: Optional[Callable[[str], None]] = None) -> WarmupReport:
+        start = time.monotonic()
+        deadline = start + self.timeout_s
+        report = WarmupReport()
+
+        spent = self._read_structure(report, deadline)
+        if progress:
+            progress(f"structure: {spent / 1024 / 1024:.1f} MB")
+
+        probes = min(MAX_PROBES, max(0, self.max_bytes - spent) // self.page_size // (1 + len(PROBE_COLUMNS)))
+        self._probe_files(report, probes, deadline)
+        if progress:
+            progress(f"probes: {report.probes}")
+
+        self._replay(report, self.recent_queries(), deadline)
+
+        report.complete = report.complete and time.monotonic() < deadline
+        report.elapsed_ms = (time.monotonic() - start) * 1000
+        return report
+
+    def _read_structure(self, report: WarmupReport, deadline: float) -> int:
+        names = {row[0] for row in self.cur.execute("SELECT name FROM sqlite_master").fetchall()}
+
+        for id in FTS_RECORD_IDS:
+            self.cur.execute("SELECT block FROM files_fts_data WHERE id = ?", (id,)).fetchone()
+
+        for name in STRUCTURE_BTREES:
+            if name not in names:
+                continue
+
+            budget = self.max_bytes - report.structure_bytes
+            if budget <= 0 or time.monotonic() > deadline:
+                report.complete = False
+                break
+
+            spent, done = self._read_btree(name, budget, deadline)
+            report.structure_bytes += spent
+            if not done:
+                report.complete = False
+                break
+
+        return report.structure_bytes
+
+    def _read_btree(self, name: str, budget: int, deadline: float) -> Tuple[int, bool]:
+        """
+        Read pages of a b-tree until budget bytes or the deadline, returns
+        (bytes read, whether all pages were read). Sizes are only known
+        by walking, so each page is charged as it is read.
+        """
+        has_dbstat = True
+        try:
+            pages = self.cur.execute("SELECT pgsize FROM dbstat WHERE name = ?", (name,))
+        except sqlite3.OperationalError:
+            has_dbstat = False
+
+            # no dbstat: read rows of tables and charge their size,
+            # indexes are read by the probes
+            is_table = self.cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = ? AND type = 'table'", (name,)
+            ).fetchone()
+            if not is_table:
+                return 0, True
+
+            pages = self.cur.execute(f"SELECT * FROM {name}")
+
+        spent = 0
+        while rows := pages.fetchmany(BTREE_READ_BATCH):
+            spent += sum(row[0] if has_dbstat else _row_size(row) for row in rows)
+            if spent >= budget or time.monotonic() > deadline:
+                return spent, False
+
+        return spent, True
+
+    def _probe_files(self, report: WarmupReport, probes: int, deadline: float):
+        """Point lookups at rows spread over files, each touching the upper b-tree levels"""
+        row = self.cur.execute("SELECT min(id), max(id) FROM files").fetchone()
+        if not probes or row[0] is None:
+            return
+
+        first, last = row
+        if probes < min(MAX_PROBES, last - first + 1):
+            # upper levels are only partially covered
+            report.complete = False
+
+        # sort key columns are missing before tools.backfill_sort_keys
+        columns = [c for c in PROBE_COLUMNS if c in table_columns(self.db, 'files')]
+
+        # at most probes steps
+        step = max(1, -(-(last - first + 1) // probes))
+        for id in range(first, last + 1, step)[:probes]:
+            if time.monotonic() > deadline:
+                report.complete = False
+                return
+
+            values = self.cur.execute(
+                f"SELECT {', '.join(columns)} FROM files WHERE id >= ? LIMIT 1", (id,)
+            ).fetchone()
+            if values is None:
+                break
+
+            for column, value in zip(columns, values):
+                if value is not None:
+                    self.cur.execute(f"SELECT 1 FROM files WHERE {column} = ? LIMIT 1", (value,)).fetchone()
+
+            report.probes += 1
+
+    def recent_queries(self) -> List[Tuple[str, list]]:
+        """Distinct replayable statements of the slow query log, newest first"""
+        path = getattr(config, 'SLOW_QUERY_LOG', None)
+        if not path or not os.path.exists(path):
+            return []
+
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+
+        queries = []
+        seen = set()
+        for line in reversed(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+
+            sql, params = entry.get('sql') or '', entry.get('params') or []
+            # IN lists are collapsed by utils.query_log.normalize_sql
+            if sql.lstrip()[:6].upper() not in ('SELECT', 'WITH') or 'IN (...)' in sql:
+                continue
+
+            key = json.dumps([sql, params], default=str)
+            if key in seen:
+                continue
+
+            seen.add(key)
+            queries.append((sql, params))
+            if len(queries) >= REPLAY_QUERIES:
+                break
+
+        return queries
+
+    def _replay(self, report: WarmupReport, queries: List[Tuple[str, list]], deadline: float):
+        for sql, params in queries:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                report.complete = False
+                return
+
+            try:
+                with query_deadline(self.db, min(REPLAY_TIMEOUT_MS, remaining_ms)):
+                    self.cur.execute(sql, params)
+                    while self.cur.fetchmany(1000):
+                        pass
+            except (sqlite3.Error, QueryTimeoutException):
+                continue
+
+            report.queries += 1
+
+
+def _row_size(row) -> int:
+    """Approximate stored size of a row, for budgets without dbstat"""
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+
+
+class WarmupThread(threading.Thread):
+    """Warmup on its own connection, report is set once done"""
+
+    def __init__(self, on_done: Optional[Callable[[WarmupReport], None]] = None) -> None:
+        super().__init__(name='warmup', daemon=True)
+        self.on_done = on_done
+        self.report: Optional[WarmupReport]
+        self.report = None
+
+    def run(self):
+        db = connect_db(profile=False)
+        try:
+            self.report = WarmupService(db, WARMUP_MB * 1024 * 1024, WARMUP_SECONDS).run()
+        finally:
+            db.close()
+
+        if self.on_done:
+            self.on_done(self.report)
+
+
+def start_warmup(on_done: Optional[Callable[[WarmupReport], None]] = None) -> Optional[WarmupThread]:
+    """
+    Background warmup unless WARMUP_ON_START is off, its report is the
+    thread's report once done (the API shows it in /health)
+    """
+    if not WARMUP_ON_START:
+        return None
+
+    thread = WarmupThread(on_done)
+    thread.start()
+    return thread
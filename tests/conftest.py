@@ -0,0 +1,82 @@
+import os
+import random
+import sys
+import tempfile
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Settings of a scratch catalog, modules read config on import
+DATA_DIR = tempfile.mkdtemp(prefix='aa_local_db_tests_')
+config = types.ModuleType('config')
+config.DB_FILE = os.path.join(DATA_DIR, 'data.db')
+config.DOWNLOADS_DIR = os.path.join(DATA_DIR, 'downloads')
+config.IPFS_GATEWAYS = []
+config.UI_IPFS_GATEWAY = 'http://127.0.0.1:8080'
+config.SLOW_QUERY_LOG = None
+config.RESULT_CACHE_FILE = None
+config.WARMUP_ON_START = False
+config.READER_POOL_SIZE = 2
+sys.modules['config'] = config
+
+WORDS = (
+    "alpha beta gamma delta epsilon python sqlite search index book history science "
+    "physics chemistry math algebra novel poetry war peace crime punishment anna karenina"
+).split()
+
+FILES = 2000
+TORRENTS = 10
+LOCAL_FILES = 100
+
+
+def _file(i: int):
+    from models.file import FileModel
+
+    file = FileModel(
+        title=' '.join(random.choice(WORDS) for _ in range(3)).title() if i % 17 else None,
+        extension=random.choice(['pdf', 'epub', 'djvu', 'fb2']),
+        year=str(random.randint(1950, 2024)) if i % 11 else None,
+        md5='%032x' % i,
+        server_path=f"path/{i}.bin",
+        description=' '.join(random.choice(WORDS) for _ in range(20)),
+        cover_url=f"http://c/{i}.jpg",
+        author=random.choice(['Leo Tolstoy', 'Fyodor Dostoevsky', 'Ann Smith; Bob Jones', None]),
+        languages=[random.choice(['en', 'ru', 'de'])],
+        torrent=f"t/torrent_{i % TORRENTS}.torrent",
+        byteoffset=random.randint(0, 10**9) if i % 3 == 0 else None,
+        is_journal=i % 7 == 0,
+    )
+    file.set_description_compressed()
+    return file
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    """Path of a scratch catalog of FILES files, built once per test run"""
+    from models.torrent import TorrentFileModel
+    from services.files import FilesService
+    from utils.db import connect_db
+
+    random.seed(1)
+    db = connect_db(profile=False)
+    svc = FilesService(db, db.cursor())
+
+    db.commit()
+    db.execute('BEGIN')
+    for i in range(FILES):
+        svc.add_file(_file(i))
+
+    for file_id in range(1, LOCAL_FILES + 1):
+        svc.torrents_repo.insert_file(TorrentFileModel(
+            torrent_id=svc.torrent_ids_cache[f"t/torrent_{(file_id - 1) % TORRENTS}.torrent"],
+            filename=f"{file_id}.bin",
+            file_id=file_id,
+            is_complete=file_id % 2 == 0,
+        ))
+    db.commit()
+    db.close()
+
+    return config.DB_FILE
@@ -0,0 +1,199 @@
+import http.client
+import json
+import multiprocessing
+import re
+import socket
+import time
+
+import pytest
+
+from utils.db import QueryTimeoutException
+from utils.http_server import serve
+
+
+async def slow(request, response):
+    raise QueryTimeoutException("query exceeded 1ms deadline")
+
+
+def make_server(number):
+    from api_server import ApiServer
+
+    server = ApiServer()
+    server.routes.append(('GET', re.compile(r'^/slow$'), slow))
+    return server
+
+
+@pytest.fixture(scope='module')
+def port(catalog):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    process = multiprocessing.get_context('fork').Process(
+        target=serve, args=('127.0.0.1', port, 2, make_server), daemon=True,
+    )
+    process.start()
+
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+    yield port
+
+    process.terminate()
+    process.join(10)
+
+
+def request(port, method, url, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request(method, url, body)
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response, json.loads(data)
+
+
+def raw_request(port, head: bytes) -> bytes:
+    """Whole reply of a request on a connection the server closes"""
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+        sock.sendall(head)
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+
+    return data
+
+
+def dechunk(body: bytes) -> bytes:
+    data = b''
+    while True:
+        size, body = body.split(b'\r\n', 1)
+        size = int(size, 16)
+        if not size:
+            assert body == b'\r\n'
+            return data
+
+        data += body[:size]
+        assert body[size:size + 2] == b'\r\n'
+        body = body[size + 2:]
+
+
+def test_routes(port):
+    response, data = request(port, 'GET', '/search?q=war&limit=5')
+    assert response.status == 200
+    assert len(data['files']) == 5 and data['next_cursor']
+
+    md5 = data['files'][0]['md5']
+    response, data = request(port, 'GET', f'/files/{md5}')
+    assert response.status == 200 and data['md5'] == md5
+
+    response, data = request(port, 'GET', '/torrents?limit=3')
+    assert response.status == 200 and len(data['torrents']) == 3
+
+    response, data = request(port, 'GET', '/torrents/1')
+    assert response.status == 200 and data['torrent_id'] == 1
+
+    response, data = request(port, 'GET', '/suggest?q=phys')
+    assert response.status == 200 and 'physics' in data['suggestions']
+
+    response, data = request(port, 'GET', '/health')
+    assert response.status == 200 and data['status'] == 'ok'
+
+
+def test_pages_follow_cursors(port):
+    seen = []
+    url = '/search?language=ru&limit=100&fields=md5'
+    while True:
+        response, data = request(port, 'GET', url)
+        seen += [f['md5'] for f in data['files']]
+        if not data['next_cursor']:
+            break
+        url = f"/search?language=ru&limit=100&fields=md5&after={data['next_cursor']}"
+
+    assert len(seen) == len(set(seen)) > 100
+
+
+@pytest.mark.parametrize('method, url, status', [
+    ('GET', '/search?limit=abc', 400),
+    ('GET', '/search?after=bm9wZQ', 400),
+    ('GET', '/search?fields=nope', 400),
+    ('GET', '/search?match_mode=nope', 400),
+    ('GET', '/files/xyz', 400),
+    ('GET', '/files/' + 'f' * 32, 404),
+    ('GET', '/torrents/99999', 404),
+    ('GET', '/nope', 404),
+    ('POST', '/search', 405),
+    ('GET', '/md5', 405),
+    ('GET', '/slow', 504),
+])
+def test_errors(port, method, url, status):
+    response, data = request(port, method, url)
+    assert response.status == status
+    assert data['error']
+
+
+def test_chunked_framing(port):
+    reply = raw_request(port, b'GET /search?q=war&limit=120 HTTP/1.1\r\nConnection: close\r\n\r\n')
+    head, body = reply.split(b'\r\n\r\n', 1)
+
+    assert head.startswith(b'HTTP/1.1 200')
+    assert b'Transfer-Encoding: chunked' in head
+    assert len(json.loads(dechunk(body))['files']) == 120
+
+
+def test_keep_alive(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    for _ in range(3):
+        conn.request('GET', '/search?q=war&limit=60')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert len(json.loads(response.read())['files']) == 60
+    conn.close()
+
+
+def test_http10_streams_without_chunks(port):
+    reply = raw_request(port, b'GET /search?q=war&limit=120 HTTP/1.0\r\n\r\n')
+    head, body = reply.split(b'\r\n\r\n', 1)
+
+    assert b'Transfer-Encoding' not in head
+    assert b'Connection: close' in head
+    assert len(json.loads(body)['files']) == 120
+
+
+def test_http10_whole_bodies_have_length(port):
+    reply = raw_request(port, b'GET /health HTTP/1.0\r\n\r\n')
+    head, body = reply.split(b'\r\n\r\n', 1)
+
+    assert b'Connection: close' in head
+    assert f'Content-Length: {len(body)}'.encode() in head
+    assert json.loads(body)['status'] == 'ok'
+
+
+def test_resolve_md5s(port):
+    md5s = ['%032x' % i for i in (1, 5, 7)] + ['f' * 32]
+
+    response, data = request(port, 'POST', '/md5', '\n'.join(md5s))
+    assert response.status == 200
+    assert sorted(f['md5'] for f in data['files']) == sorted(md5s[:3])
+    assert data['missing'] == ['f' * 32]
+
+    response, data = request(port, 'POST', '/md5?fields=md5,title', json.dumps(md5s))
+    assert set(data['files'][0]) == {'md5', 'title'}
+
+    response, data = request(port, 'POST', '/md5', '[1, 2]')
+    assert response.status == 400
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-1', b'1_0', b'+5'])
+def test_invalid_content_length(port, length):
+    reply = raw_request(port, b'POST /md5 HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+    head, body = reply.split(b'\r\n\r\n', 1)
+
+    assert head.startswith(b'HTTP/1.1 400')
+    assert json.loads(body)['error']
@@ -0,0 +1,21 @@
+import pytest
+
+from repositories.authors import AuthorsRepository
+from utils.db import connect_db
+
+
+@pytest.fixture
+def authors(catalog):
+    db = connect_db(profile=False, readonly=True)
+    yield AuthorsRepository(db, db.cursor())
+    db.close()
+
+
+@pytest.mark.parametrize('prefix', ['Leo', 'leo tol', 'Tolstoy, L', 'Tolstoy, Leo', 'TOLSTOY,leo'])
+def test_find_by_prefix(authors, prefix):
+    assert [a.name for a in authors.find_by_prefix(prefix)] == ['Leo Tolstoy']
+
+
+@pytest.mark.parametrize('prefix', ['Tolstoy, X', 'Tolst, L', 'Smith, L'])
+def test_find_by_prefix_misses(authors, prefix):
+    assert authors.find_by_prefix(prefix) == []
@@ -0,0 +1,31 @@
+import shutil
+
+import utils.db
+from models.file import FileModel
+from repositories.facets import FacetsRepository
+from repositories.files import FilesRepository
+from repositories.stats import StatsRepository
+from utils.db import connect_db
+
+
+def test_aggregate_and_sampled_labels_agree(catalog, tmp_path, monkeypatch):
+    path = str(tmp_path / 'copy.db')
+    shutil.copy(catalog, path)
+    monkeypatch.setattr(utils.db, 'DB_FILE', path)
+
+    db = connect_db(profile=False)
+    files = FilesRepository(db, db.cursor())
+    for i in range(3):
+        files.insert(FileModel(title='No language', extension=None, year=None, md5='e' * 31 + str(i), server_path='p'))
+    db.commit()
+    StatsRepository(db, db.cursor()).refresh()
+
+    repo = FacetsRepository(db, db.cursor())
+    query = dict(query_text=None, language=None, year=None, torrent_id=None, local_only=False,
+                 extension=None, is_journal=None, match_columns=None, match_mode='auto', author_id=None)
+    aggregate, sampled = repo.count(), repo._count_matches(None, **query)
+
+    assert aggregate.language == sampled.language and aggregate.language['unknown'] == 3
+    assert aggregate.extension == sampled.extension and aggregate.extension['unknown'] == 3
+    assert aggregate.year == sampled.year
+    db.close()
@@ -0,0 +1,53 @@
+import pytest
+
+from repositories.files import FilesRepository
+from repositories.terms import TermsRepository
+from utils.db import connect_db
+
+
+@pytest.fixture(scope='module')
+def terms(catalog):
+    db = connect_db(profile=False)
+    terms = TermsRepository(db, db.cursor())
+    terms.refresh()
+    yield terms
+    db.close()
+
+
+@pytest.mark.parametrize('word, term, distance', [
+    ('physcs', 'physics', 1),
+    # substitution and insertion
+    ('fysics', 'physics', 2),
+    ('krenian', 'karenina', 2),
+    ('hstoyr', 'history', 2),
+    ('alpah', 'alpha', 1),
+])
+def test_fuzzy_candidates(terms, word, term, distance):
+    assert (term, distance) in terms.fuzzy_candidates(word)
+
+
+def test_short_words_allow_one_edit(terms):
+    assert terms.fuzzy_candidates('alhpx') == []
+
+
+def test_ranked_fuzzy_search_expands_once(terms, monkeypatch):
+    db = connect_db(profile=False, readonly=True)
+    repo = FilesRepository(db, db.cursor())
+
+    calls = []
+    fuzzy_match = repo.terms.fuzzy_match
+    monkeypatch.setattr(repo.terms, 'fuzzy_match', lambda *args: calls.append(args) or fuzzy_match(*args))
+
+    page = repo.search_page(query_text='fysics', match_mode='fuzzy', order_by='rank DESC', language='ru', limit=5)
+    assert page.files and len(calls) == 1
+    db.close()
+
+
+@pytest.mark.parametrize('query_text', ['+++', '...', 'war NOT peace', '"war peace"'])
+def test_fuzzy_syntax_matches_words(terms, query_text):
+    db = connect_db(profile=False, readonly=True)
+    repo = FilesRepository(db, db.cursor())
+
+    expected = [f.file_id for f in repo.search(query_text=query_text, match_mode='words', limit=100)]
+    assert [f.file_id for f in repo.search(query_text=query_text, match_mode='fuzzy', limit=100)] == expected
+    db.close()
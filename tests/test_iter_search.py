@@ -0,0 +1,86 @@
+import pytest
+
+from repositories.files import FilesRepository
+from repositories.planner import SearchPlan
+from utils.db import connect_db
+
+# Filter combinations of tools.export
+QUERIES = [
+    {},
+    {'language': 'ru'},
+    {'language': 'ru', 'year': 2005},
+    {'extension': 'pdf'},
+    {'language': 'ru', 'extension': 'pdf'},
+    {'year': 2005},
+    {'is_journal': True},
+    {'torrent_id': 3},
+    {'torrent_id': 3, 'language': 'ru'},
+    {'query_text': 'war'},
+    {'query_text': 'war', 'language': 'ru'},
+    {'author_id': 1},
+    {'author_id': 1, 'language': 'de'},
+    {'local_only': True},
+    {'local_only': True, 'language': 'ru'},
+]
+
+CHUNK_SIZE = 50
+
+
+@pytest.fixture
+def repo(catalog):
+    db = connect_db(profile=False, readonly=True)
+    yield FilesRepository(db, db.cursor())
+    db.close()
+
+
+def chunk_plan(repo: FilesRepository, query):
+    mode, sql, params, _ = repo.chunk_query(CHUNK_SIZE, **query)
+    params = params + ([0, CHUNK_SIZE] if mode == 'keyset' else [1, CHUNK_SIZE])
+    return mode, [row[-1] for row in repo.conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+@pytest.mark.parametrize('query', QUERIES, ids=repr)
+def test_chunks_are_not_sorted(repo, query):
+    # a sort would read all remaining matches for every chunk
+    _, plan = chunk_plan(repo, query)
+    assert not any('TEMP B-TREE' in line for line in plan), plan
+
+
+@pytest.mark.parametrize('query', QUERIES, ids=repr)
+def test_iter_search_matches_search_pages(repo, query):
+    expected = []
+    after = None
+    while True:
+        page = repo.search_page(limit=100, after=after, order_by='id', **query)
+        expected += [f.file_id for f in page.files]
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+
+    assert [f.file_id for f in repo.iter_search(CHUNK_SIZE, **query)] == expected
+
+
+def test_large_sorted_matches_walk_id_windows(repo):
+    # no statistics: language alone is served by (language, year) in year order
+    assert chunk_plan(repo, {'language': 'ru'})[0] == 'window'
+
+
+def all_ids(repo: FilesRepository, query):
+    return [f.file_id for f in repo.search(limit=10000, order_by='id', **query)]
+
+
+def test_local_only_md5_lookups(repo):
+    # md5 and text are planned as a unique lookup, torrent_files is joined after it
+    for i in range(1, 200, 7):
+        query = {'local_only': True, 'md5': '%032x' % i, 'query_text': 'war'}
+        assert [f.file_id for f in repo.iter_search(CHUNK_SIZE, **query)] == all_ids(repo, query)
+
+
+def test_windows_keep_local_only(repo, monkeypatch):
+    # a large local subset is walked by a filter index, as on full catalogs
+    monkeypatch.setattr(repo.planner, 'plan', lambda *args: SearchPlan(driver='index', index='idx_files_language_year'))
+    monkeypatch.setattr(repo.planner, 'estimate_rows', lambda *args: None)
+
+    query = {'local_only': True, 'language': 'ru'}
+    assert chunk_plan(repo, query)[0] == 'window'
+    assert [f.file_id for f in repo.iter_search(CHUNK_SIZE, **query)] == all_ids(repo, query)
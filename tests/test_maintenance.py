@@ -0,0 +1,30 @@
+from services.maintenance import MaintenanceService
+from utils.db import connect_db
+
+
+def test_refresh_stats_swaps_in_shadow_tables(catalog):
+    db = connect_db(profile=False)
+    svc = MaintenanceService(db, db.cursor())
+
+    assert svc.refresh_stats(force=True)
+
+    leftovers = db.execute(
+        "SELECT name FROM sqlite_master WHERE name LIKE '%\\_new' ESCAPE '\\' OR name LIKE '%\\_old' ESCAPE '\\'"
+    ).fetchall()
+    assert leftovers == []
+
+    total = db.execute("SELECT count(*) FROM files").fetchone()[0]
+    assert svc.stats.total() == total
+
+    languages = dict(db.execute(
+        "SELECT language, count(*) FROM files GROUP BY language"
+    ).fetchall())
+    assert svc.stats.values('language') == languages
+
+    terms = dict(db.execute("SELECT term, doc FROM files_fts_vocab WHERE doc >= 2").fetchall())
+    assert dict(db.execute("SELECT term, doc FROM files_terms").fetchall()) == terms
+    assert svc.terms.fuzzy_candidates('physcs')[0][0] == 'physics'
+
+    # up to date: nothing to do
+    assert not svc.refresh_stats()
+    db.close()
@@ -0,0 +1,96 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import utils.db
+from models.file import FileModel
+from repositories.files import FilesRepository
+from repositories.stats import StatsRepository
+from services.warmup import WarmupService
+from tools.backfill_sort_keys import BackfillSortKeysTool
+from tools.build_filter_indexes import BuildFilterIndexesTool
+from utils.db import (
+    PLANNER_INDEXES,
+    SORT_KEY_COLUMN_TYPES,
+    SORT_KEY_INDEXES,
+    connect_db,
+    index_names,
+    table_columns,
+)
+
+
+@pytest.fixture
+def old_catalog(catalog, tmp_path, monkeypatch):
+    """Copy of the catalog as created before sort keys"""
+    path = str(tmp_path / 'old.db')
+    shutil.copy(catalog, path)
+
+    db = sqlite3.connect(path)
+    for index in SORT_KEY_INDEXES:
+        db.execute(f"DROP INDEX {index}")
+    for column in SORT_KEY_COLUMN_TYPES:
+        db.execute(f"ALTER TABLE files DROP COLUMN {column}")
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(utils.db, 'DB_FILE', path)
+    monkeypatch.setattr(FilesRepository, 'sort_keys_complete', False)
+    yield path
+
+
+def test_connect_leaves_migrations_to_tools(old_catalog):
+    db = connect_db(profile=False)
+    assert not set(SORT_KEY_COLUMN_TYPES) & table_columns(db, 'files')
+    assert not set(SORT_KEY_INDEXES) & index_names(db)
+
+    repo = FilesRepository(db, db.cursor())
+    assert repo.insert(FileModel(title='New', extension='pdf', year=2020, md5='f' * 32, server_path='p'))
+    db.commit()
+
+    assert not repo.sort_keys_ready()
+    titles = [f.title for f in repo.search_page(order_by='title', limit=20).files]
+    assert titles == sorted(titles, key=lambda t: (t is not None, t))
+
+    assert WarmupService(db, 1 << 30, 60).run().probes
+    db.close()
+
+
+def test_backfill_sort_keys_migrates(old_catalog):
+    BackfillSortKeysTool().run(batch_size=500, recompute=False)
+
+    db = connect_db(profile=False)
+    assert set(SORT_KEY_COLUMN_TYPES) <= table_columns(db, 'files')
+    assert set(SORT_KEY_INDEXES) <= index_names(db)
+    assert FilesRepository(db, db.cursor()).sort_keys_ready()
+    db.close()
+
+
+def test_planner_skips_missing_filter_indexes(catalog, tmp_path, monkeypatch):
+    path = str(tmp_path / 'old.db')
+    shutil.copy(catalog, path)
+
+    db = sqlite3.connect(path)
+    for index in PLANNER_INDEXES:
+        db.execute(f"DROP INDEX {index}")
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(utils.db, 'DB_FILE', path)
+
+    db = connect_db(profile=False)
+    repo = FilesRepository(db, db.cursor())
+    StatsRepository(db, db.cursor()).refresh()
+    assert not set(PLANNER_INDEXES) & index_names(db)
+
+    filters = {'language': 'ru', 'extension': 'pdf'}
+    assert repo.planner.estimate_filter(filters) is None
+    assert repo.search_page(query_text='war', limit=5, **filters).files
+    db.close()
+
+    BuildFilterIndexesTool().run()
+
+    db = connect_db(profile=False)
+    repo = FilesRepository(db, db.cursor())
+    assert repo.planner.estimate_filter(filters)[0] in PLANNER_INDEXES
+    db.close()
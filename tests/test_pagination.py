@@ -0,0 +1,63 @@
+import base64
+import json
+
+import pytest
+
+from repositories.files import FilesRepository
+from utils.db import connect_db
+from utils.pagination import InvalidCursorException, decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize('data', [
+    {'h': 'x', 'v': None},
+    {'h': 'x', 'i': [1], 'v': None},
+    {'h': 'x', 'i': True, 'v': None},
+    {'h': 'x', 'i': 2**70, 'v': None},
+    {'h': 'x', 'i': 1, 'v': [1]},
+    {'h': 'x', 'i': 1},
+], ids=repr)
+def test_invalid_keyset_cursors(data):
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(encode_cursor(data), 'x')
+
+
+@pytest.mark.parametrize('data', [
+    {'h': 'x', 'r': 'abc'},
+    {'h': 'x', 'r': ['abc'], 'p': 10},
+    {'h': 'x', 'r': 'abc', 'p': '10'},
+    {'h': 'x', 'r': 'abc', 'p': -1},
+], ids=repr)
+def test_invalid_ranked_cursors(data):
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(encode_cursor(data), 'x', 'ranked')
+
+
+def test_valid_cursors():
+    assert decode_cursor(encode_cursor({'h': 'x', 'i': 5, 'v': 'abc'}), 'x')['i'] == 5
+    assert decode_cursor(encode_cursor({'h': 'x', 'r': 'abc', 'p': 50}), 'x', 'ranked')['p'] == 50
+
+
+def _cursor_data(token):
+    return json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+
+
+@pytest.mark.parametrize('order_by', [None, 'rank DESC', 'year', 'title'])
+def test_search_page_rejects_tampered_cursors(catalog, order_by):
+    db = connect_db(profile=False, readonly=True)
+    repo = FilesRepository(db, db.cursor())
+
+    query = {'query_text': 'war' if order_by == 'rank DESC' else None, 'order_by': order_by, 'limit': 5}
+    page = repo.search_page(**query)
+    assert page.next_cursor
+    data = _cursor_data(page.next_cursor)
+
+    for key in data.keys() - {'h'}:
+        tampered = [dict(data, **{key: [1]}), {k: v for k, v in data.items() if k != key}]
+        if key != 'v':
+            tampered.append(dict(data, **{key: None}))
+
+        for cursor in tampered:
+            with pytest.raises(InvalidCursorException):
+                repo.search_page(after=encode_cursor(cursor), **query)
+
+    db.close()
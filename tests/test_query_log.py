@@ -0,0 +1,46 @@
+import gc
+import sqlite3
+
+import pytest
+
+from utils.query_log import ProfiledConnection, normalize_sql, query_log
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:', factory=ProfiledConnection)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [('a',), ('b',), ('c',)])
+    query_log.stats.clear()
+    yield conn
+    conn.close()
+
+
+def counts():
+    return {sql: stats.count for sql, stats in query_log.stats.items()}
+
+
+def test_connection_shortcuts_are_timed(conn):
+    conn.execute("SELECT count(*) FROM t").fetchone()
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [('d',)])
+    conn.executescript("DELETE FROM t WHERE v = 'd';")
+
+    assert counts() == {
+        "SELECT count(*) FROM t": 1,
+        "INSERT INTO t (v) VALUES (?)": 1,
+        "DELETE FROM t WHERE v = 'd';": 1,
+    }
+
+
+def test_single_row_reads_are_recorded(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT v FROM t WHERE id = ?", (1,))
+    assert cur.fetchone()[0] == 'a'
+    assert counts() == {"SELECT v FROM t WHERE id = ?": 1}
+
+    # unfinished iterations are recorded when the cursor goes away
+    cur = conn.execute("SELECT v FROM t ORDER BY id")
+    next(cur)
+    del cur
+    gc.collect()
+    assert counts()[normalize_sql("SELECT v FROM t ORDER BY id")] == 1
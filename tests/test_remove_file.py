@@ -0,0 +1,37 @@
+import re
+
+from services.files import FilesService
+from utils.db import connect_db
+
+
+def term_docs(db, terms):
+    rows = db.execute(
+        f"SELECT term, doc FROM files_fts_vocab WHERE term IN ({', '.join(['?'] * len(terms))})",
+        terms,
+    ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def test_remove_file_deletes_its_postings(catalog):
+    db = connect_db(profile=False)
+    svc = FilesService(db, db.cursor())
+
+    # a light row: no description, which the index has
+    file = svc.files_repo.find_by_ids([42])[0]
+    assert not file.hydrated
+
+    stored = svc.files_repo.find_stored(42)
+    text = ' '.join(filter(None, [stored.title, stored.author, stored.description]))
+    terms = sorted(set(re.findall(r'\w+', text.lower())))
+    before = term_docs(db, terms)
+
+    assert svc.remove_file(file.file_id)
+
+    assert term_docs(db, terms) == {term: doc - 1 for term, doc in before.items() if doc > 1}
+    for term in terms:
+        ids = [row[0] for row in db.execute("SELECT rowid FROM files_fts WHERE files_fts MATCH ?", (f'"{term}"',))]
+        assert 42 not in ids
+
+    assert svc.files_repo.find_stored(42) is None
+    assert not svc.remove_file(42)
+    db.close()
@@ -0,0 +1,71 @@
+import gc
+import shutil
+
+import pytest
+
+import utils.db
+from utils.cache import SchemaCache
+from repositories.files import FilesRepository
+from repositories.stats import StatsRepository
+from utils.db import PLANNER_INDEXES, connect_db, create_indexes
+from utils.fts import TRIGRAM_TABLE, FtsOptions, create_trigram_table, fts_layout
+
+
+@pytest.fixture
+def path(catalog, tmp_path, monkeypatch):
+    path = str(tmp_path / 'copy.db')
+    shutil.copy(catalog, path)
+    monkeypatch.setattr(utils.db, 'DB_FILE', path)
+    return path
+
+
+def test_entries_follow_schema_version(path):
+    loads = []
+    cache = SchemaCache(lambda conn: loads.append(1) or len(loads))
+
+    db, other = connect_db(profile=False), connect_db()
+    assert cache.get(db) == cache.get(db) == 1
+
+    # schema changes of other connections are seen too
+    other.execute("CREATE TABLE scratch (id INTEGER)")
+    other.commit()
+    assert cache.get(db) == 2
+    assert cache.get(other) == 3
+
+    other.close()
+    del other
+    gc.collect()
+    assert len(cache.entries) == 1
+    db.close()
+
+
+def test_fts_layout_after_rebuild(path):
+    db, other = connect_db(), connect_db()
+    assert not fts_layout(db).has_trigram
+
+    create_trigram_table(other.cursor(), TRIGRAM_TABLE, FtsOptions())
+    other.commit()
+    assert fts_layout(db).has_trigram
+
+    db.close()
+    other.close()
+
+
+def test_planner_sees_new_indexes(path):
+    db, other = connect_db(readonly=True), connect_db()
+    for index in PLANNER_INDEXES:
+        other.execute(f"DROP INDEX {index}")
+    other.commit()
+
+    repo = FilesRepository(db, db.cursor())
+    StatsRepository(other, other.cursor()).refresh()
+    filters = {'language': 'ru', 'extension': 'pdf'}
+    assert repo.planner.estimate_filter(filters) is None
+
+    # as tools.build_filter_indexes while the catalog serves searches
+    create_indexes(other.cursor(), PLANNER_INDEXES)
+    other.commit()
+    assert repo.planner.estimate_filter(filters)[0] in PLANNER_INDEXES
+
+    db.close()
+    other.close()
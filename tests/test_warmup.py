@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from services.warmup import BTREE_READ_BATCH, WarmupReport, WarmupService
+from utils.db import connect_db
+
+
+@pytest.fixture
+def db(catalog):
+    db = connect_db(profile=False, readonly=True)
+    yield db
+    db.close()
+
+
+def test_structure_stops_at_budget(db):
+    page_size = db.execute("PRAGMA page_size").fetchone()[0]
+    budget = 3 * page_size
+
+    report = WarmupService(db, budget, 60).run()
+
+    assert not report.complete
+    assert report.structure_bytes < budget + BTREE_READ_BATCH * page_size
+    assert report.probes == 0
+
+
+@pytest.mark.parametrize('probes', [1, 3, 7, 1999, 4096])
+def test_probes_are_capped(db, probes):
+    report = WarmupReport()
+    WarmupService(db, 1 << 30, 60)._probe_files(report, probes, time.monotonic() + 60)
+
+    first, last = db.execute("SELECT min(id), max(id) FROM files").fetchone()
+    assert report.probes <= probes
+    # steps are rounded up
+    assert report.probes >= min(probes, last - first + 1) // 2
@@ -0,0 +1,79 @@
+import argparse
+
+from repositories.files import FilesRepository
+from utils.db import (
+    SORT_KEY_COLUMN_TYPES,
+    SORT_KEY_INDEXES,
+    connect_db,
+    create_indexes,
+    table_columns,
+)
+from utils.sort_keys import title_sort_key, year_sort_key
+
+
+class BackfillSortKeysTool:
+    """
+    Migrates catalogs created before sort keys: adds the title_sort and
+    year_sort columns, fills them and then builds their indexes, which
+    is faster than updating indexed columns. Imports and the UI should
+    be stopped meanwhile.
+    """
+
+    def __init__(self):
+        self.db = connect_db(profile=False)
+        self.cur = self.db.cursor()
+        self.files_repo = FilesRepository(self.db, self.cur)
+
+    def run(self, batch_size: int, recompute: bool):
+        self.add_columns()
+
+        after_id = 0
+        updated = 0
+
+        while True:
+            self.cur.execute(
+                "SELECT id, title, year, title_sort, year_sort FROM files WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, batch_size)
+            )
+            rows = self.cur.fetchall()
+            if not rows:
+                break
+
+            after_id = rows[-1][0]
+            keys = [
+                (title_sort_key(row[1]), year_sort_key(row[2]), row[0])
+                for row in rows
+                if recompute or row[3] is None or row[4] is None
+            ]
+
+            if keys:
+                self.files_repo.set_sort_keys(keys)
+                self.files_repo.changes.bump('files')
+                self.db.commit()
+                updated += len(keys)
+
+            print(f"Files up to id {after_id}, {updated} updated", end='\r')
+
+        print()
+
+        print("Building sort key indexes")
+        create_indexes(self.cur, SORT_KEY_INDEXES)
+        self.db.commit()
+        self.db.close()
+
+    def add_columns(self):
+        columns = table_columns(self.db, 'files')
+        for column, type in SORT_KEY_COLUMN_TYPES.items():
+            if column not in columns:
+                self.cur.execute(f"ALTER TABLE files ADD COLUMN {column} {type}")
+
+        self.db.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fill sort keys of files")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--recompute', action='store_true', help="recompute existing keys too")
+    args = parser.parse_args()
+
+    BackfillSortKeysTool().run(args.batch_size, args.recompute)
@@ -0,0 +1,55 @@
+import argparse
+
+from repositories.files import FilesRepository
+from utils.db import connect_db
+
+
+class BuildAuthorsTool:
+    """Fills authors/file_authors for files imported before the author index existed"""
+
+    def __init__(self):
+        self.db = connect_db(profile=False)
+        self.cur = self.db.cursor()
+        self.files_repo = FilesRepository(self.db, self.cur)
+
+    def run(self, batch_size: int, rebuild: bool):
+        if rebuild:
+            self.cur.execute("DELETE FROM file_authors")
+            self.cur.execute("DELETE FROM authors")
+            self.db.commit()
+
+        after_id = 0
+        linked = 0
+
+        while True:
+            self.cur.execute(
+                "SELECT id, author FROM files WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, batch_size)
+            )
+            rows = self.cur.fetchall()
+            if not rows:
+                break
+
+            after_id = rows[-1][0]
+            for file_id, author in rows:
+                # existing links are kept, so interrupted runs can be resumed
+                linked += self.files_repo.authors.link(file_id, author)
+
+            self.files_repo.changes.bump('files')
+            self.db.commit()
+
+            print(f"Files up to id {after_id}, {linked} author links", end='\r')
+
+        print()
+        self.cur.execute("SELECT count(*) FROM authors WHERE file_count > 0")
+        print("Authors:", self.cur.fetchone()[0])
+        self.db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the normalized author index")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--rebuild', action='store_true', help="drop existing authors first")
+    args = parser.parse_args()
+
+    BuildAuthorsTool().run(args.batch_size, args.rebuild)
@@ -0,0 +1,36 @@
+import time
+
+from utils.db import PLANNER_INDEXES, connect_db, index_names
+
+
+class BuildFilterIndexesTool:
+    """
+    Builds the language and extension filter indexes of catalogs created
+    before them, until then the planner (repositories.planner) leaves
+    those filters to FTS-first plans. Each index is one scan of files,
+    imports should be stopped meanwhile.
+    """
+
+    def __init__(self):
+        self.db = connect_db(profile=False)
+        self.cur = self.db.cursor()
+
+    def run(self):
+        existing = index_names(self.db)
+
+        for name, target in PLANNER_INDEXES.items():
+            if name in existing:
+                print(f"{name} exists")
+                continue
+
+            print(f"Building {name}")
+            start = time.monotonic()
+            self.cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+            self.db.commit()
+            print(f"{name} built in {time.monotonic() - start:.1f}s")
+
+        self.db.close()
+
+
+if __name__ == '__main__':
+    BuildFilterIndexesTool().run()
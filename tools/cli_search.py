@@ -1,16 +1,84 @@
+import argparse
+import collections
+import json
+import statistics
+import sys
 import textwrap
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
 
+import config
 from models.file import FileModel
 from services.files import FilesService
-from utils.db import connect_db
+from utils.db import QueryTimeoutException, connect_db
+from utils.reader_pool import ReaderPool
+from utils.records import detail_fields, file_record, parse_fields
+
+# Keys of JSON query lines, passed on to FilesService.search()
+QUERY_KEYS = (
+    'query_text', 'language', 'year', 'md5', 'torrent_id', 'author_id', 'local_only',
+    'extension', 'is_journal', 'order_by', 'match_columns', 'match_mode', 'limit',
+)
+
+# Queries submitted ahead of the one being written, per worker
+QUEUED_PER_JOB = 4
+
+
+@dataclass
+class QueryResult:
+    number: int
+    query: Dict[str, Any]
+    files: List[FileModel] = field(default_factory=list)
+    latency_ms: float = 0.0
+    error: Optional[str] = None
+
+
+def parse_query(line: str) -> Dict[str, Any]:
+    """
+    A query line: plain search text or a JSON object of QUERY_KEYS
+    ('q' for query_text). Raises ValueError
+    """
+    line = line.strip()
+    if not line.startswith('{'):
+        return {'query_text': line}
+
+    query = json.loads(line)
+    if not isinstance(query, dict):
+        raise ValueError("query must be a JSON object")
+
+    if 'q' in query:
+        query['query_text'] = query.pop('q')
+
+    unknown = set(query) - set(QUERY_KEYS)
+    if unknown:
+        raise ValueError(f"unknown query keys {', '.join(sorted(unknown))}")
+
+    return query
+
+
+def tsv_value(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = ';'.join(map(str, value))
+
+    return str(value).replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
 
 
 class CliSearchTool:
+    """
+    Searches from a terminal (interactive) or in batch: one query per
+    input line, run on `jobs` read-only connections in parallel, results
+    written in input order as JSONL or TSV rows of the selected fields.
+    Latency of each query is measured on its worker, from the start of
+    the search to the end of hydration.
+    """
+
     def __init__(self) -> None:
         db = connect_db()
         self.svc = FilesService(db, db.cursor())
 
-
     def print_result(self, file: FileModel):
         if file.ipfs_cid:
             ipfs_urls = [f"https://ipfs.io/ipfs/{cid}" for cid in set(file.ipfs_cid.split(';'))]
@@ -51,9 +119,143 @@ class CliSearchTool:
                 print("No results found.\n")
                 continue
 
+            self.svc.files_repo.hydrate(results)
             for r in results:
                 self.print_result(r)
 
+    def run_batch(
+        self,
+        lines: Iterable[str],
+        out: TextIO,
+        fields,
+        output_format: str,
+        jobs: int,
+        limit: int,
+        timeout_ms: Optional[int],
+        latency_out: Optional[TextIO],
+    ):
+        pool = ReaderPool(jobs)
+        latencies = []
+        errors = 0
+        start = time.monotonic()
+
+        if output_format == 'tsv':
+            out.write('\t'.join(('query',) + tuple(fields)) + '\n')
+        if latency_out:
+            latency_out.write('query\tlatency_ms\tresults\terror\n')
+
+        try:
+            for result in self.search_all(pool, lines, fields, limit, timeout_ms):
+                if result.error:
+                    errors += 1
+                else:
+                    latencies.append(result.latency_ms)
+
+                self.write_result(out, result, fields, output_format)
+                if latency_out:
+                    latency_out.write(
+                        f"{result.number}\t{result.latency_ms:.3f}\t{len(result.files)}\t{result.error or ''}\n"
+                    )
+        finally:
+            pool.close()
+
+        elapsed = time.monotonic() - start
+        count = len(latencies) + errors
+        summary = f"{count} queries, {errors} errors in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f}/s)"
+        if latencies:
+            cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+            summary += (
+                f", latency p50 {cuts[49]:.1f} ms, p95 {cuts[94]:.1f} ms,"
+                f" p99 {cuts[98]:.1f} ms, max {max(latencies):.1f} ms"
+            )
+        print(summary, file=sys.stderr)
+
+    def search_all(self, pool: ReaderPool, lines: Iterable[str], fields, limit: int, timeout_ms) -> Iterator[QueryResult]:
+        """Results of the queries of lines in input order, a bounded number in flight"""
+        hydrated = detail_fields(fields)
+
+        def search(number: int, query: Dict[str, Any]) -> QueryResult:
+            result = QueryResult(number, query)
+            svc = pool.repository(FilesService)
+            started = time.perf_counter()
+            try:
+                result.files = svc.search(
+                    **{'limit': limit, 'timeout_ms': timeout_ms, **query}
+                )
+                if hydrated:
+                    svc.files_repo.hydrate(result.files, hydrated)
+            except QueryTimeoutException:
+                result.error = 'timeout'
+            except Exception as e:
+                # e.g. FTS syntax errors or bad filter values, the batch goes on
+                result.error = f"{type(e).__name__}: {e}"
+
+            result.latency_ms = (time.perf_counter() - started) * 1000
+            return result
+
+        pending = collections.deque()
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+
+            try:
+                query = parse_query(line)
+            except ValueError as e:
+                pending.append(QueryResult(number, {}, error=f"invalid query: {e}"))
+            else:
+                pending.append(pool.submit(search, number, query))
+
+            while len(pending) > pool.size * QUEUED_PER_JOB:
+                yield self._result(pending.popleft())
+
+        while pending:
+            yield self._result(pending.popleft())
+
+    def _result(self, item) -> QueryResult:
+        return item if isinstance(item, QueryResult) else item.result()
+
+    def write_result(self, out: TextIO, result: QueryResult, fields, output_format: str):
+        for file in result.files:
+            record = file_record(file, fields)
+            if output_format == 'jsonl':
+                out.write(json.dumps({'query': result.number, **record}, ensure_ascii=False, default=str) + '\n')
+            else:
+                out.write('\t'.join([str(result.number)] + [tsv_value(v) for v in record.values()]) + '\n')
+
 
 if __name__ == '__main__':
-    CliSearchTool().run()
+    parser = argparse.ArgumentParser(
+        description="Search the catalog, interactively or in batch from --input/stdin. "
+        "Query lines are search text or JSON objects, e.g. "
+        '{"q": "war and peace", "language": "ru", "year": 1990}',
+    )
+    parser.add_argument('--input', help="file of queries, - for stdin (default when stdin is not a terminal)")
+    parser.add_argument('--output', help="results file, stdout by default")
+    parser.add_argument('--format', choices=('jsonl', 'tsv'), default='jsonl')
+    parser.add_argument('--fields', help="comma separated file fields or 'all'")
+    parser.add_argument('--limit', type=int, default=10, help="results per query")
+    parser.add_argument('--jobs', type=int, default=getattr(config, 'READER_POOL_SIZE', 4), help="queries run in parallel")
+    parser.add_argument('--timeout-ms', type=int, default=None)
+    parser.add_argument('--latency', help="per query latency TSV file, - for stderr")
+    args = parser.parse_args()
+
+    tool = CliSearchTool()
+    if args.input is None and sys.stdin.isatty():
+        tool.run()
+        sys.exit()
+
+    try:
+        fields = parse_fields(args.fields)
+    except ValueError as e:
+        parser.error(str(e))
+
+    source = sys.stdin if args.input in (None, '-') else open(args.input, encoding='utf-8')
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    latency_out = None
+    if args.latency:
+        latency_out = sys.stderr if args.latency == '-' else open(args.latency, 'w', encoding='utf-8')
+
+    tool.run_batch(
+        source, out, fields, args.format, max(1, args.jobs), args.limit, args.timeout_ms, latency_out,
+    )
+    out.flush()
@@ -0,0 +1,104 @@
+import argparse
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from repositories.files import FilesRepository
+from utils.db import connect_db
+from utils.records import COMPRESSIONS, RecordWriter, compression_of, open_output, parse_fields
+
+# Files read per statement
+CHUNK_SIZE = 1000
+
+
+def parse_years(value: Optional[str]) -> List[Optional[int]]:
+    """'2015' or a range '2010-2019'. Raises ValueError"""
+    if not value:
+        return [None]
+
+    first, _, last = value.partition('-')
+    first_year = int(first)
+    last_year = int(last) if last else first_year
+    if last_year < first_year:
+        raise ValueError(f"empty year range {value}")
+
+    return list(range(first_year, last_year + 1))
+
+
+class ExportTool:
+    """
+    Streams files matching search filters to JSONL or CSV, optionally
+    compressed. Files are read with FilesRepository.iter_search() on a
+    read-only connection: memory stays flat and every chunk is a short
+    read, so imports and checkpoints are not held up.
+    """
+
+    def __init__(self):
+        self.db = connect_db(profile=False, readonly=True)
+        self.files_repo = FilesRepository(self.db, self.db.cursor())
+
+    def run(self, out, fields, output_format: str, years: List[Optional[int]], chunk_size: int, query: Dict[str, Any]):
+        writer = RecordWriter(out, fields, output_format)
+        start = time.monotonic()
+        count = 0
+
+        # year filters are exact, ranges are exported year by year
+        for year in years:
+            for file in self.files_repo.iter_search(chunk_size, fields, year=year, **query):
+                writer.write(file)
+                count += 1
+
+                if count % 10000 == 0:
+                    print(f"{count} files", end='\r', file=sys.stderr)
+
+        out.flush()
+        print(f"{count} files exported in {time.monotonic() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export files matching filters as JSONL or CSV")
+    parser.add_argument('--query', help="full-text query")
+    parser.add_argument('--language')
+    parser.add_argument('--year', help="year or range, e.g. 2010-2019")
+    parser.add_argument('--extension')
+    parser.add_argument('--torrent-id', type=int)
+    parser.add_argument('--author', help="exact author name, see tools.build_authors")
+    parser.add_argument('--local-only', action='store_true')
+    parser.add_argument('--fields', help="comma separated file fields or 'all'")
+    parser.add_argument('--format', choices=RecordWriter.FORMATS, default='jsonl')
+    parser.add_argument('--output', help="output file, stdout by default")
+    parser.add_argument(
+        '--compress', choices=tuple(COMPRESSIONS),
+        help="compression, inferred from the --output suffix by default",
+    )
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    try:
+        fields = parse_fields(args.fields)
+        years = parse_years(args.year)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tool = ExportTool()
+
+    author_id = None
+    if args.author:
+        author = tool.files_repo.find_author(args.author)
+        if author is None:
+            parser.error(f"unknown author {args.author}")
+        author_id = author.author_id
+
+    out = open_output(args.output, args.compress or compression_of(args.output))
+    try:
+        tool.run(out, fields, args.format, years, args.chunk_size, dict(
+            query_text=args.query,
+            language=args.language,
+            extension=args.extension,
+            torrent_id=args.torrent_id,
+            author_id=author_id,
+            local_only=args.local_only,
+        ))
+    finally:
+        if out is not sys.stdout:
+            out.close()
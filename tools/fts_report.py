@@ -0,0 +1,138 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import List
+
+from models.file import FileModel
+from repositories.files import FilesRepository
+from repositories.planner import quote_term
+from utils.db import connect_db
+from utils.fts import FtsOptions, create_fts_table, fts_values
+
+# (name, options) of compared files_fts variants
+VARIANTS = [
+    ('full', FtsOptions()),
+    ('full columnsize=0', FtsOptions(columnsize=False)),
+    ('column', FtsOptions(detail='column')),
+    ('column columnsize=0', FtsOptions(detail='column', columnsize=False)),
+    ('none', FtsOptions(detail='none')),
+    ('none columnsize=0', FtsOptions(detail='none', columnsize=False)),
+]
+
+if sqlite3.sqlite_version_info >= (3, 43, 0):
+    VARIANTS.append(('full contentless_delete', FtsOptions(contentless_delete=True)))
+
+
+class FtsReportTool:
+    """
+    Builds files_fts variants from a sample of files in temporary
+    databases and compares their size and query latency.
+    """
+
+    REPEAT = 5
+
+    def __init__(self):
+        self.db = connect_db()
+        self.files_repo = FilesRepository(self.db, self.db.cursor())
+
+    def sample_files(self, count: int) -> List[FileModel]:
+        files = []
+        after_id = 0
+        while len(files) < count:
+            batch = self.files_repo.list_after(after_id, min(10000, count - len(files)))
+            if not batch:
+                break
+
+            files += batch
+            after_id = batch[-1].file_id or after_id
+
+        return files
+
+    def sample_queries(self, files: List[FileModel], count: int):
+        titles = [f.title.split() for f in files if f.title and len(f.title.split()) > 1]
+        rnd = random.Random(42)
+
+        queries = []
+        for words in rnd.sample(titles, min(count, len(titles))):
+            queries.append(('word', quote_term(words[0])))
+            queries.append(('prefix', quote_term(words[0][:3]) + '*'))
+            queries.append(('phrase', quote_term(' '.join(words[:2]))))
+            queries.append(('title column', f"title : {quote_term(words[0])}"))
+
+        return queries
+
+    def build(self, path: str, options: FtsOptions, files: List[FileModel]):
+        conn = sqlite3.connect(path)
+        cur = conn.cursor()
+        create_fts_table(cur, 'files_fts', options)
+
+        start = time.perf_counter()
+        for file in files:
+            values = fts_values(file)
+            cur.execute(
+                f"INSERT INTO files_fts (rowid, {', '.join(values)}) VALUES (?, {', '.join(['?'] * len(values))})",
+                (file.file_id, *values.values())
+            )
+        conn.commit()
+        cur.execute("INSERT INTO files_fts (files_fts) VALUES ('optimize')")
+        conn.commit()
+        cur.execute("VACUUM")
+        build_s = time.perf_counter() - start
+
+        return conn, build_s
+
+    def measure(self, conn: sqlite3.Connection, queries):
+        latencies = {}
+        errors = {}
+        for kind, query in queries:
+            for _ in range(self.REPEAT):
+                start = time.perf_counter()
+                try:
+                    conn.execute(
+                        "SELECT rowid FROM files_fts WHERE files_fts MATCH ? ORDER BY rank LIMIT 50",
+                        (query,)
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    errors[kind] = errors.get(kind, 0) + 1
+                    break
+
+                latencies.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+
+        return latencies, errors
+
+    def run(self, args):
+        files = self.sample_files(args.files)
+        queries = self.sample_queries(files, args.queries)
+        print(f"Sample: {len(files)} files, {len(queries)} queries\n")
+
+        kinds = sorted({kind for kind, _ in queries})
+        print(f"{'variant':<26}{'size MB':>9}{'build s':>9}" + ''.join(f"{k + ' ms':>16}" for k in kinds))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, options in VARIANTS:
+                path = os.path.join(tmp, name.replace(' ', '_') + '.db')
+                conn, build_s = self.build(path, options, files)
+                latencies, errors = self.measure(conn, queries)
+                conn.close()
+
+                size_mb = os.path.getsize(path) / 1024 / 1024
+                cells = []
+                for kind in kinds:
+                    if kind in errors:
+                        cells.append(f"{'unsupported':>16}")
+                    else:
+                        cells.append(f"{statistics.median(latencies.get(kind, [0])):>16.3f}")
+
+                print(f"{name:<26}{size_mb:>9.2f}{build_s:>9.2f}" + ''.join(cells))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare size and latency of files_fts variants")
+    parser.add_argument('--files', type=int, default=50000, help="number of sampled files")
+    parser.add_argument('--queries', type=int, default=20, help="number of sampled titles to query")
+
+    FtsReportTool().run(parser.parse_args())
@@ -10,7 +10,7 @@ class ImportByteoffsetsTool:
     BATCH_SIZE = 1000
 
     def __init__(self):
-        self.db = connect_db()
+        self.db = connect_db(profile=False)
         self.repo = FilesRepository(self.db, self.db.cursor())
 
 
@@ -43,6 +43,7 @@ class ImportByteoffsetsTool:
                 if wr_count and (wr_count % self.BATCH_SIZE == 0):
                     print('commit')
                     wr_count = 0
+                    self.repo.changes.bump('files')
                     self.db.commit()
                     self.db.execute("BEGIN")  # start new transaction
 
@@ -50,6 +51,7 @@ class ImportByteoffsetsTool:
                 sys.stderr.write(f"Error processing line: {e}\n")
                 raise e
 
+        self.repo.changes.bump('files')
         self.db.commit()  # commit remaining records
         self.db.close()
 
@@ -115,7 +115,7 @@ class ImportJsonTool:
         return model
 
     def add_file_worker(self, queue: mp.Queue):
-        db = connect_db()
+        db = connect_db(profile=False)
         svc = FilesService(db, db.cursor())
 
         db.execute('PRAGMA synchronous = 0')
@@ -134,10 +134,12 @@ class ImportJsonTool:
             # commit every BATCH_SIZE
             if count % self.BATCH_SIZE == 0:
                 print(count)
+                svc.files_repo.changes.bump('files')
                 db.commit()
                 db.execute("BEGIN")  # start new transaction
 
         print('commiting and closing data')
+        svc.files_repo.changes.bump('files')
         db.commit()
         db.close()
         print("add_file_worker complete")
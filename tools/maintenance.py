@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import config
+from services.maintenance import MaintenanceService
+from utils.db import connect_db
+
+# Seconds between idle checks of --daemon
+INTERVAL = getattr(config, 'MAINTENANCE_INTERVAL', 60)
+
+# Seconds without writes before maintenance runs
+IDLE_SECONDS = getattr(config, 'MAINTENANCE_IDLE_SECONDS', 300)
+
+# Time spent merging FTS segments per run
+MERGE_BUDGET_MS = getattr(config, 'MAINTENANCE_MERGE_MS', 500)
+
+
+class MaintenanceTool:
+    def __init__(self):
+        self.db = connect_db(profile=False)
+        self.svc = MaintenanceService(self.db, self.db.cursor())
+
+    def run_steps(self, force: bool = False):
+        steps = self.svc.merge_fts(MERGE_BUDGET_MS)
+        print("FTS merge steps:", steps)
+
+        if self.svc.analyze(force):
+            print("Planner statistics refreshed")
+
+        if self.svc.refresh_stats(force):
+            print("Search statistics and terms refreshed")
+
+        mode, log, checkpointed = self.svc.checkpoint()
+        print(f"Checkpoint ({mode}): {checkpointed}/{log} WAL pages")
+
+    def report(self, timeout_ms: int):
+        free, total = self.svc.free_pages()
+        print(f"Pages: {total:,}, free: {free:,} ({free / max(total, 1):.1%})")
+
+        usage = self.svc.fragmentation(timeout_ms)
+        if usage is None:
+            print("No fragmentation report (dbstat missing or timed out)")
+            return
+
+        print(f"{'name':<40} {'size MB':>10} {'unused':>7} {'fragmented':>10}")
+        for item in usage:
+            print(
+                f"{item.name:<40} {item.size / 1024 / 1024:>10.1f} "
+                f"{item.unused / max(item.size, 1):>7.1%} {item.fragmentation:>10.1%}"
+            )
+
+    def run_daemon(self):
+        """Run steps whenever nothing was written for IDLE_SECONDS"""
+        marker = self.svc.activity()
+        quiet_since = time.monotonic()
+
+        while True:
+            time.sleep(INTERVAL)
+
+            current = self.svc.activity()
+            if current != marker:
+                marker, quiet_since = current, time.monotonic()
+                continue
+
+            if time.monotonic() - quiet_since < IDLE_SECONDS or not self.svc.load_ok():
+                continue
+
+            self.run_steps()
+            # own writes are no activity
+            marker = self.svc.activity()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Catalog database maintenance")
+    parser.add_argument('--daemon', action='store_true', help="keep running, maintain while idle")
+    parser.add_argument('--force', action='store_true', help="refresh statistics even without changes")
+    parser.add_argument('--report', action='store_true', help="print space and fragmentation per table/index")
+    parser.add_argument('--report-timeout', type=int, default=60000, help="milliseconds")
+    args = parser.parse_args()
+
+    tool = MaintenanceTool()
+    if args.report:
+        tool.report(args.report_timeout)
+    elif args.daemon:
+        tool.run_daemon()
+    else:
+        tool.run_steps(args.force)
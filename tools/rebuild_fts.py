@@ -0,0 +1,75 @@
+import argparse
+
+from services.fts import FtsService
+from utils.db import connect_db
+from utils.fts import DEFAULT_WEIGHTS, TOKENIZERS, FtsOptions
+
+
+def parse_weights(value: str):
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in value.split(','):
+        column, weight = item.split('=')
+        if column not in weights:
+            raise argparse.ArgumentTypeError(f"unknown column {column}")
+        weights[column] = float(weight)
+
+    return weights
+
+
+class RebuildFtsTool:
+    def __init__(self):
+        self.db = connect_db(profile=False)
+        self.svc = FtsService(self.db, self.db.cursor())
+
+    def run(self, args):
+        options = FtsOptions(
+            weights=args.weights,
+            tokenizer=args.tokenizer,
+            trigram=args.trigram,
+            detail=args.detail,
+            columnsize=not args.no_columnsize,
+            contentless_delete=args.contentless_delete,
+            prefix=args.prefix,
+        )
+
+        if args.weights_only:
+            self.svc.set_weights(options)
+            print("Weights updated", options.weights)
+            return
+
+        count = self.svc.rebuild(options, batch_size=args.batch_size, progress=print)
+        print("Rebuilt files_fts with", count, "files")
+        self.db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild files_fts from the files table")
+    parser.add_argument(
+        '--weights', type=parse_weights, default=dict(DEFAULT_WEIGHTS),
+        help="bm25 weights, e.g. title=10,author=5,description=1,tags=2",
+    )
+    parser.add_argument('--weights-only', action='store_true', help="only update ranking weights")
+    parser.add_argument(
+        '--tokenizer', choices=sorted(TOKENIZERS), default='unicode61',
+        help="porter additionally stems english words",
+    )
+    parser.add_argument(
+        '--trigram', action='store_true',
+        help="also build the trigram index for substring matches on title and author",
+    )
+    parser.add_argument(
+        '--detail', choices=['full', 'column', 'none'], default='full',
+        help="column/none shrink files_fts but disable phrase queries (and column filters for none), the trigram index keeps full detail",
+    )
+    parser.add_argument('--no-columnsize', action='store_true', help="do not store column sizes")
+    parser.add_argument(
+        '--contentless-delete', action='store_true',
+        help="make rows deletable without their original values (SQLite 3.43+)",
+    )
+    parser.add_argument(
+        '--prefix', type=lambda v: tuple(int(p) for p in v.split(',') if p), default=(2, 3),
+        help="comma separated prefix index lengths, empty for none",
+    )
+    parser.add_argument('--batch-size', type=int, default=10000)
+
+    RebuildFtsTool().run(parser.parse_args())
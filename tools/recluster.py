@@ -0,0 +1,140 @@
+import argparse
+import os
+import sqlite3
+
+from config import DB_FILE
+from repositories.changes import ChangesRepository
+from services.fts import FtsService
+from utils.db import connect_db, init_db
+from utils.fts import LEGACY_FTS_COLUMNS, fts_layout
+from utils.result_cache import result_cache
+
+# Physical order of the reclustered files table
+CLUSTER_ORDER = "torrent_id IS NULL, torrent_id, byteoffset, id"
+
+# Tables referencing files.id: (table, column)
+FILE_ID_REFERENCES = (
+    ('torrent_files', 'file_id'),
+    ('file_authors', 'file_id'),
+)
+
+
+class ReclusterTool:
+    """
+    Writes a copy of the catalog with files stored in (torrent_id,
+    byteoffset) order, so files of a torrent share pages. Ids are
+    renumbered in that order: references and the FTS index are rewritten,
+    file_id_map keeps old -> new ids for outside users, torrent_id_ranges
+    the id range of each torrent for rowid range scans (repositories.planner).
+    Imports, the seeder and the UI must be stopped until the copy replaces
+    the catalog.
+    """
+
+    def __init__(self):
+        self.db = connect_db(profile=False)
+
+    def run(self, output: str, batch_size: int):
+        if os.path.exists(output):
+            raise FileExistsError(output)
+
+        # checked before the copy, reindex() would only refuse after it
+        if fts_layout(self.db).columns == LEGACY_FTS_COLUMNS:
+            raise ValueError("legacy FTS layout, run tools.rebuild_fts first")
+
+        print("Copying", DB_FILE, "to", output)
+        self.db.execute("VACUUM INTO ?", (output,))
+        self.db.close()
+
+        conn = sqlite3.connect(output)
+        conn.row_factory = sqlite3.Row
+        # a failed run leaves a useless copy anyway
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        cur = conn.cursor()
+
+        print("Reordering files")
+        self.reorder_files(conn, cur)
+
+        print("Rebuilding the full-text index")
+        FtsService(conn, cur).reindex(batch_size, progress=lambda n: print(f"{n} files", end='\r'))
+        print()
+
+        cur.execute("DELETE FROM torrent_id_ranges")
+        cur.execute("""
+            INSERT INTO torrent_id_ranges (torrent_id, first_id, last_id)
+            SELECT torrent_id, min(id), max(id) FROM files
+            WHERE torrent_id IS NOT NULL
+            GROUP BY torrent_id
+        """)
+
+        changes = ChangesRepository(conn, cur)
+        for table in ('files', 'torrent_files'):
+            changes.bump(table)
+        conn.commit()
+
+        print("Compacting")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+        print(f"Done, replace {DB_FILE} with {output} (and remove its -wal/-shm files)")
+        if result_cache.path:
+            print(f"Then delete {result_cache.path}, its cached results refer to the old file ids")
+
+    def reorder_files(self, conn: sqlite3.Connection, cur: sqlite3.Cursor):
+        cur.execute("DROP TABLE IF EXISTS file_id_map")
+        cur.execute("""
+            CREATE TABLE file_id_map (
+                old_id INTEGER PRIMARY KEY,
+                new_id INTEGER NOT NULL
+            )
+        """)
+        cur.execute(f"""
+            INSERT INTO file_id_map (old_id, new_id)
+            SELECT id, row_number() OVER (ORDER BY {CLUSTER_ORDER}) FROM files
+        """)
+
+        sql = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'files'").fetchone()[0]
+        # indexes and triggers go with the old table, migrated ones are
+        # not recreated by init_db
+        dependents = [row[0] for row in cur.execute("""
+            SELECT sql FROM sqlite_master
+            WHERE tbl_name = 'files' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+        """).fetchall()]
+        columns = [row[1] for row in cur.execute("PRAGMA table_info(files)").fetchall()]
+        other = ', '.join(f"f.{c}" for c in columns if c != 'id')
+
+        cur.execute(sql.replace('files', 'files_new', 1))
+        cur.execute(f"""
+            INSERT INTO files_new (id, {', '.join(c for c in columns if c != 'id')})
+            SELECT m.new_id, {other} FROM files f
+            JOIN file_id_map m ON m.old_id = f.id
+            ORDER BY m.new_id
+        """)
+        cur.execute("DROP TABLE files")
+        cur.execute("ALTER TABLE files_new RENAME TO files")
+        for statement in dependents:
+            cur.execute(statement)
+
+        for table, column in FILE_ID_REFERENCES:
+            cur.execute(f"DELETE FROM {table} WHERE {column} NOT IN (SELECT old_id FROM file_id_map)")
+            # negative ids first, unique indexes would collide with not yet
+            # rewritten rows otherwise
+            cur.execute(f"""
+                UPDATE {table} SET {column} = -(
+                    SELECT new_id FROM file_id_map WHERE old_id = {table}.{column}
+                )
+            """)
+            cur.execute(f"UPDATE {table} SET {column} = -{column} WHERE {column} < 0")
+
+        conn.commit()
+        init_db(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a copy of the catalog ordered by torrent")
+    parser.add_argument('--output', default=f"{DB_FILE}.reclustered")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    ReclusterTool().run(args.output, args.batch_size)
@@ -0,0 +1,35 @@
+from repositories.changes import ChangesRepository
+from repositories.stats import StatsRepository
+from repositories.terms import TermsRepository
+from services.maintenance import MaintenanceService
+from utils.db import connect_db
+
+
+class RefreshStatsTool:
+    def __init__(self):
+        self.db = connect_db()
+        self.stats = StatsRepository(self.db, self.db.cursor())
+        self.changes = ChangesRepository(self.db, self.db.cursor())
+        self.terms = TermsRepository(self.db, self.db.cursor())
+        self.maintenance = MaintenanceService(self.db, self.db.cursor())
+
+    def run(self):
+        self.stats.refresh()
+        self.changes.bump('stats')
+        self.db.commit()
+
+        terms = self.terms.refresh()
+        print("Suggestion terms:", terms)
+
+        print("Files:", self.stats.total())
+        for facet in ('language', 'extension', 'is_journal'):
+            values = sorted(self.stats.values(facet).items(), key=lambda v: -v[1])
+            print(f"{facet}:", ', '.join(f"{v}={c}" for v, c in values[:10]))
+
+        # sampled, a full ANALYZE holds the write lock for minutes
+        self.maintenance.analyze(force=True)
+        self.db.close()
+
+
+if __name__ == '__main__':
+    RefreshStatsTool().run()
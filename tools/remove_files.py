@@ -0,0 +1,45 @@
+import argparse
+import sys
+
+from services.files import FilesService
+from utils.db import connect_db
+
+
+class RemoveFilesTool:
+    """
+    Removes files by md5, one per input line, with their full-text
+    postings, author links and torrent file records
+    (FilesService.remove_file()).
+    """
+
+    def __init__(self):
+        self.db = connect_db(profile=False)
+        self.svc = FilesService(self.db, self.db.cursor())
+
+    def run(self, lines, dry_run: bool = False):
+        removed = missing = 0
+
+        for md5, file in self.svc.files_repo.resolve_md5s(lines, details=False):
+            if file is None:
+                missing += 1
+                continue
+
+            assert(file.file_id)
+            if dry_run:
+                print(f"{md5} {file.title}")
+                removed += 1
+            elif self.svc.remove_file(file.file_id):
+                removed += 1
+
+        verb = "would remove" if dry_run else "removed"
+        print(f"{removed} {verb}, {missing} not found", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Remove files from the catalog by md5")
+    parser.add_argument('--input', help="file of md5s, one per line, stdin by default")
+    parser.add_argument('--dry-run', action='store_true', help="only list the files that would be removed")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input in (None, '-') else open(args.input, encoding='utf-8')
+    RemoveFilesTool().run(source, args.dry_run)
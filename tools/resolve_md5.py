@@ -0,0 +1,85 @@
+import argparse
+import sys
+import time
+
+from repositories.files import RESOLVE_BATCH_SIZE, FilesRepository
+from utils.db import connect_db
+from utils.records import (
+    COMPRESSIONS,
+    RESOLVE_FIELDS,
+    RecordWriter,
+    compression_of,
+    detail_fields,
+    open_output,
+    parse_fields,
+)
+
+
+class ResolveMd5Tool:
+    """
+    Resolves md5s, one per input line, to torrent, byteoffset,
+    server_path and local status (FilesRepository.resolve_md5s()).
+    Input is read and results written batch by batch, unknown md5s go
+    to a separate file.
+    """
+
+    def __init__(self):
+        self.db = connect_db(profile=False, readonly=True)
+        self.files_repo = FilesRepository(self.db, self.db.cursor())
+
+    def run(self, lines, out, missing_out, fields, output_format: str, batch_size: int):
+        writer = RecordWriter(out, fields, output_format)
+        details = bool(detail_fields(fields))
+        start = time.monotonic()
+        resolved = missing = 0
+
+        for md5, file in self.files_repo.resolve_md5s(lines, batch_size, details):
+            if file is None:
+                missing += 1
+                if missing_out:
+                    missing_out.write(md5 + '\n')
+                continue
+
+            writer.write(file)
+            resolved += 1
+
+        out.flush()
+        elapsed = time.monotonic() - start
+        total = resolved + missing
+        print(
+            f"{resolved} resolved, {missing} not found in {elapsed:.1f}s"
+            f" ({total / elapsed if elapsed else 0:.0f}/s)",
+            file=sys.stderr,
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resolve md5s to torrents, byteoffsets and paths")
+    parser.add_argument('--input', help="file of md5s, one per line, stdin by default")
+    parser.add_argument('--output', help="output file, stdout by default")
+    parser.add_argument('--missing', help="file for md5s that are not in the catalog")
+    parser.add_argument('--fields', help=f"comma separated file fields or 'all', default {','.join(RESOLVE_FIELDS)}")
+    parser.add_argument('--format', choices=RecordWriter.FORMATS, default='jsonl')
+    parser.add_argument(
+        '--compress', choices=tuple(COMPRESSIONS),
+        help="compression, inferred from the --output suffix by default",
+    )
+    parser.add_argument('--batch-size', type=int, default=RESOLVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        fields = parse_fields(args.fields, RESOLVE_FIELDS)
+    except ValueError as e:
+        parser.error(str(e))
+
+    source = sys.stdin if args.input in (None, '-') else open(args.input, encoding='utf-8')
+    out = open_output(args.output, args.compress or compression_of(args.output))
+    missing_out = open(args.missing, 'w', encoding='utf-8') if args.missing else None
+
+    try:
+        ResolveMd5Tool().run(source, out, missing_out, fields, args.format, max(1, args.batch_size))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if missing_out:
+            missing_out.close()
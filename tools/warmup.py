@@ -0,0 +1,24 @@
+import argparse
+
+from services.warmup import WARMUP_MB, WARMUP_SECONDS, WarmupService
+from utils.db import connect_db
+
+
+class WarmupTool:
+    def __init__(self):
+        self.db = connect_db(profile=False)
+
+    def run(self, max_mb: int, timeout_s: float):
+        svc = WarmupService(self.db, max_mb * 1024 * 1024, timeout_s)
+        report = svc.run(progress=print)
+        print(report)
+        self.db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read the pages first searches need into the OS cache")
+    parser.add_argument('--mb', type=int, default=WARMUP_MB, help="memory budget of structure and index pages")
+    parser.add_argument('--seconds', type=float, default=WARMUP_SECONDS)
+    args = parser.parse_args()
+
+    WarmupTool().run(args.mb, args.seconds)
@@ -0,0 +1,41 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+_separator_re = re.compile(r'\s*(?:;|&|\band\b)\s*', re.IGNORECASE)
+_punctuation_re = re.compile(r'[^\w\s]')
+_space_re = re.compile(r'\s+')
+
+# Longest author name kept, longer values are free text rather than names
+MAX_AUTHOR_LENGTH = 200
+
+
+def split_authors(author: Optional[str]) -> List[str]:
+    """Author names of a files.author value, "A; B", "A & B" and "A and B" alike"""
+    if not author:
+        return []
+
+    names = []
+    for name in _separator_re.split(author):
+        name = _space_re.sub(' ', name).strip(' ,.')
+        if name and len(name) <= MAX_AUTHOR_LENGTH and author_key(name) and name not in names:
+            names.append(name)
+
+    return names
+
+
+def author_key(name: str, reorder: bool = True) -> str:
+    """
+    Case, diacritics and punctuation folded name, "Tolstoy, Leo" and
+    "Leo Tolstoy" share a key. reorder=False keeps the word order of
+    "Last, First", for partial names.
+    """
+    parts = name.split(',')
+    if reorder and len(parts) == 2 and parts[1].strip():
+        name = f"{parts[1]} {parts[0]}"
+
+    folded = unicodedata.normalize('NFKD', name)
+    folded = ''.join(c for c in folded if not unicodedata.combining(c)).casefold()
+    folded = _punctuation_re.sub(' ', folded)
+
+    return _space_re.sub(' ', folded).strip()
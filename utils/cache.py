@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LruCache:
+    """In-process LRU cache with optional expiry, safe to share between threads"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() > expires_at:
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SchemaCache:
+    """
+    Value load() derives from the schema of a connection, kept while the
+    connection lives and loaded again once PRAGMA schema_version changed,
+    also by other processes (migrations, tools.rebuild_fts). Connections
+    without weak references (plain sqlite3.Connection) are not cached.
+    """
+
+    def __init__(self, load: Callable[[sqlite3.Connection], Any]) -> None:
+        self.load = load
+        self.entries: weakref.WeakKeyDictionary
+        self.entries = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def get(self, conn: sqlite3.Connection) -> Any:
+        # read before loading, a change in between is seen by the next call
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        try:
+            with self.lock:
+                entry = self.entries.get(conn)
+        except TypeError:
+            return self.load(conn)
+
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        value = self.load(conn)
+        with self.lock:
+            self.entries[conn] = (version, value)
+
+        return value
@@ -1,29 +1,238 @@
 #!/usr/bin/env python3
+import re
 import sqlite3
 import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 from config import DB_FILE
+from utils.cache import SchemaCache
+from utils.fts import FtsOptions, create_fts_table
+from utils.query_log import ProfiledConnection
 
-def connect_db():
-    conn = sqlite3.connect(DB_FILE, timeout=10)
+# Number of SQLite VM instructions between deadline checks
+PROGRESS_HANDLER_OPS = 1000
+
+# Rows written per transaction into shadow tables
+SHADOW_BATCH_SIZE = 10000
+
+# Sort key columns and indexes of files, see utils.sort_keys. init_db
+# only creates the indexes with a new, empty files table, older catalogs
+# get columns and indexes from tools.backfill_sort_keys: building them
+# over a large table takes minutes
+SORT_KEY_COLUMN_TYPES = {
+    'title_sort': 'TEXT',
+    'year_sort': 'INTEGER',
+}
+SORT_KEY_INDEXES = {
+    'idx_files_title_sort': 'files(title_sort)',
+    'idx_files_year_sort': 'files(year_sort)',
+}
+
+# Indexes of language and extension filters (repositories.planner),
+# created with a new files table and by tools.build_filter_indexes on
+# older catalogs
+PLANNER_INDEXES = {
+    'idx_files_language_year': 'files(language, year)',
+    'idx_files_extension': 'files(extension)',
+}
+
+_create_table_re = re.compile(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?("[^"]+"|\w+)', re.IGNORECASE)
+
+
+class QueryTimeoutException(Exception):
+    pass
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3.Connection with weak references, as utils.cache.SchemaCache keys"""
+
+
+def connect_db(profile=True, readonly=False):
+    """
+    profile: time statements of connection cursors, see utils.query_log.
+    Bulk writers should pass False.
+    readonly: refuse writes and skip schema setup, for reader pools
+    (utils.reader_pool) of an existing database.
+    """
+    factory = ProfiledConnection if profile else Connection
+    conn = sqlite3.connect(DB_FILE, timeout=10, factory=factory)
     conn.row_factory = sqlite3.Row
 
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
     conn.execute("PRAGMA journal_mode=WAL")
 
     init_db(conn)
     return conn
 
 
-def interrupt_after(seconds, connection):
-    start = time.time()
+# Active deadlines per connection: (expires_at, progress handler granularity)
+_deadlines: Dict[int, List[Tuple[float, int]]]
+_deadlines = {}
+
+
+def _set_deadline_handler(connection, deadlines):
     def progress():
-        if time.time() - start > seconds:
+        if time.monotonic() > min(d[0] for d in deadlines):
             return 1  # nonzero return = abort query
-    connection.set_progress_handler(progress, 1000)
+
+    connection.set_progress_handler(progress, deadlines[-1][1])
+
+
+@contextmanager
+def query_deadline(connection, timeout_ms: Optional[int], granularity: int = PROGRESS_HANDLER_OPS):
+    """
+    Abort queries executed on connection inside the block once timeout_ms
+    has passed. Raises QueryTimeoutException. Deadlines may be nested,
+    the earliest one wins.
+    """
+    if not timeout_ms:
+        yield
+        return
+
+    expires_at = time.monotonic() + timeout_ms / 1000
+    deadlines = _deadlines.setdefault(id(connection), [])
+    deadlines.append((expires_at, granularity))
+    _set_deadline_handler(connection, deadlines)
+
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if str(e) == 'interrupted' and time.monotonic() > expires_at:
+            raise QueryTimeoutException(f"query exceeded {timeout_ms}ms deadline") from e
+        raise
+    finally:
+        deadlines.pop()
+        if deadlines:
+            _set_deadline_handler(connection, deadlines)
+        else:
+            del _deadlines[id(connection)]
+            connection.set_progress_handler(None, 0)
+
+@dataclass
+class _Schema:
+    columns: Dict[str, Set[str]]
+    indexes: Set[str]
+
+
+def _load_schema(conn: sqlite3.Connection) -> _Schema:
+    schema = _Schema(columns={}, indexes=set())
+    rows = conn.execute("""
+        SELECT m.type, m.name, p.name FROM sqlite_master m
+        LEFT JOIN pragma_table_info(m.name) p ON m.type = 'table'
+        WHERE m.type IN ('table', 'index')
+    """).fetchall()
+
+    for type, name, column in rows:
+        if type == 'index':
+            schema.indexes.add(name)
+        elif column is not None:
+            schema.columns.setdefault(name, set()).add(column)
+
+    return schema
+
+
+# Columns and index names per connection, see table_columns()
+_schemas = SchemaCache(_load_schema)
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> Set[str]:
+    """
+    Columns of a table, cached per connection until the schema changes,
+    e.g. by tools.backfill_sort_keys
+    """
+    return _schemas.get(conn).columns.get(table, set())
+
+
+def index_names(conn: sqlite3.Connection) -> Set[str]:
+    """Names of all indexes, cached like table_columns()"""
+    return _schemas.get(conn).indexes
+
+
+def create_indexes(cur: sqlite3.Cursor, indexes: Dict[str, str]):
+    for name, target in indexes.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target};")
+
+
+def create_shadow_table(cur: sqlite3.Cursor, table: str) -> str:
+    """
+    Empty copy of table named {table}_new to rebuild it without a long
+    write transaction, see fill_table() and swap_shadow_tables()
+    """
+    sql = cur.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0]
+
+    shadow = f"{table}_new"
+    cur.execute(f"DROP TABLE IF EXISTS {shadow}")
+    cur.execute(_create_table_re.sub(f"CREATE TABLE {shadow}", sql))
+    cur.connection.commit()
+    return shadow
+
+
+def fill_table(
+    conn: sqlite3.Connection,
+    table: str,
+    columns: Sequence[str],
+    select: str,
+    params: Iterable = (),
+    batch_size: int = SHADOW_BATCH_SIZE,
+) -> int:
+    """
+    Insert the rows of select into table, one transaction per batch_size
+    rows. The select only holds a read snapshot, so writers wait for one
+    batch at most. Returns the number of rows.
+    """
+    read_cur = conn.cursor()
+    write_cur = conn.cursor()
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+
+    conn.commit()
+    read_cur.execute(select, tuple(params))
+    count = 0
+    while rows := read_cur.fetchmany(batch_size):
+        write_cur.executemany(insert, rows)
+        conn.commit()
+        count += len(rows)
+
+    return count
+
+
+def swap_shadow_tables(conn: sqlite3.Connection, tables: Iterable[str]):
+    """Replace tables by their {table}_new copies in one short transaction"""
+    tables = list(tables)
+    for table in tables:
+        # left by an interrupted swap
+        conn.execute(f"DROP TABLE IF EXISTS {table}_old")
+
+    conn.commit()
+    conn.execute("BEGIN")
+    try:
+        for table in tables:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+
+    # freeing the old pages takes a while for large tables, not in the swap
+    for table in tables:
+        conn.execute(f"DROP TABLE {table}_old")
+        conn.commit()
+
 
 # --- Database setup ---
 def init_db(conn):
     cur = conn.cursor()
 
+    new_catalog = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files'"
+    ).fetchone() is None
+
     # Main files table
     cur.execute("""
     CREATE TABLE IF NOT EXISTS files (
@@ -41,6 +250,8 @@ def init_db(conn):
         torrent_id INTEGER,
         byteoffset integer,
         is_journal int DEFAULT 0 NOT NULL,
+        title_sort TEXT,
+        year_sort INTEGER,
         FOREIGN KEY(torrent_id) REFERENCES torrents(id)
     );
     """)
@@ -49,13 +260,106 @@ def init_db(conn):
     cur.execute("CREATE INDEX IF NOT EXISTS idx_files_torrent_id ON files(torrent_id);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_files_is_journal on files(is_journal);")
 
+    # instant on an empty table, see PLANNER_INDEXES and SORT_KEY_INDEXES
+    if new_catalog:
+        create_indexes(cur, PLANNER_INDEXES)
+        create_indexes(cur, SORT_KEY_INDEXES)
+
+    # File id ranges holding all files of a torrent, written by
+    # tools.recluster. A range is dropped once a file joins the torrent
+    # outside of it
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS torrent_id_ranges (
+        torrent_id INTEGER PRIMARY KEY,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL
+    );
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS files_insert_torrent_range AFTER INSERT ON files
+    WHEN NEW.torrent_id IS NOT NULL
+    BEGIN
+        DELETE FROM torrent_id_ranges WHERE torrent_id = NEW.torrent_id;
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS files_update_torrent_range AFTER UPDATE OF torrent_id ON files
+    WHEN NEW.torrent_id IS NOT NULL
+    BEGIN
+        DELETE FROM torrent_id_ranges WHERE torrent_id = NEW.torrent_id;
+    END;
+    """)
+
+    # Cached value counts of filterable columns, see repositories.stats
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS files_stats (
+        facet TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (facet, value)
+    ) WITHOUT ROWID;
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS files_facets (
+        language TEXT,
+        extension TEXT,
+        year TEXT,
+        is_journal INT,
+        count INTEGER NOT NULL
+    );
+    """)
+
     # FTS table for searchable text fields
+    create_fts_table(cur, 'files_fts', FtsOptions())
+    cur.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts_vocab USING fts5vocab(files_fts, row);"
+    )
+
+    # Term frequencies for typeahead suggestions, see repositories.terms
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS files_terms (
+        term TEXT PRIMARY KEY,
+        doc INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """)
     cur.execute("""
-    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
-        text,
-        content=''
+    CREATE TABLE IF NOT EXISTS files_term_prefixes (
+        prefix TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        term TEXT NOT NULL,
+        doc INTEGER NOT NULL,
+        PRIMARY KEY (prefix, position)
+    ) WITHOUT ROWID;
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS files_term_deletes (
+        variant TEXT NOT NULL,
+        term TEXT NOT NULL,
+        PRIMARY KEY (variant, term)
+    ) WITHOUT ROWID;
+    """)
+
+    # Normalized authors of files.author, see repositories.authors.
+    # Older databases are filled by tools.build_authors
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS authors (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        file_count INTEGER NOT NULL DEFAULT 0
     );
     """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_authors_name_key ON authors(name_key);")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS file_authors (
+        author_id INTEGER NOT NULL,
+        file_id INTEGER NOT NULL,
+        PRIMARY KEY (author_id, file_id)
+    ) WITHOUT ROWID;
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_file_authors_file_id ON file_authors(file_id);")
 
     # Torrents table
     cur.execute("""
@@ -96,6 +400,40 @@ def init_db(conn):
         "CREATE INDEX IF NOT EXISTS idx_torrent_files_torrent_id ON torrent_files(torrent_id);"
     )
 
+    # Change counters of tables cached results depend on, see
+    # repositories.changes and utils.result_cache. torrents and
+    # torrent_files are counted by triggers, files by its writers once
+    # per batch, stats by refresh_stats
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS change_counters (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """)
+    cur.executemany(
+        "INSERT OR IGNORE INTO change_counters (name, version) VALUES (?, 0)",
+        [(name,) for name in ('files', 'torrents', 'torrent_files', 'stats')]
+    )
+
+    # Change counter versions maintenance tasks last ran at, see
+    # services.maintenance
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS maintenance_state (
+        task TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        finished_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    """)
+
+    for table in ('torrents', 'torrent_files'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_counter AFTER {event} ON {table}
+            BEGIN
+                UPDATE change_counters SET version = version + 1 WHERE name = '{table}';
+            END;
+            """)
+
     conn.commit()
 
 
@@ -0,0 +1,196 @@
+import sqlite3
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from models.file import FileModel
+from utils.cache import SchemaCache
+
+# Columns of the multi-column files_fts layout
+FTS_COLUMNS = ('title', 'author', 'description', 'tags')
+
+# Single column layout of databases created before FTS_COLUMNS
+LEGACY_FTS_COLUMNS = ('text',)
+
+# Columns of the optional trigram index used for substring matches
+TRIGRAM_COLUMNS = ('title', 'author')
+TRIGRAM_TABLE = 'files_fts_trigram'
+
+# Tokenizer choices for files_fts
+TOKENIZERS = {
+    # case and diacritics folded: "Émile" matches "emile"
+    'unicode61': "unicode61 remove_diacritics 2",
+    # as unicode61 plus english stemming: "libraries" matches "library"
+    'porter': "porter unicode61 remove_diacritics 2",
+}
+
+# bm25 weight per column, a title hit outranks a description hit
+DEFAULT_WEIGHTS = {
+    'title': 10.0,
+    'author': 5.0,
+    'description': 1.0,
+    'tags': 2.0,
+}
+
+
+@dataclass
+class FtsOptions:
+    columns: Tuple[str, ...] = FTS_COLUMNS
+    weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_WEIGHTS))
+
+    # key of TOKENIZERS
+    tokenizer: str = 'unicode61'
+
+    # build TRIGRAM_TABLE next to files_fts
+    trigram: bool = False
+
+    # 'full' keeps token positions, 'column' drops them (no phrase/NEAR
+    # queries), 'none' also drops columns (no column filters)
+    detail: str = 'full'
+
+    # store per-column token counts, used by bm25 length normalization
+    columnsize: bool = True
+
+    # allow plain DELETE of rows, needs SQLite 3.43+
+    contentless_delete: bool = False
+
+    # prefix lengths with their own index, "ab*"/"abc*" queries read it
+    # instead of all terms starting with the prefix
+    prefix: Tuple[int, ...] = (2, 3)
+
+    def table_options(self):
+        if self.detail not in ('full', 'column', 'none'):
+            raise ValueError(f"unknown detail level {self.detail}")
+
+        options = ["content=''"]
+        if self.detail != 'full':
+            options.append(f"detail={self.detail}")
+        if not self.columnsize:
+            options.append("columnsize=0")
+        if self.contentless_delete:
+            if sqlite3.sqlite_version_info < (3, 43, 0):
+                raise ValueError(f"contentless_delete needs SQLite 3.43+, have {sqlite3.sqlite_version}")
+            options.append("contentless_delete=1")
+        if self.prefix:
+            options.append(f"prefix='{' '.join(str(int(p)) for p in self.prefix)}'")
+
+        return options
+
+
+def create_fts_table(cur: sqlite3.Cursor, name: str, options: FtsOptions):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    if cur.fetchone():
+        return
+
+    if options.tokenizer not in TOKENIZERS:
+        raise ValueError(f"unknown tokenizer {options.tokenizer}")
+
+    cur.execute(f"""
+    CREATE VIRTUAL TABLE {name} USING fts5(
+        {', '.join(options.columns)},
+        {', '.join(options.table_options())},
+        tokenize='{TOKENIZERS[options.tokenizer]}'
+    );
+    """)
+
+    if options.columns != LEGACY_FTS_COLUMNS:
+        set_rank_weights(cur, name, options)
+
+
+def create_trigram_table(cur: sqlite3.Cursor, name: str, options: FtsOptions):
+    # substring matches are phrase queries of trigrams, they need positions
+    # whatever detail level files_fts has
+    trigram_options = replace(options, prefix=(), detail='full')
+    cur.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(
+        {', '.join(TRIGRAM_COLUMNS)},
+        {', '.join(trigram_options.table_options())},
+        tokenize='trigram'
+    );
+    """)
+
+
+def set_rank_weights(cur: sqlite3.Cursor, name: str, options: FtsOptions):
+    """Persist bm25 column weights used by ORDER BY rank"""
+    weights = ', '.join(str(float(options.weights.get(c, 1.0))) for c in options.columns)
+    cur.execute(
+        f"INSERT INTO {name} ({name}, rank) VALUES ('rank', ?)",
+        (f"bm25({weights})",)
+    )
+
+
+@dataclass
+class FtsLayout:
+    columns: Tuple[str, ...]
+    has_trigram: bool
+
+    # rows can be removed with DELETE instead of the 'delete' command
+    contentless_delete: bool = False
+
+    # TRIGRAM_TABLE keeps positions, substring matches can use it
+    trigram_phrases: bool = True
+
+
+def _load_layout(conn: sqlite3.Connection) -> FtsLayout:
+    rows = conn.execute("PRAGMA table_info(files_fts)").fetchall()
+    trigram = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = ?", (TRIGRAM_TABLE,)
+    ).fetchone()
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'files_fts'"
+    ).fetchone()
+
+    return FtsLayout(
+        columns=tuple(row[1] for row in rows),
+        has_trigram=trigram is not None,
+        # trigram tables of older rebuilds with --detail column/none
+        # cannot run substring (phrase) queries
+        trigram_phrases=trigram is not None and 'detail=' not in trigram[0].replace(' ', ''),
+        contentless_delete=bool(sql) and 'contentless_delete=1' in sql[0].replace(' ', ''),
+    )
+
+
+_layouts = SchemaCache(_load_layout)
+
+
+def fts_layout(conn: sqlite3.Connection) -> FtsLayout:
+    """Layout of the FTS tables, cached per connection until the schema changes"""
+    return _layouts.get(conn)
+
+
+def fts_columns(conn: sqlite3.Connection) -> Tuple[str, ...]:
+    return fts_layout(conn).columns
+
+
+def fts_values(file: FileModel) -> Dict[str, str]:
+    """Values of FTS_COLUMNS for a file"""
+    tags = [file.extension or '']
+    if file.year:
+        tags.append(str(file.year))
+    tags += file.languages
+
+    return {
+        'title': file.title or '',
+        'author': file.author or '',
+        'description': file.description or '',
+        'tags': ' '.join(t for t in tags if t),
+    }
+
+
+def trigram_values(file: FileModel) -> Dict[str, str]:
+    """Values of TRIGRAM_COLUMNS for a file"""
+    return {
+        'title': file.title or '',
+        'author': file.author or '',
+    }
+
+
+def column_filter(query_text: str, columns: Optional[List[str]], available=FTS_COLUMNS):
+    """Restrict an FTS5 query to some columns of the multi-column layout"""
+    if not columns:
+        return query_text
+
+    unknown = set(columns) - set(available)
+    if unknown:
+        raise ValueError(f"unknown FTS columns {', '.join(sorted(unknown))}")
+
+    return f"{{{' '.join(columns)}}} : ({query_text})"
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+# Limits of request heads and bodies
+MAX_HEAD_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# Seconds an idle keep-alive connection stays open
+KEEP_ALIVE_TIMEOUT = 15
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    504: 'Gateway Timeout',
+}
+
+
+class HttpException(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, str] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b''
+    version: str = 'HTTP/1.1'
+
+    @property
+    def http10(self) -> bool:
+        return self.version == 'HTTP/1.0'
+
+    @property
+    def keep_alive(self) -> bool:
+        # HTTP/1.0 connections close unless the client asks otherwise
+        connection = self.headers.get('connection', '').lower()
+        if self.http10:
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+class Response:
+    """
+    Response to one request. send_json() writes a whole body, start() /
+    write() / end() stream one with chunked transfer encoding, or for
+    HTTP/1.0 clients as a body ended by closing the connection.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, keep_alive: bool, http10: bool = False) -> None:
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.http10 = http10
+        self.started = False
+        self.chunked = False
+
+    def _head(self, status: int, content_type: str, headers: Dict[str, str]):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if self.keep_alive else 'close'}")
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        self.started = True
+
+    async def send_json(self, data: Any, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+        self._head(status, 'application/json; charset=utf-8', {'Content-Length': str(len(body))})
+        self.writer.write(body)
+        await self.writer.drain()
+
+    async def start(self, content_type: str = 'application/json; charset=utf-8', status: int = 200):
+        if self.http10:
+            # no chunked encoding in HTTP/1.0, the body ends with the connection
+            self.keep_alive = False
+            self._head(status, content_type, {})
+            return
+
+        self._head(status, content_type, {'Transfer-Encoding': 'chunked'})
+        self.chunked = True
+
+    async def write(self, data: bytes):
+        if not data:
+            return
+
+        if self.chunked:
+            self.writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self.writer.write(data)
+        await self.writer.drain()
+
+    async def end(self):
+        if self.chunked:
+            self.writer.write(b'0\r\n\r\n')
+        await self.writer.drain()
+
+
+Handler = Callable[[Request, Response], Awaitable[None]]
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Next request of a connection, None once the client is gone"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpException(413, "request head too large")
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise HttpException(400, "malformed request line")
+
+    if version not in ('HTTP/1.0', 'HTTP/1.1'):
+        raise HttpException(400, f"unsupported version {version}")
+
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    length = headers.get('content-length') or '0'
+    # int() would take signs, spaces and underscores
+    if not (length.isascii() and length.isdigit()):
+        raise HttpException(400, "invalid Content-Length")
+
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        raise HttpException(413, "request body too large")
+
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+    url = urlsplit(target)
+    return Request(
+        method=method.upper(),
+        path=url.path,
+        query=dict(parse_qsl(url.query)),
+        headers=headers,
+        body=body,
+        version=version,
+    )
+
+
+async def handle_connection(handler: Handler, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except HttpException as e:
+                await Response(writer, keep_alive=False).send_json({'error': str(e)}, e.status)
+                break
+
+            if request is None:
+                break
+
+            response = Response(writer, request.keep_alive, request.http10)
+            try:
+                await handler(request, response)
+            except Exception as e:
+                status = e.status if isinstance(e, HttpException) else 500
+                if status == 500:
+                    traceback.print_exc()
+
+                if response.started:
+                    # too late for a status, cut the stream short
+                    break
+                await response.send_json({'error': str(e) if status != 500 else 'internal error'}, status)
+
+            if not response.keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_socket(sock: socket.socket, handler: Handler):
+    server = await asyncio.start_server(
+        lambda r, w: handle_connection(handler, r, w), sock=sock, limit=MAX_HEAD_BYTES,
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def serve(
+    host: str,
+    port: int,
+    workers: int,
+    make_handler: Callable[[int], Handler],
+):
+    """
+    Serve on host:port from `workers` pre-forked processes sharing one
+    listening socket, a worker is restarted if it dies. make_handler gets
+    the worker number and runs in the worker after fork(), so connections
+    and threads it starts are the worker's own.
+    """
+    sock = socket.create_server((host, port), backlog=1024)
+
+    def run_worker(number: int):
+        asyncio.run(serve_socket(sock, make_handler(number)))
+
+    if workers <= 1:
+        try:
+            run_worker(0)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(number: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(number)
+            finally:
+                os._exit(0)
+
+        children[pid] = number
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for number in range(workers):
+        spawn(number)
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+
+        number = children.pop(pid, None)
+        if number is not None and not stopping:
+            spawn(number)
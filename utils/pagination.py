@@ -0,0 +1,76 @@
+import base64
+import hashlib
+import json
+import secrets
+from typing import Any, Optional
+
+from utils.cache import LruCache
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+# Keys of cursors and their types: keyset pages continue after (v, i),
+# the sort value and file id of the last row, ranked pages at position
+# p of the cached result r
+CURSOR_FIELDS = {
+    'keyset': {'i': (int,), 'v': (str, int, float, type(None))},
+    'ranked': {'r': (str,), 'p': (int,)},
+}
+
+
+def query_hash(*args):
+    """Short fingerprint of search arguments a cursor is bound to"""
+    data = json.dumps(args, default=str).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, expected_hash: str, kind: str = 'keyset') -> dict:
+    """Cursor data of a search with expected_hash, checked against CURSOR_FIELDS[kind]"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+    except ValueError as e:
+        raise InvalidCursorException("malformed cursor") from e
+
+    if not isinstance(data, dict) or data.get('h') != expected_hash:
+        raise InvalidCursorException("cursor belongs to a different search")
+
+    for key, types in CURSOR_FIELDS[kind].items():
+        if key not in data:
+            raise InvalidCursorException(f"cursor has no '{key}'")
+
+        value = data[key]
+        # bool is an int subclass
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise InvalidCursorException(f"cursor '{key}' has the wrong type")
+
+        # SQLite integers are 64 bit
+        if isinstance(value, int) and not -2**63 <= value < 2**63:
+            raise InvalidCursorException(f"cursor '{key}' is out of range")
+
+    if kind == 'ranked' and data['p'] < 0:
+        raise InvalidCursorException("cursor position is negative")
+
+    return data
+
+
+class ResultIdsCache:
+    """Short-lived results (ordered id lists) of ranked searches under random keys"""
+
+    def __init__(self, ttl: float = 600, max_entries: int = 256) -> None:
+        self.cache = LruCache(max_entries, ttl)
+
+    def put(self, value: Any) -> str:
+        key = secrets.token_hex(8)
+        self.cache.put(key, value)
+        return key
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
@@ -0,0 +1,271 @@
+import json
+import logging
+import logging.handlers
+import re
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import config
+
+# Upper bounds (ms) of latency histogram buckets, last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+# Cap on distinct statements tracked, dynamic SQL must not grow stats unbounded
+MAX_STATEMENTS = 1000
+
+_whitespace_re = re.compile(r'\s+')
+_in_list_re = re.compile(r'IN \([\d\s,?-]+\)', re.IGNORECASE)
+
+
+def normalize_sql(sql: str):
+    sql = _whitespace_re.sub(' ', sql).strip()
+    return _in_list_re.sub('IN (...)', sql)
+
+
+class StatementStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, elapsed_ms: float, error: bool):
+        self.count += 1
+        self.errors += int(error)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                return
+
+        self.buckets[-1] += 1
+
+    def to_dict(self):
+        labels = [f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 3),
+            'histogram': {
+                label: n for label, n in zip(labels, self.buckets) if n
+            },
+        }
+
+
+class QueryLog:
+    """
+    Per-process statement timings. Statements slower than threshold_ms
+    are written with their parameters and query plan to a rotating
+    JSONL file.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        threshold_ms: float = 200,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.stats: Dict[str, StatementStats]
+        self.stats = {}
+        self.lock = threading.Lock()
+
+        self.logger = logging.getLogger('aa_local_db.slow_queries')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+        if path and not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def record(self, connection, sql: str, params, elapsed_ms: float, error: Optional[str] = None):
+        key = normalize_sql(sql)
+
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                if len(self.stats) >= MAX_STATEMENTS:
+                    key = '<other>'
+                stats = self.stats.setdefault(key, StatementStats())
+
+            stats.add(elapsed_ms, error is not None)
+
+        if elapsed_ms >= self.threshold_ms and self.logger.handlers:
+            self.logger.info(json.dumps({
+                'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'elapsed_ms': round(elapsed_ms, 3),
+                'sql': key,
+                'params': params,
+                'error': error,
+                'plan': self.explain(connection, sql, params),
+            }, default=repr, ensure_ascii=False))
+
+    def explain(self, connection, sql: str, params) -> Optional[List[str]]:
+        if not sql.lstrip()[:6].upper() in ('SELECT', 'WITH'):
+            return None
+
+        try:
+            # plain cursor, explaining must not be recorded itself
+            cur = sqlite3.Cursor(connection)
+            cur.execute('EXPLAIN QUERY PLAN ' + sql, params or ())
+
+            depth = {0: 0}
+            plan = []
+            for row in cur.fetchall():
+                depth[row[0]] = depth.get(row[1], 0) + 1
+                plan.append('  ' * (depth[row[0]] - 1) + row[3])
+
+            return plan
+        except sqlite3.Error as e:
+            return [f"EXPLAIN failed: {e}"]
+
+    def dump(self, fp=None):
+        with self.lock:
+            data = {
+                sql: stats.to_dict()
+                for sql, stats in sorted(
+                    self.stats.items(),
+                    key=lambda item: item[1].total_ms,
+                    reverse=True
+                )
+            }
+
+        json.dump(data, fp or sys.stderr, indent=2, ensure_ascii=False)
+
+    def install_dump_signal(self, signum=signal.SIGUSR1):
+        """Dump statement histograms to stderr when the process gets signum"""
+        try:
+            signal.signal(signum, lambda *_: self.dump())
+            return True
+        except ValueError:
+            # not the main thread
+            return False
+
+
+query_log = QueryLog(
+    getattr(config, 'SLOW_QUERY_LOG', None),
+    threshold_ms=getattr(config, 'SLOW_QUERY_MS', 200),
+)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor timing each statement from execute() until its rows are consumed"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._pending = None
+        self._elapsed = 0.0
+
+    def _finish(self, error: Optional[str] = None):
+        if self._pending is None:
+            return
+
+        sql, params = self._pending
+        self._pending = None
+        query_log.record(self.connection, sql, params, self._elapsed * 1000, error)
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        except StopIteration:
+            self._elapsed += time.perf_counter() - start
+            self._finish()
+            raise
+        except Exception as e:
+            self._elapsed += time.perf_counter() - start
+            self._finish(str(e))
+            raise
+
+        self._elapsed += time.perf_counter() - start
+        return result
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._pending = (sql, parameters)
+        self._elapsed = 0.0
+
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish()
+
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._pending = (sql, None)
+        self._elapsed = 0.0
+
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._finish()
+        return self
+
+    def executescript(self, sql_script):
+        self._finish()
+        self._pending = (sql_script, None)
+        self._elapsed = 0.0
+
+        self._timed(super().executescript, sql_script)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        # single row reads are the common case, the statement is recorded
+        # with its first row, later rows of it are not timed
+        row = self._timed(super().fetchone)
+        self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        rows = self._timed(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors, including those of its execute shortcuts, are ProfiledCursor"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
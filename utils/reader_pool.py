@@ -0,0 +1,78 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import config
+from utils.db import connect_db
+
+T = TypeVar('T')
+
+
+class ReaderPool:
+    """
+    Worker threads with one read-only connection each. SQLite releases
+    the GIL while it executes, so queries submitted from several threads
+    or coroutines run in parallel. Repositories are created per worker
+    thread on its connection, see repository().
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='reader')
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = connect_db(readonly=True)
+            self.local.conn = conn
+            self.local.repositories = {}
+
+        return conn
+
+    def repository(self, repository_class: Callable[..., T]) -> T:
+        """Instance of repository_class on the calling worker's connection"""
+        conn = self._connection()
+        repositories: Dict[Any, Any] = self.local.repositories
+        if repository_class not in repositories:
+            repositories[repository_class] = repository_class(conn, conn.cursor())
+
+        return repositories[repository_class]
+
+    def submit(self, fn: Callable[..., T], *args, **kwargs):
+        """concurrent.futures.Future of fn(*args, **kwargs) run on a worker"""
+        return self.executor.submit(fn, *args, **kwargs)
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Await fn(*args, **kwargs) run on a worker"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+_pool: Optional[ReaderPool]
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _forget_pool():
+    # worker threads do not survive fork()
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def reader_pool() -> ReaderPool:
+    """Process wide pool of READER_POOL_SIZE workers"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ReaderPool(getattr(config, 'READER_POOL_SIZE', 4))
+
+        return _pool
@@ -0,0 +1,128 @@
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import sys
+from typing import IO, Any, Dict, Optional, Sequence, Tuple
+
+from models.file import FileModel
+
+# FileModel fields of exported, served and printed file records
+FILE_FIELDS = (
+    'file_id',
+    'md5',
+    'title',
+    'author',
+    'year',
+    'extension',
+    'languages',
+    'is_journal',
+    'torrent',
+    'torrent_id',
+    'torrent_magnet_link',
+    'byteoffset',
+    'ipfs_cid',
+    'is_complete',
+    'local_path',
+    'server_path',
+    'cover_url',
+    'description',
+)
+
+# Fields of records unless selected otherwise, no detail fields
+DEFAULT_FIELDS = (
+    'file_id', 'md5', 'title', 'author', 'year', 'extension', 'languages', 'torrent_id',
+)
+
+# Fields of md5 resolution records, see FilesRepository.resolve_md5s()
+RESOLVE_FIELDS = (
+    'md5', 'file_id', 'torrent', 'torrent_id', 'byteoffset', 'server_path', 'is_complete', 'local_path',
+)
+
+# Fields loaded by FilesRepository.hydrate()
+DETAIL_FIELDS = ('description', 'cover_url', 'server_path')
+
+
+def parse_fields(value: Optional[str], default: Sequence[str] = DEFAULT_FIELDS) -> Tuple[str, ...]:
+    """Comma separated field names, 'all' for FILE_FIELDS. Raises ValueError"""
+    if not value:
+        return tuple(default)
+
+    if value == 'all':
+        return FILE_FIELDS
+
+    fields = tuple(f.strip() for f in value.split(',') if f.strip())
+    unknown = [f for f in fields if f not in FILE_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(unknown)}")
+
+    return fields
+
+
+def detail_fields(fields: Sequence[str]) -> Tuple[str, ...]:
+    """Fields among fields that need hydration"""
+    return tuple(f for f in fields if f in DETAIL_FIELDS)
+
+
+def file_record(file: FileModel, fields: Sequence[str]) -> Dict[str, Any]:
+    return {field: getattr(file, field) for field in fields}
+
+
+# Compressed output formats and file name suffixes they are inferred from
+COMPRESSIONS = {
+    'gzip': ('.gz', gzip.open),
+    'bz2': ('.bz2', bz2.open),
+    'xz': ('.xz', lzma.open),
+}
+
+
+def compression_of(path: Optional[str]) -> Optional[str]:
+    for name, (suffix, _) in COMPRESSIONS.items():
+        if path and path.endswith(suffix):
+            return name
+
+    return None
+
+
+def open_output(path: Optional[str], compression: Optional[str] = None) -> IO[str]:
+    """Text stream to path (stdout if None or '-'), compressed if compression is set"""
+    if compression not in (None, *COMPRESSIONS):
+        raise ValueError(f"unknown compression {compression}")
+
+    stdout = path in (None, '-')
+    if compression is None:
+        return sys.stdout if stdout else open(path, 'w', encoding='utf-8', newline='')
+
+    opener = COMPRESSIONS[compression][1]
+    binary = opener(sys.stdout.buffer if stdout else path, 'wb')
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+
+class RecordWriter:
+    """Writes file records as JSON lines or CSV rows with a header"""
+
+    FORMATS = ('jsonl', 'csv')
+
+    def __init__(self, out: IO[str], fields: Sequence[str], output_format: str) -> None:
+        if output_format not in self.FORMATS:
+            raise ValueError(f"unknown format {output_format}")
+
+        self.out = out
+        self.fields = tuple(fields)
+        self.csv = None
+        if output_format == 'csv':
+            self.csv = csv.writer(out)
+            self.csv.writerow(self.fields)
+
+    def write(self, file: FileModel):
+        record = file_record(file, self.fields)
+        if self.csv is None:
+            self.out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            return
+
+        self.csv.writerow(
+            ';'.join(map(str, value)) if isinstance(value, list) else value
+            for value in record.values()
+        )
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import config
+
+# accessed_at of a hit is only rewritten when older than this (seconds),
+# keeps popular entries from turning every read into a write
+ACCESS_RESOLUTION = 10
+
+# Size checks run every this many puts
+EVICT_EVERY = 50
+
+
+class ResultCache:
+    """
+    Search results shared by all processes in a separate SQLite file.
+    Entries store the change counters (repositories.changes) of the
+    tables they were computed from and miss once any of them moved.
+    Least recently used entries are evicted above max_bytes. Failures
+    of the cache never fail the computation.
+    """
+
+    def __init__(self, path: Optional[str], max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self.conn: Optional[sqlite3.Connection]
+        self.conn = None
+        self.lock = threading.Lock()
+        self.puts = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        # SQLite connections must not cross fork()
+        os.register_at_fork(after_in_child=self._forget_connection)
+
+    def _forget_connection(self):
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # losing recent entries on a crash is fine
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                versions TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed_at ON results(accessed_at);")
+            self.conn = conn
+
+        return self.conn
+
+    def key(self, namespace: str, args: Any) -> str:
+        data = json.dumps([namespace, args], default=str, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+
+    def get_or_compute(
+        self,
+        namespace: str,
+        args: Any,
+        versions: Dict[str, int],
+        compute: Callable[[], Any],
+    ):
+        """Cached result of compute() for args, computed at table versions"""
+        if not self.path:
+            return compute()
+
+        key = self.key(namespace, args)
+        version_key = json.dumps(versions, sort_keys=True)
+
+        try:
+            found, value = self.get(key, version_key)
+        except sqlite3.Error:
+            found, value = False, None
+
+        if found:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+
+        try:
+            self.put(key, version_key, value)
+        except sqlite3.Error:
+            pass
+
+        return value
+
+    def get(self, key: str, version_key: str):
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT versions, value, accessed_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return False, None
+
+            if row[0] != version_key:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return False, None
+
+            now = time.time()
+            if now - row[2] > ACCESS_RESOLUTION:
+                conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+
+        return True, pickle.loads(row[1])
+
+    def put(self, key: str, version_key: str, value: Any):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+
+        with self.lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, versions, value, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, version_key, data, len(data), time.time())
+            )
+
+            self.puts += 1
+            if self.puts % EVICT_EVERY == 0:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete least recently used entries beyond max_bytes"""
+        conn.execute("""
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, sum(size) OVER (ORDER BY accessed_at DESC, key) AS total
+                    FROM results
+                )
+                WHERE total > ?
+            )
+        """, (self.max_bytes,))
+
+    def clear(self):
+        if not self.path:
+            return
+
+        with self.lock:
+            self._connect().execute("DELETE FROM results")
+
+
+result_cache = ResultCache(
+    getattr(config, 'RESULT_CACHE_FILE', f"{config.DB_FILE}.results"),
+    max_bytes=getattr(config, 'RESULT_CACHE_MB', 64) * 1024 * 1024,
+)
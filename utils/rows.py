@@ -0,0 +1,77 @@
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class RowMapper:
+    """
+    Builds models from plain result tuples. fields maps model fields to
+    (column, expression), '{}' in the expression stands for the column
+    value. A constructor call with positional row lookups is generated
+    once per query shape (column names of cursor.description), fields
+    whose column is not selected get their `missing` expression or the
+    model default.
+    """
+
+    def __init__(
+        self,
+        model: type,
+        fields: Dict[str, Tuple[str, str]],
+        missing: Optional[Dict[str, str]] = None,
+        env: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.model = model
+        self.fields = fields
+        self.missing = missing or {}
+        # names available to expressions
+        self.env = env or {}
+
+        self.factories: Dict[Tuple[str, ...], Callable[[tuple], Any]]
+        self.factories = {}
+
+    def factory(self, description) -> Callable[[tuple], Any]:
+        shape = tuple(d[0] for d in description)
+        if shape not in self.factories:
+            self.factories[shape] = self._compile(shape)
+
+        return self.factories[shape]
+
+    def _compile(self, shape: Tuple[str, ...]):
+        positions = {column: i for i, column in enumerate(shape)}
+
+        args = []
+        for field, (column, expression) in self.fields.items():
+            if column in positions:
+                value = expression.replace('{}', f"row[{positions[column]}]")
+            elif field in self.missing:
+                value = self.missing[field]
+            else:
+                continue
+
+            args.append(f"{field}={value}")
+
+        source = f"def make(row):\n    return model({', '.join(args)})\n"
+        namespace = dict(self.env, model=self.model)
+        exec(compile(source, f"<{self.model.__name__} row factory>", 'exec'), namespace)
+
+        return namespace['make']
+
+    def fetchall(self, cursor: sqlite3.Cursor) -> List[Any]:
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+
+        return list(map(self.factory(cursor.description), rows))
+
+    def fetchone(self, cursor: sqlite3.Cursor) -> Optional[Any]:
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        return self.factory(cursor.description)(row)
+
+
+def tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Cursor returning plain tuples, for queries read by a RowMapper"""
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
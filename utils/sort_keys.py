@@ -0,0 +1,29 @@
+import re
+import unicodedata
+from typing import Optional
+
+# Characters of a title kept in its sort key, longer titles tie and are
+# ordered by id
+TITLE_SORT_LENGTH = 64
+
+_leading_re = re.compile(r'^[\W_]+')
+_space_re = re.compile(r'\s+')
+_year_re = re.compile(r'\d{1,4}')
+
+
+def title_sort_key(title: Optional[str]) -> str:
+    """Case and diacritics folded title without leading punctuation, '' if missing"""
+    if not title:
+        return ''
+
+    folded = unicodedata.normalize('NFKD', title)
+    folded = ''.join(c for c in folded if not unicodedata.combining(c)).casefold()
+    folded = _space_re.sub(' ', _leading_re.sub('', folded)).strip()
+
+    return folded[:TITLE_SORT_LENGTH]
+
+
+def year_sort_key(year) -> int:
+    """Leading number of a year value, 0 if missing"""
+    match = _year_re.match(str(year or '').strip())
+    return int(match.group(0)) if match else 0